@@ -0,0 +1,89 @@
+"""
+Store of precomputed LLM answers for KCC entries, keyed by (row id, response language).
+Filled offline by scripts/precompute_answers.py; the online path serves from it with a single
+primary-key lookup when the top FAISS hit is strong. Answers are zlib-compressed in SQLite.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from config import ANSWER_STORE_DB, EDGE_BUNDLE_DIR
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    row_id INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    query_hash BLOB NOT NULL,
+    model TEXT NOT NULL,
+    answer BLOB NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (row_id, lang)
+) WITHOUT ROWID
+"""
+
+
+def query_hash(query: str) -> bytes:
+    """Short fingerprint of the KCC query, so answers from an older index build are not served for a new row."""
+    return hashlib.blake2b(query.encode("utf-8"), digest_size=8).digest()
+
+
+class AnswerStore:
+    def __init__(self, path: Path = ANSWER_STORE_DB, read_only: bool = False):
+        self.path = Path(path)
+        self.read_only = read_only  # edge bundles may be unpacked on a read-only filesystem
+        self._local = threading.local()  # sqlite connections are per thread
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None and self.read_only:
+            conn = sqlite3.connect(self.path.resolve().as_uri() + "?mode=ro", uri=True, timeout=30)
+            self._local.conn = conn
+        elif conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")  # readers are not blocked by the batch writer
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, row_id: int, lang: str, query: str) -> Optional[dict]:
+        """Stored {answer, model, created} for this KCC row and language, or None."""
+        if not self.path.exists():
+            return None
+        row = self._conn().execute(
+            "SELECT query_hash, model, answer, created FROM answers WHERE row_id = ? AND lang = ?",
+            (int(row_id), lang),
+        ).fetchone()
+        if row is None or row[0] != query_hash(query):
+            return None
+        return {"answer": zlib.decompress(row[2]).decode("utf-8"), "model": row[1], "created": row[3]}
+
+    def put(self, row_id: int, lang: str, query: str, model: str, answer: str) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+            (int(row_id), lang, query_hash(query), model, zlib.compress(answer.encode("utf-8")), time.time()),
+        )
+        conn.commit()  # one commit per answer, so an interrupted run loses at most one
+
+    def done_keys(self) -> set[tuple[int, str, bytes]]:
+        """(row_id, lang, query_hash) of every stored answer, for resuming a batch run."""
+        rows = self._conn().execute("SELECT row_id, lang, query_hash FROM answers")
+        return {(r[0], r[1], bytes(r[2])) for r in rows}
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+_store: Optional[AnswerStore] = None
+
+
+def get_answer_store() -> AnswerStore:
+    global _store
+    if _store is None:
+        _store = AnswerStore(read_only=bool(EDGE_BUNDLE_DIR))
+    return _store
@@ -0,0 +1,40 @@
+"""
+Interned KCC answers in the index metadata.
+Thousands of KCC queries share the same answer, so build_embeddings_faiss.py stores each distinct
+answer once in meta["answer_table"] and one int32 meta["answer_ids"] per row. Hits carry the
+answer id, so results are deduplicated by comparing integers, and a search can over-fetch
+(ANSWER_OVERFETCH) and collapse to distinct answers cheaply.
+The table may be a list, a dict of global id -> answer (a shard keeps only the answers its rows
+use) or an edge bundle TextColumn. Metadata built before the table existed has meta["answers"].
+"""
+import numpy as np
+
+
+def intern_answers(answers) -> tuple[list[str], np.ndarray]:
+    """(distinct answers in first-seen order, int32 answer id per row). Surrounding whitespace is ignored."""
+    table, ids, index = [], np.empty(len(answers), dtype=np.int32), {}
+    for row, answer in enumerate(answers):
+        answer = str(answer).strip()
+        answer_id = index.get(answer)
+        if answer_id is None:
+            answer_id = index[answer] = len(table)
+            table.append(answer)
+        ids[row] = answer_id
+    return table, ids
+
+
+def row_answer(meta, idx: int) -> str:
+    if "answer_ids" in meta:
+        return meta["answer_table"][int(meta["answer_ids"][idx])]
+    return meta["answers"][idx]
+
+
+def row_answer_id(meta, idx: int):
+    """The row's answer id, or None for metadata without an answer table."""
+    return int(meta["answer_ids"][idx]) if "answer_ids" in meta else None
+
+
+def answer_key(hit: dict):
+    """What makes two hits the same answer: the answer id, else (old metadata) the text."""
+    answer_id = hit.get("answer_id")
+    return ("id", answer_id) if answer_id is not None else ("text", hit["answer"].strip())
@@ -2,7 +2,9 @@
 KrishiSahay — Kisan Call Centre Query Assistant.
 Login, Registration, Language selection, and multilingual Q&A for farmers.
 """
+import functools
 import html
+import logging
 import os
 import sys
 import time
@@ -10,27 +12,32 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
+import pandas as pd
 import streamlit as st
 # Helper imports
 from streamlit_mic_recorder import mic_recorder
 
-from config import FAISS_INDEX, META_PKL, TOP_K, OLLAMA_MODEL
-from retrieval import get_offline_answer, get_online_answer, get_available_models
-from firebase_helper import save_to_firebase, get_firebase_config
-from auth_helper import register_user, login_user
-from data_feeds import get_weather, get_market_prices, analyze_plant_image
+from config import (
+    TOP_K, OLLAMA_MODEL, VISION_MODEL, LANG_OPTIONS, MANDI_MARKET,
+    FEED_WIDGET_REFRESH, RERUN_TIMING, SHARD_URLS, EDGE_BUNDLE_DIR,
+)
+from retrieval import get_offline_answer, generate_online_answer, get_available_models, get_match_stats, index_available
+from index_versions import current_version, get_index_manager
+from firebase_helper import save_to_firebase, get_firebase_config, load_history
+from auth_helper import create_session_token, login_user, logout_user, register_user, verify_session_token
+from data_feeds import get_feed_status, get_market_prices, get_weather, warm_feeds
+from price_history import get_price_history
+from profiling import maybe_capture
+from plant_doctor import diagnose_plant_image, get_vision_stats
 from report_gen import generate_prescription
+from routing import ROUTE_KCC_DIRECT, ROUTE_PRECOMPUTED, choose_route, get_route_stats, record_route
+from scheduler import get_scheduler
+from shards import get_shard_pool
+from tts import synthesize_speech
 
-DEFAULT_FIREBASE_URL = "https://kishanagent-d81dc-default-rtdb.asia-southeast1.firebasedatabase.app"
+log = logging.getLogger(__name__)
 
-# Language options: code -> (display name, native name)
-LANG_OPTIONS = {
-    "en": ("English", "English"),
-    "hi": ("Hindi", "हिंदी"),
-    "ta": ("Tamil", "தமிழ்"),
-    "te": ("Telugu", "తెలుగు"),
-    "kn": ("Kannada", "ಕನ್ನಡ"),
-}
+DEFAULT_FIREBASE_URL = "https://kishanagent-d81dc-default-rtdb.asia-southeast1.firebasedatabase.app"
 
 # UI strings per language
 LANG_STRINGS = {
@@ -67,10 +74,15 @@ LANG_STRINGS = {
         "model_select": "Select AI Model",
         "weather_title": "Weather",
         "market_title": "Market Prices",
+        "price_trend": "📈 Price Trend",
         "voice_input": "🎤 Voice Input",
         "download_pdf": "📥 Download Prescription",
         "plant_doctor": "📸 Plant Doctor",
         "upload_leaf": "Upload Leaf Image",
+        "history": "🕘 History",
+        "history_empty": "No saved questions yet.",
+        "history_older": "Older",
+        "history_newer": "Newer",
     },
     "hi": {
         "app_title": "किसान कॉल सेंटर सहायक",
@@ -105,10 +117,15 @@ LANG_STRINGS = {
         "model_select": "AI मॉडल चुनें",
         "weather_title": "मौसम",
         "market_title": "बाजार भाव",
+        "price_trend": "📈 भाव का रुझान",
         "voice_input": "🎤 बोलकर पूछें",
         "download_pdf": "📥 नुस्खा डाउनलोड करें",
         "plant_doctor": "📸 प्लांट डॉक्टर",
         "upload_leaf": "पत्ती की फोटो अपलोड करें",
+        "history": "🕘 इतिहास",
+        "history_empty": "अभी तक कोई सवाल सहेजा नहीं गया।",
+        "history_older": "पुराने",
+        "history_newer": "नए",
     },
     # Simple fallbacks for others
     "ta": { "app_title": "கிசான் கால் சென்டர்", "select_language": "மொழி", "login_title": "உள்நுழை", "register_title": "பதிவு", "get_answer": "பதில்", "query_label": "கேள்வி", "welcome": "வணக்கம்" },
@@ -205,6 +222,14 @@ def _init_session():
         st.session_state.selected_language = "en"
     if "selected_model" not in st.session_state:
         st.session_state.selected_model = OLLAMA_MODEL
+    # Cursors of the history pages viewed so far (None = newest page)
+    if "history_cursors" not in st.session_state:
+        st.session_state.history_cursors = [None]
+    # Last chat answer and plant diagnosis, re-shown on reruns without recomputing
+    if "last_answer" not in st.session_state:
+        st.session_state.last_answer = None
+    if "last_diagnosis" not in st.session_state:
+        st.session_state.last_diagnosis = None
     # Voice input buffer
     if "voice_text" not in st.session_state:
         st.session_state.voice_text = ""
@@ -237,6 +262,8 @@ def render_login(lang: str):
                     st.session_state.user_name = user["name"]
                     st.session_state.user_email = user["email"]
                     st.session_state.page = "main"
+                    # Signed token in the URL: a reload or bookmark logs in again without a password
+                    st.query_params["session"] = create_session_token(user)
                     st.success(msg)
                     st.rerun()
                 else:
@@ -279,33 +306,152 @@ def render_register(lang: str):
         st.markdown('</div>', unsafe_allow_html=True)
 
 
+def render_price_trend(lang: str):
+    """Last 30 days of modal prices for one commodity, from the local price history (if ingested)."""
+    history = get_price_history()
+    if not len(history):
+        return
+    with st.expander(_t(lang, "price_trend")):
+        markets = history.market_keys()
+        default_market = history.find_market(MANDI_MARKET) or markets[0]
+        market = st.selectbox("Mandi", markets, index=markets.index(default_market),
+                              format_func=lambda m: f"{m[2]}, {m[1]} ({m[0]})", key="trend_market")
+        crops = sorted(p["crop"] for p in history.latest_prices(market))
+        if not crops:
+            return
+        crop = st.selectbox("Crop", crops, key="trend_crop")
+        trend = history.trend(crop, market, days=30)
+        if trend is None:
+            return
+        chart = pd.DataFrame({"Modal ₹/qt": trend["modal_price"], "7-day avg": trend["rolling_mean"]}, index=trend["date"])
+        st.line_chart(chart, height=160)
+        st.caption(f"₹{trend['last']:.0f}/qt on {trend['date'][-1]} ({trend['change_pct']:+.1f}% in 30 days)")
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _model_options() -> list[str]:
+    """Installed Ollama models, shared by all sessions and re-checked at most once a minute."""
+    return get_available_models()
+
+
+def _timed(name: str):
+    """Record how long a render function took (per session) and log it when RERUN_TIMING is set."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                ms = (time.perf_counter() - start) * 1000
+                st.session_state.setdefault("timings", {})[name] = ms
+                if RERUN_TIMING:
+                    log.info("Rerun timing %s: %.1f ms", name, ms)
+        return run
+    return wrap
+
+
+@st.cache_resource(show_spinner=False)
+def _warm_feeds() -> bool:
+    """Once per process: fetch the default weather and prices in the background."""
+    warm_feeds()
+    return True
+
+
+def _feed_note(status: dict) -> None:
+    """Caption under a feed widget when its last refresh failed or its data is out of date."""
+    if status["error"]:
+        age = f", showing data from {status['age_s'] / 60:.0f} min ago" if status["age_s"] is not None else ""
+        st.caption(f"⚠️ Update failed{age}: {status['error'][:80]}")
+    elif status["stale"]:
+        st.caption(f"Updated {status['age_s'] / 60:.0f} min ago")
+
+
+@st.fragment(run_every=FEED_WIDGET_REFRESH)
+@_timed("feeds")
+def render_feeds(lang: str):
+    """Weather, mandi prices and price trend; reruns on its own to pick up background-refreshed feeds."""
+    t = lambda k: _t(lang, k)
+    # --- WEATHER WIDGET ---
+    weather = get_weather()
+    st.markdown(f"""
+    <div class="widget-card">
+        <div style="font-weight:bold; color:#555;">🌦️ {t("weather_title")} ({weather['city']})</div>
+        <div style="font-size: 1.2rem;">{weather['condition']} {weather['temp']}°C</div>
+        <div style="font-size: 0.8rem; color:#888;">Hum: {weather['humidity']}%</div>
+    </div>
+    """, unsafe_allow_html=True)
+    status = get_feed_status()
+    _feed_note(status["weather"])
+
+    # --- MARKET WIDGET ---
+    st.markdown(f"""<div class="widget-card"><div style="font-weight:bold; color:#555;">💰 {t("market_title")}</div>""", unsafe_allow_html=True)
+    prices = get_market_prices()
+    for p in prices:
+         st.markdown(f"<div style='display:flex; justify-content:space_between; font-size:0.9rem;'><span>{p['crop']}</span><span><b>{p['price']}</b></span></div>", unsafe_allow_html=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+    _feed_note(status["prices"])
+    render_price_trend(lang)
+
+
+@st.fragment
+@_timed("model_settings")
+def render_model_settings(lang: str):
+    t = lambda k: _t(lang, k)
+    st.markdown("### 🤖 " + t("settings"))
+    # Models
+    available_models = list(_model_options())
+    if not available_models:
+         available_models = [OLLAMA_MODEL, "granite3-dense:8b", "llama3"]
+    current_model = st.session_state.get("selected_model", OLLAMA_MODEL)
+    if current_model not in available_models:
+         if available_models: available_models.insert(0, current_model)
+    chosen_model = st.selectbox(t("model_select"), available_models, index=available_models.index(current_model) if current_model in available_models else 0)
+    st.session_state.selected_model = chosen_model
+    queues = get_scheduler().metrics().values()
+    running = sum(q["in_flight"] for q in queues)
+    waiting = sum(q["queued"] for q in queues)
+    if running or waiting:
+        st.caption(f"AI load: {running} running, {waiting} waiting")
+    routes = get_route_stats()
+    fast = routes["routes"][ROUTE_KCC_DIRECT] + routes["routes"][ROUTE_PRECOMPUTED]
+    if fast:
+        st.caption(f"Fast answers: {fast} of {sum(routes['routes'].values())} "
+                   f"(saved ~{routes['latency_saved_s']:.0f}s)")
+    matches = get_match_stats()
+    if matches["exact_hits"]:
+        st.caption(f"Exact matches: {matches['exact_hits']} of {matches['lookups']} ({matches['hit_rate']:.0%})")
+    vision = get_vision_stats()
+    if vision["requests"]:
+        st.caption(f"Plant Doctor: {vision['cache_hits']} of {vision['requests']} from cache "
+                   f"(saved ~{vision['latency_saved_s']:.0f}s), uploaded {vision['bytes_sent'] / 1e6:.1f} "
+                   f"of {vision['bytes_original'] / 1e6:.1f} MB")
+    if SHARD_URLS:
+        shards = get_shard_pool().status()
+        down = [s for s in shards if not s["healthy"]]
+        if down:
+            st.caption(f"Knowledge base: {len(shards) - len(down)} of {len(shards)} shards answering")
+    elif not EDGE_BUNDLE_DIR:
+        index = get_index_manager().status()
+        current = current_version()
+        if current in index["failed"]:
+            st.caption(f"⚠️ Index {current} failed to load, serving {index['version'] or 'the legacy index'}")
+        elif index["loading"]:
+            st.caption(f"Loading index {index['loading']}...")
+    if RERUN_TIMING:
+        st.caption(" · ".join(f"{name} {ms:.0f} ms" for name, ms in st.session_state.get("timings", {}).items()))
+
+
 def render_sidebar(lang: str):
     t = lambda k: _t(lang, k)
     with st.sidebar:
         st.image("https://cdn-icons-png.flaticon.com/512/3233/3233499.png", width=60)
         st.title("KrishiSahay")
         st.caption(f"{t('welcome')}, {st.session_state.user_name.split()[0] if st.session_state.user_name else 'Farmer'}")
-        
-        # --- WEATHER WIDGET ---
-        weather = get_weather()
-        st.markdown(f"""
-        <div class="widget-card">
-            <div style="font-weight:bold; color:#555;">🌦️ {t("weather_title")} ({weather['city']})</div>
-            <div style="font-size: 1.2rem;">{weather['condition']} {weather['temp']}°C</div>
-            <div style="font-size: 0.8rem; color:#888;">Hum: {weather['humidity']}%</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-        # --- MARKET WIDGET ---
-        st.markdown(f"""<div class="widget-card"><div style="font-weight:bold; color:#555;">💰 {t("market_title")}</div>""", unsafe_allow_html=True)
-        prices = get_market_prices()
-        for p in prices:
-             st.markdown(f"<div style='display:flex; justify-content:space_between; font-size:0.9rem;'><span>{p['crop']}</span><span><b>{p['price']}</b></span></div>", unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-
+        render_feeds(lang)
 
         st.markdown("---")
-        # Language
+        # Language (changes every string on the page, so this is a full rerun)
         l_opts = list(LANG_OPTIONS.keys())
         idx = l_opts.index(lang) if lang in l_opts else 0
         new_lang = st.selectbox("Language", options=l_opts, format_func=lambda c: f"{LANG_OPTIONS[c][0]} ({LANG_OPTIONS[c][1]})", label_visibility="collapsed", index=idx, key="sb_lang")
@@ -313,24 +459,285 @@ def render_sidebar(lang: str):
             st.session_state.selected_language = new_lang
             st.rerun()
 
-        st.markdown("### 🤖 " + t("settings"))
-        # Models
-        available_models = get_available_models()
-        if not available_models:
-             available_models = [OLLAMA_MODEL, "granite3-dense:8b", "llama3"]
-        current_model = st.session_state.get("selected_model", OLLAMA_MODEL)
-        if current_model not in available_models:
-             if available_models: available_models.insert(0, current_model)
-        chosen_model = st.selectbox(t("model_select"), available_models, index=available_models.index(current_model) if current_model in available_models else 0)
-        st.session_state.selected_model = chosen_model
+        render_model_settings(lang)
 
         st.markdown("---")
         if st.button(t("logout"), key="logout_btn", use_container_width=True):
+            logout_user(st.session_state.user_email)  # revokes this user's session tokens everywhere
             st.session_state.logged_in = False
+            st.session_state.history_cursors = [None]
+            st.session_state.last_answer = None
+            st.session_state.last_diagnosis = None
             st.session_state.page = "login"
+            st.query_params.pop("session", None)
             st.rerun()
 
 
+@st.fragment
+@_timed("history")
+def render_history(lang: str):
+    """The logged-in user's saved questions, one page at a time (newest first)."""
+    t = lambda k: _t(lang, k)
+    cursors = st.session_state.history_cursors
+    entries, older = load_history(st.session_state.user_email, before=cursors[-1])
+    if not entries:
+        st.info(t("history_empty"))
+        return
+    for entry in entries:
+        when = entry["timestamp"][:16].replace("T", " ")
+        with st.expander(f"{when} · {entry.get('query', '')[:80]}"):
+            st.markdown(f"**{t('offline_answer')}**")
+            st.write(entry.get("offline_answer", ""))
+            if entry.get("online_answer"):
+                st.markdown(f"**{t('online_answer')}**")
+                st.write(entry["online_answer"])
+    col_new, col_old = st.columns(2)
+    with col_new:
+        if len(cursors) > 1 and st.button(t("history_newer"), key="history_newer", use_container_width=True):
+            cursors.pop()
+            st.rerun(scope="fragment")
+    with col_old:
+        if older and st.button(t("history_older"), key="history_older", use_container_width=True):
+            cursors.append(older)
+            st.rerun(scope="fragment")
+
+
+@st.fragment
+@_timed("plant_doctor")
+def render_plant_doctor(lang: str):
+    t = lambda k: _t(lang, k)
+    st.subheader(t("plant_doctor"))
+    uploaded_file = st.file_uploader(t("upload_leaf"), type=["jpg", "png", "jpeg"])
+    if uploaded_file is None:
+        return
+    st.image(uploaded_file, width=300)
+    if st.button("🩺 Analyze Disease", type="primary"):
+        with st.spinner("Analyzing leaf image with AI..."):
+            bytes_data = uploaded_file.getvalue()
+            result = diagnose_plant_image(bytes_data, model=VISION_MODEL, user_id=st.session_state.user_email)
+            st.session_state.last_diagnosis = {"file_id": uploaded_file.file_id, **result}
+    # Last diagnosis for this photo survives reruns of the rest of the page
+    result = st.session_state.get("last_diagnosis")
+    if not result or result["file_id"] != uploaded_file.file_id:
+        return
+    diagnosis = result["response"]
+    st.markdown(f"""
+      <div class="result-card" style="border-left: 5px solid #e63946;">
+          <div class="online-header" style="color:#e63946;">🚑 Diagnosis</div>
+          <div class="answer-text">{html.escape(diagnosis).replace(chr(10), '<br>')}</div>
+      </div>
+      """, unsafe_allow_html=True)
+    if result["cached"]:
+        st.caption(f"⚡ Cached diagnosis (saved ~{result['latency_saved_s']:.1f}s)")
+    elif result["bytes_sent"]:
+        st.caption(f"Uploaded {result['bytes_sent'] / 1024:.0f} KB "
+                   f"(original {result['bytes_original'] / 1024:.0f} KB) in {result['latency_s']:.1f}s")
+
+
+def _answer_question(lang: str, final_query: str, use_online: bool) -> dict:
+    """Run retrieval (and the LLM if needed), log the conversation, and return everything the answer view shows."""
+    t = lambda k: _t(lang, k)
+    response_lang_name = LANG_OPTIONS[lang][0]
+    timings = {}  # ms per stage, kept with profiles (profiling.py)
+    stage_start = time.perf_counter()
+
+    def stage_done(name: str) -> None:
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[name] = round((now - stage_start) * 1000, 1)
+        stage_start = now
+
+    with st.spinner("Searching knowledge base..."):
+        results, offline_answer = get_offline_answer(final_query, top_k=TOP_K)
+    stage_done("retrieval")
+
+    # Skip the LLM when the KCC match is confident enough to show as-is
+    route = choose_route(results, lang) if use_online else None
+    use_llm = route is not None and route["route"] != ROUTE_KCC_DIRECT
+    if route is not None and not use_llm:
+        record_route(ROUTE_KCC_DIRECT)
+
+    online_answer = ""
+    generation = None
+    if use_llm:
+        with st.spinner(f"AI ({st.session_state.selected_model}) is thinking..."):
+            llm_start = time.perf_counter()
+            generation = generate_online_answer(
+                final_query,
+                offline_answer,
+                response_language=response_lang_name,
+                model_name=st.session_state.selected_model,
+                user_id=st.session_state.user_email,
+                results=results,
+            )
+            online_answer = generation["answer"]
+            if generation["ok"]:
+                record_route(generation["source"], time.perf_counter() - llm_start)
+        stage_done("llm")
+
+    # --- PDF DOWNLOAD ---
+    pdf_file = generate_prescription(final_query, offline_answer, online_answer if use_llm else None)
+    with open(pdf_file, "rb") as f:
+        pdf = f.read()
+    stage_done("pdf")
+
+    # Save to Firebase
+    firebase_url, _ = get_firebase_config()
+    if firebase_url:
+        if not use_llm:
+            served_route = ROUTE_KCC_DIRECT if route is not None else "offline"
+        else:
+            served_route = generation["source"] if generation["ok"] else ("busy" if generation["busy"] else "error")
+        if save_to_firebase(final_query, offline_answer, online_answer or None,
+                            user_email=st.session_state.user_email,
+                            results=results, language=lang, route=served_route):
+             st.session_state.history_cursors = [None]
+             st.toast(f"✅ {t('saved_firebase')}")
+        stage_done("save")
+
+    # --- TEXT TO SPEECH (TTS) ---
+    # Speak the answer (Online if available, else Offline); full text, cached by content
+    text_to_speak = online_answer if use_llm and online_answer else offline_answer
+    audio, mime = None, None
+    try:
+        audio, mime = synthesize_speech(text_to_speak, lang)
+    except Exception as e:
+        # Fallback or silent fail if Tts issue
+        print(f"TTS Error: {e}")
+    stage_done("tts")
+
+    return {
+        "query": final_query,
+        "offline_answer": offline_answer,
+        "online_answer": online_answer,
+        "bypassed": route is not None and not use_llm,
+        "use_llm": use_llm,
+        "generation": generation,
+        "pdf": pdf,
+        "audio": audio,
+        "mime": mime,
+        "timings": timings,
+    }
+
+
+def _show_answer(lang: str, answer: dict):
+    t = lambda k: _t(lang, k)
+    # Offline Result Card
+    if not answer["use_llm"]:
+        st.markdown(f"""
+        <div class="result-card">
+            <div class="offline-header">📊 {t('offline_answer')}</div>
+            <div class="answer-text">{html.escape(answer['offline_answer']).replace(chr(10), '<br>')}</div>
+        </div>
+        """, unsafe_allow_html=True)
+        if answer["bypassed"]:
+            st.caption("⚡ High-confidence match from the KCC knowledge base")
+
+    if answer["use_llm"]:
+        online_answer = answer["online_answer"]
+        generation = answer["generation"]
+        if "Error" in online_answer:
+             st.error(online_answer)
+        else:
+            st.markdown(f"""
+            <div class="result-card" style="border-left: 5px solid #1a73e8;">
+                <div class="online-header">🤖 {t('online_answer')}</div>
+                <div class="answer-text">{html.escape(online_answer).replace(chr(10), '<br>')}</div>
+            </div>
+            """, unsafe_allow_html=True)
+            if generation["source"] == "precomputed":
+                st.caption("⚡ Prepared answer from the KCC answer bank")
+            elif generation["ok"]:
+                st.caption(f"Prompt: {generation['prompt_tokens']} tokens ({generation['prompt_eval_s']:.2f}s) · "
+                           f"Answer: {generation['eval_tokens']} tokens ({generation['eval_s']:.1f}s)")
+
+    st.download_button(
+        label=t("download_pdf"),
+        data=answer["pdf"],
+        file_name="KrishiSahay_Prescription.pdf",
+        mime="application/pdf",
+    )
+    if answer["audio"]:
+        st.audio(answer["audio"], format=answer["mime"], start_time=0)
+
+
+@st.fragment
+@_timed("chat")
+def render_chat(lang: str):
+    """Voice/text question, answer, PDF and audio. Typing or submitting reruns only this fragment."""
+    t = lambda k: _t(lang, k)
+    # Voice Input Helper
+    st.markdown(f"**{t('voice_input')}**")
+
+    # Mapping for Web Speech API locales
+    LOCALE_MAP = {
+        "en": "en-IN", 
+        "hi": "hi-IN", 
+        "ta": "ta-IN", 
+        "te": "te-IN", 
+        "kn": "kn-IN"
+    }
+    current_locale = LOCALE_MAP.get(lang, "en-IN")
+
+    # Browser-based STT (High Accuracy, No Server Processing needed)
+    from streamlit_mic_recorder import speech_to_text
+    
+    # speech_to_text returns the transcribed text directly
+    voice_text_output = speech_to_text(
+        language=current_locale,
+        start_prompt="🎤 Start Recording",
+        stop_prompt="⏹️ Stop",
+        just_once=False,
+        key="STT"
+    )
+    
+    if voice_text_output and voice_text_output != st.session_state.get("last_voice_text", ""):
+        st.session_state.voice_query = voice_text_output
+        st.session_state.last_voice_text = voice_text_output # Prevent infinite loop
+        st.session_state.voice_auto_submit = True
+        st.rerun(scope="fragment")
+
+    # Determine query source
+    default_query = st.session_state.get("voice_query", "")
+    
+    col_q, col_tog = st.columns([4, 1])
+    with col_q:
+        query = st.text_input(t("query_label"), value=default_query, placeholder=t("query_placeholder"), key="query_input")
+    with col_tog:
+        st.write("") # Spacer
+        use_online = st.toggle(t("use_online"), value=True)
+    
+    # Check for auto-submit flag
+    auto_submit = st.session_state.get("voice_auto_submit", False)
+    
+    if st.button(t("get_answer"), type="primary", key="btn_ans") or auto_submit:
+        # Clear the flag immediately so it doesn't loop
+        if auto_submit:
+            st.session_state.voice_auto_submit = False
+            
+        # If triggered by voice (audio exists) and we have text, we proceed.
+        final_query = query if query else default_query
+        
+        if not final_query.strip():
+            st.warning("Please enter a question.")
+            return
+
+        # Sampled questions (and PROFILE_USERS) are profiled end to end; see profiling.py
+        model = st.session_state.selected_model if use_online else None
+        with maybe_capture(final_query.strip(), user=st.session_state.user_email, model=model,
+                           language=lang) as profile:
+            answer = _answer_question(lang, final_query.strip(), use_online)
+            generation = answer["generation"] or {}
+            profile.update(timings=answer["timings"], route=generation.get("source"),
+                           prompt_tokens=generation.get("prompt_tokens"), eval_tokens=generation.get("eval_tokens"))
+        st.session_state.last_answer = answer
+
+    # Last answer stays on screen across reruns (e.g. the PDF download) without recomputing
+    if st.session_state.get("last_answer"):
+        _show_answer(lang, st.session_state.last_answer)
+
+
+@_timed("main")
 def render_main(lang: str):
     t = lambda k: _t(lang, k)
     render_sidebar(lang)
@@ -339,168 +746,26 @@ def render_main(lang: str):
     st.markdown(f"*{t('app_caption')}*")
     st.markdown("---")
 
-    if not FAISS_INDEX.exists() or not META_PKL.exists():
+    if not index_available():
         st.error("⚠️ Data not initialized. Please run scripts.")
         return
 
-    # Tabs for Text vs Image
-    tab1, tab2 = st.tabs(["💬 Chat", t("plant_doctor")])
+    # Tabs for Text vs Image; each tab is a fragment, so using one does not rerun the others
+    tab1, tab2, tab3 = st.tabs(["💬 Chat", t("plant_doctor"), t("history")])
 
-    with tab2: # Plant Doctor
-        st.subheader(t("plant_doctor"))
-        uploaded_file = st.file_uploader(t("upload_leaf"), type=["jpg", "png", "jpeg"])
-        if uploaded_file is not None:
-             st.image(uploaded_file, width=300)
-             if st.button("🩺 Analyze Disease", type="primary"):
-                 with st.spinner("Analyzing leaf image with AI..."):
-                      bytes_data = uploaded_file.getvalue()
-                      diagnosis = analyze_plant_image(bytes_data, model=st.session_state.selected_model)
-                      st.markdown(f"""
-                        <div class="result-card" style="border-left: 5px solid #e63946;">
-                            <div class="online-header" style="color:#e63946;">🚑 Diagnosis</div>
-                            <div class="answer-text">{html.escape(diagnosis).replace(chr(10), '<br>')}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
+    with tab3: # History
+        render_history(lang)
 
+    with tab2: # Plant Doctor
+        render_plant_doctor(lang)
 
     with tab1: # Chat
-        # Voice Input Helper
-        st.markdown(f"**{t('voice_input')}**")
-        
-        # Mapping for Web Speech API locales
-        LOCALE_MAP = {
-            "en": "en-IN", 
-            "hi": "hi-IN", 
-            "ta": "ta-IN", 
-            "te": "te-IN", 
-            "kn": "kn-IN"
-        }
-        current_locale = LOCALE_MAP.get(lang, "en-IN")
-
-        # Browser-based STT (High Accuracy, No Server Processing needed)
-        from streamlit_mic_recorder import speech_to_text
-        
-        # speech_to_text returns the transcribed text directly
-        voice_text_output = speech_to_text(
-            language=current_locale,
-            start_prompt="🎤 Start Recording",
-            stop_prompt="⏹️ Stop",
-            just_once=False,
-            key="STT"
-        )
-        
-        if voice_text_output and voice_text_output != st.session_state.get("last_voice_text", ""):
-            st.session_state.voice_query = voice_text_output
-            st.session_state.last_voice_text = voice_text_output # Prevent infinite loop
-            st.session_state.voice_auto_submit = True
-            st.rerun()
-
-        # Determine query source
-        default_query = st.session_state.get("voice_query", "")
-        
-        col_q, col_tog = st.columns([4, 1])
-        with col_q:
-            query = st.text_input(t("query_label"), value=default_query, placeholder=t("query_placeholder"), key="query_input")
-        with col_tog:
-            st.write("") # Spacer
-            use_online = st.toggle(t("use_online"), value=True)
-        
-        # Check for auto-submit flag
-        auto_submit = st.session_state.get("voice_auto_submit", False)
-        
-        if st.button(t("get_answer"), type="primary", key="btn_ans") or auto_submit:
-            # Clear the flag immediately so it doesn't loop
-            if auto_submit:
-                st.session_state.voice_auto_submit = False
-                
-            # If triggered by voice (audio exists) and we have text, we proceed.
-            final_query = query if query else default_query
-            
-            if not final_query.strip():
-                st.warning("Please enter a question.")
-                return
-
-            response_lang_name = LANG_OPTIONS[lang][0]
-            
-            with st.spinner("Searching knowledge base..."):
-                results, offline_answer = get_offline_answer(final_query.strip(), top_k=TOP_K)
-
-            # Offline Result Card
-            if not use_online:
-                st.markdown(f"""
-                <div class="result-card">
-                    <div class="offline-header">📊 {t('offline_answer')}</div>
-                    <div class="answer-text">{html.escape(offline_answer).replace(chr(10), '<br>')}</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-            online_answer = ""
-            final_answer_for_pdf = offline_answer
-            
-            if use_online:
-                with st.spinner(f"AI ({st.session_state.selected_model}) is thinking..."):
-                    online_answer = get_online_answer(
-                        final_query.strip(), 
-                        offline_answer, 
-                        response_language=response_lang_name,
-                        model_name=st.session_state.selected_model
-                    )
-                    final_answer_for_pdf = online_answer
-                
-                if "Error" in online_answer:
-                     st.error(online_answer)
-                else:
-                    st.markdown(f"""
-                    <div class="result-card" style="border-left: 5px solid #1a73e8;">
-                        <div class="online-header">🤖 {t('online_answer')}</div>
-                        <div class="answer-text">{html.escape(online_answer).replace(chr(10), '<br>')}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-            
-            # --- PDF DOWNLOAD ---
-            pdf_file = generate_prescription(final_query, offline_answer, online_answer if use_online else None)
-            with open(pdf_file, "rb") as f:
-                st.download_button(
-                    label=t("download_pdf"),
-                    data=f,
-                    file_name="KrishiSahay_Prescription.pdf",
-                    mime="application/pdf"
-                )
-
-            # Save to Firebase
-            firebase_url, _ = get_firebase_config()
-            if firebase_url:
-                if save_to_firebase(final_query.strip(), offline_answer, online_answer or None):
-                     st.toast(f"✅ {t('saved_firebase')}")
-
-            # --- TEXT TO SPEECH (TTS) ---
-            # Speak the answer (Online if available, else Offline)
-            text_to_speak = online_answer if use_online and online_answer else offline_answer
-            # Remove any raw HTML/markdown for speech if possible, but gTTS handles text decently.
-            # Simple cleanup:
-            import re
-            clean_text = re.sub(r'<[^>]+>', '', text_to_speak).replace('*', '').replace('#', '')
-            
-            if clean_text:
-                from gtts import gTTS
-                import io
-                
-                try:
-                    # Detect language from response if possible, else default to selected language or 'en'
-                    # gTTS supports 'hi', 'en', 'ta', 'te', 'kn', 'ml' etc.
-                    tts_lang = lang if lang in ['en', 'hi', 'ta', 'te', 'kn'] else 'en'
-                    
-                    tts = gTTS(text=clean_text[:500], lang=tts_lang, slow=False) # Limit to first 500 chars for speed
-                    audio_fp = io.BytesIO()
-                    tts.write_to_fp(audio_fp)
-                    st.audio(audio_fp, format='audio/mp3', start_time=0)
-                except Exception as e:
-                    # Fallback or silent fail if Tts issue
-                    print(f"TTS Error: {e}")
+        render_chat(lang)
 
 
 def main():
     _init_session()
+    _warm_feeds()
     
     # Check query param for page routing
     q = st.query_params.get("page", "")
@@ -511,6 +776,17 @@ def main():
 
     lang = st.session_state.get("selected_language", "en")
 
+    if not st.session_state.logged_in and st.query_params.get("session"):
+        # Signature and expiry are checked locally; revocation against the (cached) user record
+        user = verify_session_token(st.query_params["session"])
+        if user:
+            st.session_state.logged_in = True
+            st.session_state.user_name = user["name"]
+            st.session_state.user_email = user["email"]
+            st.session_state.page = "main"
+        else:
+            st.query_params.pop("session", None)
+
     if not st.session_state.logged_in:
         if st.session_state.page == "register":
             render_register(lang)
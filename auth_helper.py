@@ -1,28 +1,184 @@
 """
 Simple login and registration using Firebase Realtime Database.
-Stores users under /users with hashed passwords (for demo only; use Firebase Auth in production).
+Stores users under /users with salted scrypt password hashes (for demo only; use Firebase Auth in production).
+Logins are remembered with signed session tokens (see create_session_token). A token is revoked by a
+password change or by logout_user, which gives the record a new session nonce. Checking that needs
+only the user's profile (name, email, session stamp), which is cached for USER_CACHE_TTL seconds, so
+a reload does not go to Firebase. Passwords are always checked against a fresh record.
 """
+import base64
 import hashlib
+import hmac
+import json
 import os
-import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
 
 import requests
 
-from firebase_helper import get_firebase_config
+from config import AUTH_HASH_WORKERS, SESSION_SECRET, SESSION_SECRET_FILE, SESSION_TTL, USER_CACHE_TTL
+from firebase_helper import firebase_key_for_email, get_firebase_config
+
+# scrypt cost: 2^14 x 8 x 1 needs 16 MB and tens of ms per hash. Stored hashes asking for more
+# memory than _SCRYPT_MAXMEM are rejected
+_SCRYPT_N, _SCRYPT_R, _SCRYPT_P = 2 ** 14, 8, 1
+_SCRYPT_MAXMEM = 64 * 1024 * 1024
+
+# Hashing runs here, not on the session's script thread, and at most AUTH_HASH_WORKERS at a time,
+# so a burst of logins cannot take all CPU and memory from the sessions answering questions
+_hash_pool = ThreadPoolExecutor(max_workers=max(1, AUTH_HASH_WORKERS), thread_name_prefix="auth-hash")
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=_SCRYPT_MAXMEM, dklen=32)
 
 
 def _hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+    """'scrypt$n$r$p$salt$hash' with a random 16-byte salt."""
+    salt = os.urandom(16)
+    digest = _hash_pool.submit(_scrypt, password, salt, _SCRYPT_N, _SCRYPT_R, _SCRYPT_P).result()
+    return f"scrypt${_SCRYPT_N}${_SCRYPT_R}${_SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+
+def _verify_password(password: str, stored: str) -> bool:
+    """Check against a scrypt hash, or the unsalted sha256 hex of accounts registered before it."""
+    if stored.startswith("scrypt$"):
+        try:
+            _, n, r, p, salt, digest = stored.split("$")
+            computed = _hash_pool.submit(_scrypt, password, bytes.fromhex(salt), int(n), int(r), int(p)).result()
+        except ValueError:
+            return False
+        return hmac.compare_digest(computed.hex(), digest)
+    return hmac.compare_digest(hashlib.sha256(password.encode("utf-8")).hexdigest(), stored)
+
+
+# --- session tokens ---
+
+_secret: Optional[bytes] = None
+_secret_lock = threading.Lock()
+
+
+def _session_secret() -> bytes:
+    """SESSION_SECRET, else a random key kept in SESSION_SECRET_FILE so tokens survive restarts."""
+    global _secret
+    with _secret_lock:
+        if _secret is None:
+            if SESSION_SECRET:
+                _secret = SESSION_SECRET.encode("utf-8")
+            elif SESSION_SECRET_FILE.exists():
+                _secret = bytes.fromhex(SESSION_SECRET_FILE.read_text().strip())
+            else:
+                _secret = secrets.token_bytes(32)
+                SESSION_SECRET_FILE.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(SESSION_SECRET_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w") as f:
+                    f.write(_secret.hex())
+        return _secret
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _session_stamp(record: dict) -> str:
+    """Short HMAC of the record's password hash and session nonce; tokens carry it, so changing either revokes them."""
+    material = f"{record.get('password_hash') or ''}|{record.get('session_nonce') or ''}"
+    return _b64(hmac.new(_session_secret(), material.encode("utf-8"), hashlib.sha256).digest()[:12])
+
+
+def create_session_token(user: dict, ttl: float = SESSION_TTL) -> str:
+    """Signed token for a logged-in user ({name, email, stamp} from login_user) that expires after ttl seconds."""
+    payload = _b64(json.dumps(
+        {"name": user["name"], "email": user["email"], "stamp": user["stamp"], "exp": int(time.time() + ttl)},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8"))
+    signature = _b64(hmac.new(_session_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+    return f"{payload}.{signature}"
+
+
+def verify_session_token(token: str) -> Optional[dict]:
+    """
+    {name, email} if the token was signed here, has not expired and was not revoked, else None.
+    Forged and expired tokens are rejected locally; the revocation check reads the user record from
+    the cache, so it costs one Firebase read only on a cache miss.
+    """
+    try:
+        payload, signature = (token or "").split(".")
+        expected = _b64(hmac.new(_session_secret(), payload.encode("ascii"), hashlib.sha256).digest())
+        if not hmac.compare_digest(signature, expected):
+            return None
+        data = json.loads(_unb64(payload))
+    except (ValueError, UnicodeError):
+        return None
+    if data.get("exp", 0) < time.time():
+        return None
+    profile = _user_profile(data["email"])
+    if profile is None or not hmac.compare_digest(profile["stamp"], str(data.get("stamp", ""))):
+        return None
+    return {"name": data["name"], "email": data["email"]}
+
 
+# --- user profiles ---
 
-def _firebase_key_for_email(email: str) -> str:
-    return re.sub(r"[.#$\[\]]", "_", email.strip().lower())
+# user key -> (expiry, profile); never holds password hashes
+_user_cache: dict[str, tuple[float, dict]] = {}
+_user_cache_lock = threading.Lock()
+
+
+def _cached_user(user_key: str) -> Optional[dict]:
+    with _user_cache_lock:
+        entry = _user_cache.get(user_key)
+        if entry is None or entry[0] < time.monotonic():
+            _user_cache.pop(user_key, None)
+            return None
+        return entry[1]
+
+
+def _cache_user(user_key: str, data: Optional[dict]) -> None:
+    with _user_cache_lock:
+        if data is None:
+            _user_cache.pop(user_key, None)
+        else:
+            _user_cache[user_key] = (time.monotonic() + USER_CACHE_TTL, data)
+
+
+def _profile(record: dict, email: str) -> dict:
+    """What a session needs from a user record: name, email and session stamp."""
+    return {"name": record.get("name") or email, "email": record.get("email") or email, "stamp": _session_stamp(record)}
+
+
+def _user_profile(email: str) -> Optional[dict]:
+    """The user's profile from the cache, else from Firebase; None if missing or unreachable."""
+    user_key = firebase_key_for_email(email)
+    profile = _cached_user(user_key)
+    if profile is not None:
+        return profile
+    url, key = get_firebase_config()
+    if not url:
+        return None
+    try:
+        r = requests.get(f"{url}/users/{user_key}.json", params={"auth": key} if key else None, timeout=10)
+        data = r.json() if r.status_code == 200 else None
+    except Exception:
+        return None
+    if not data or not isinstance(data, dict):
+        return None
+    profile = _profile(data, email)
+    _cache_user(user_key, profile)
+    return profile
 
 
 def register_user(name: str, email: str, password: str) -> Tuple[bool, str]:
     """
     Register a new user: store name, email, hashed password in Firebase /users.
+    One conditional PUT (if-match: null_etag) creates the record only if the email is not taken.
     Returns (success, message).
     """
     name = (name or "").strip()
@@ -38,24 +194,20 @@ def register_user(name: str, email: str, password: str) -> Tuple[bool, str]:
     if not url:
         return False, "Firebase not configured. Set FIREBASE_DATABASE_URL in Settings."
 
-    path = f"{url}/users/{_firebase_key_for_email(email)}.json"
+    user_key = firebase_key_for_email(email)
+    path = f"{url}/users/{user_key}.json"
     params = {"auth": key} if key else None
-    # Check if user already exists
-    try:
-        r = requests.get(path, params=params, timeout=10)
-        if r.status_code == 200 and r.json() is not None:
-            return False, "This email is already registered. Please login."
-    except Exception:
-        pass
-
     payload = {
         "name": name,
         "email": email,
         "password_hash": _hash_password(password),
     }
     try:
-        r = requests.put(path, json=payload, params=params, timeout=10)
+        r = requests.put(path, json=payload, params=params, headers={"if-match": "null_etag"}, timeout=10)
+        if r.status_code == 412:  # the record exists
+            return False, "This email is already registered. Please login."
         r.raise_for_status()
+        _cache_user(user_key, _profile(payload, email))
         return True, "Registration successful. Please login."
     except Exception as e:
         return False, f"Could not register: {e}"
@@ -63,8 +215,10 @@ def register_user(name: str, email: str, password: str) -> Tuple[bool, str]:
 
 def login_user(email: str, password: str) -> Tuple[bool, str, Optional[dict]]:
     """
-    Login: fetch user from Firebase, compare password hash.
-    Returns (success, message, user_dict with name and email if success).
+    Login: fetch user from Firebase, compare password hash. Never uses the cache, so a password
+    changed or an account deleted elsewhere takes effect at once.
+    Accounts with the old unsalted hash are upgraded to scrypt on their next successful login.
+    Returns (success, message, user_dict with name, email and the session stamp if success).
     """
     email = (email or "").strip().lower()
     if not email or not password:
@@ -74,7 +228,8 @@ def login_user(email: str, password: str) -> Tuple[bool, str, Optional[dict]]:
     if not url:
         return False, "Firebase not configured. Set FIREBASE_DATABASE_URL in Settings.", None
 
-    path = f"{url}/users/{_firebase_key_for_email(email)}.json"
+    user_key = firebase_key_for_email(email)
+    path = f"{url}/users/{user_key}.json"
     params = {"auth": key} if key else None
     try:
         r = requests.get(path, params=params, timeout=10)
@@ -82,10 +237,38 @@ def login_user(email: str, password: str) -> Tuple[bool, str, Optional[dict]]:
             return False, "Login failed. Check email and password.", None
         data = r.json()
         if not data or not isinstance(data, dict):
+            _cache_user(user_key, None)
             return False, "No account found with this email. Please register.", None
+        _cache_user(user_key, _profile(data, email))  # fresh anyway: refresh the session stamp
         stored_hash = data.get("password_hash") or ""
-        if stored_hash != _hash_password(password):
+        if not _verify_password(password, stored_hash):
             return False, "Incorrect password.", None
-        return True, "Welcome!", {"name": data.get("name") or email, "email": data.get("email") or email}
+        if not stored_hash.startswith("scrypt$"):
+            upgraded = _hash_password(password)
+            try:
+                requests.patch(path, json={"password_hash": upgraded}, params=params, timeout=10).raise_for_status()
+                data = {**data, "password_hash": upgraded}
+                _cache_user(user_key, _profile(data, email))
+            except Exception:
+                pass  # keep the old hash; try again next login
+        return True, "Welcome!", _profile(data, email)
     except Exception as e:
         return False, f"Login failed: {e}", None
+
+
+def logout_user(email: str) -> None:
+    """Revoke all of the user's session tokens by giving the record a new session nonce."""
+    if not email:
+        return
+    user_key = firebase_key_for_email(email)
+    _cache_user(user_key, None)
+    url, key = get_firebase_config()
+    if not url:
+        return
+    try:
+        requests.patch(
+            f"{url}/users/{user_key}.json", json={"session_nonce": secrets.token_hex(8)},
+            params={"auth": key} if key else None, timeout=10,
+        ).raise_for_status()
+    except Exception:
+        pass  # the token is still dropped from this browser's URL
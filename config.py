@@ -10,23 +10,117 @@ BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 RAW_CSV = DATA_DIR / "raw_kcc.csv"
 CLEAN_CSV = DATA_DIR / "clean_kcc.csv"
-QA_JSON = DATA_DIR / "kcc_qa_pairs.json"
+QA_JSONL = DATA_DIR / "kcc_qa_pairs.jsonl"
+CLEAN_PARQUET = DATA_DIR / "clean_kcc.parquet"
+# Single unversioned build, used when index_versions has nothing published
 EMBEDDINGS_PKL = DATA_DIR / "kcc_embeddings.pkl"
 FAISS_INDEX = DATA_DIR / "kcc_faiss.index"
 META_PKL = DATA_DIR / "meta.pkl"
+# Versioned index builds (index_versions.py); the CURRENT file names the live one
+INDEX_VERSIONS_DIR = DATA_DIR / "index_versions"
+# Seconds between checks for a newly published index version
+INDEX_CHECK_INTERVAL = float(os.getenv("INDEX_CHECK_INTERVAL", "10"))
+# Published versions kept on disk for rollback
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
 
-# Embedding model (Sentence Transformer)
-EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Preprocessing: records whose estimated Jaccard similarity (character 5-grams of query + answer)
+# is at least this are treated as near duplicates and collapsed to one row
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+
+# Embedding model (Sentence Transformer). all-MiniLM-L6-v2 only understands English; for Hindi,
+# Tamil, Telugu and Kannada questions use a multilingual model such as intfloat/multilingual-e5-small
+# and rebuild the index (scripts/bench_multilingual.py compares models)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Text put before questions and before indexed KCC rows; E5 models are trained with "query: " and "passage: "
+_E5_MODEL = "e5" in EMBEDDING_MODEL.lower()
+EMBEDDING_QUERY_PREFIX = os.getenv("EMBEDDING_QUERY_PREFIX", "query: " if _E5_MODEL else "")
+EMBEDDING_PASSAGE_PREFIX = os.getenv("EMBEDDING_PASSAGE_PREFIX", "passage: " if _E5_MODEL else "")
+# Per-language indexes of translated KCC content (build_embeddings_faiss.py --lang hi --input ...),
+# one versioned root per language code. A question detected as that language searches it as well
+LANG_INDEX_DIR = DATA_DIR / "lang_indexes"
+
+# Edge/kiosk mode: directory of an unpacked bundle from scripts/build_edge_bundle.py. When set,
+# retrieval uses the bundle's int8 ONNX encoder, SQ8 index, memory-mapped metadata and answers
+# instead of torch + kcc_faiss.index + meta.pkl
+EDGE_BUNDLE_DIR = os.getenv("EDGE_BUNDLE_DIR", "")
+# RAM target for retrieval in edge mode (MB); 0 = none. It picks the load options and startup fails
+# if the encoder and index alone need more, but it is not enforced after that (only logged)
+RETRIEVAL_MEMORY_MB = int(os.getenv("RETRIEVAL_MEMORY_MB", "0"))
+# Max tokens per text for the edge encoder (KCC questions are short)
+EDGE_MAX_SEQ_LEN = int(os.getenv("EDGE_MAX_SEQ_LEN", "128"))
+
+# Sharded retrieval: comma-separated URLs of shard workers (scripts/serve_shards.py). When set,
+# each query is sent to every shard and their top hits are merged; the local index is not loaded
+SHARD_URLS = [u.strip().rstrip("/") for u in os.getenv("SHARD_URLS", "").split(",") if u.strip()]
+# Shards written by scripts/build_shards.py
+SHARD_DIR = DATA_DIR / "shards"
+# Seconds to wait for the shards; a shard slower than this is left out of that answer
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "0.5"))
+
+# Languages offered in the app: code -> (display name, native name)
+LANG_OPTIONS = {
+    "en": ("English", "English"),
+    "hi": ("Hindi", "हिंदी"),
+    "ta": ("Tamil", "தமிழ்"),
+    "te": ("Telugu", "తెలుగు"),
+    "kn": ("Kannada", "ಕನ್ನಡ"),
+}
 
 # FAISS search
 TOP_K = 5
+# Rows fetched per TOP_K slot before collapsing hits to distinct answers (many KCC rows share one)
+ANSWER_OVERFETCH = int(os.getenv("ANSWER_OVERFETCH", "4"))
 # Minimum similarity (0–1) to show an answer; below this we say "no close match"
 MIN_SIMILARITY = 0.32
 
 # Ollama (Local AI)
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Several Ollama servers (comma-separated) to load-balance across; defaults to OLLAMA_BASE_URL
+OLLAMA_BASE_URLS = [
+    u.strip().rstrip("/") for u in os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE_URL).split(",") if u.strip()
+]
+# Seconds to wait for a connection to an Ollama server before failing over to the next one
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3"))
+# Seconds between health checks (/api/tags) of each Ollama server
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "30"))
 # Default model; will be overridden by UI selection if possible
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# How long Ollama keeps a model loaded after a request (Ollama duration string)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Token budget for the KCC reference passages in the LLM prompt
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "400"))
+
+# Precomputed LLM answers per KCC row and language (scripts/precompute_answers.py);
+# served instead of calling Ollama when the top FAISS hit scores at least PRECOMPUTED_MIN_SCORE
+ANSWER_STORE_DB = DATA_DIR / "answer_store.sqlite"
+if EDGE_BUNDLE_DIR:
+    ANSWER_STORE_DB = Path(EDGE_BUNDLE_DIR) / "answers.sqlite"
+PRECOMPUTED_MIN_SCORE = float(os.getenv("PRECOMPUTED_MIN_SCORE", "0.80"))
+
+# Confidence bypass: for English questions, show the KCC answer directly (no LLM call) when the
+# top FAISS score is at least BYPASS_MIN_SCORE and beats the runner-up by BYPASS_MIN_GAP.
+# While any request is waiting for an Ollama slot, BYPASS_BUSY_MIN_SCORE applies instead.
+BYPASS_MIN_SCORE = float(os.getenv("BYPASS_MIN_SCORE", "0.85"))
+BYPASS_BUSY_MIN_SCORE = float(os.getenv("BYPASS_BUSY_MIN_SCORE", "0.70"))
+BYPASS_MIN_GAP = float(os.getenv("BYPASS_MIN_GAP", "0.05"))
+
+# Scheduler: max parallel requests per Ollama server, and how long a request may wait
+# in the queue (seconds) before falling back to the offline answer
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+# Vision model for the Plant Doctor (moondream is small and fast)
+VISION_MODEL = os.getenv("OLLAMA_VISION_MODEL", "moondream")
+
+# Plant Doctor diagnosis cache (keyed by perceptual hash of the leaf photo)
+DIAGNOSIS_CACHE_JSON = DATA_DIR / "diagnosis_cache.json"
+DIAGNOSIS_CACHE_MAX = int(os.getenv("DIAGNOSIS_CACHE_MAX", "5000"))
+# New diagnoses are written to the cache file at most this often (seconds), and at the end of a batch
+DIAGNOSIS_CACHE_FLUSH_S = float(os.getenv("DIAGNOSIS_CACHE_FLUSH_S", "5"))
+# Max differing bits (of 64) for two photos to count as the same leaf
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+# Batch diagnosis: parallel vision calls and retries per image for transient failures
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "3"))
 
 # IBM Watsonx (Legacy / Optional)
 WATSONX_APIKEY = os.getenv("WATSONX_APIKEY")
@@ -41,3 +135,68 @@ FIREBASE_DATABASE_URL = os.getenv(
 ).rstrip("/")
 # Optional: API key or auth token for secured rules (paste from Firebase Console)
 FIREBASE_API_KEY = os.getenv("FIREBASE_API_KEY", "")
+# Login sessions: signed, expiring tokens (HMAC-SHA256) kept in the page URL, so a reload or a
+# bookmarked link stays logged in without a password. SESSION_SECRET signs them (default: a
+# random key created in data/.session_secret); SESSION_TTL is their lifetime in seconds
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+SESSION_SECRET_FILE = DATA_DIR / ".session_secret"
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(12 * 3600)))
+# Seconds a fetched user profile (name, email, session stamp) is reused in this process; also how
+# long a token revoked on another app server can still be accepted here
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+# Threads for password hashing (scrypt, ~16 MB and tens of ms each), shared by all sessions
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+# Conversation history: entries per page, and how long (seconds) a fetched page is reused
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "10"))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "300"))
+
+# Conversation analytics (scripts/analyze_conversations.py): output folder, top score below which a
+# question counts as unmatched, and max distinct queries kept in the running counts
+ANALYTICS_DIR = DATA_DIR / "analytics"
+ANALYTICS_LOW_SCORE = float(os.getenv("ANALYTICS_LOW_SCORE", "0.5"))
+ANALYTICS_MAX_QUERIES = int(os.getenv("ANALYTICS_MAX_QUERIES", "20000"))
+
+# Sidebar feeds: provider per feed ("mock", "stub" or a live source), seconds a value stays fresh,
+# and how long a stale value may still be shown while it is refreshed in the background
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "mock")  # mock | stub | openweather
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "mock")  # mock | stub | history | agmarknet
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
+AGMARKNET_API_KEY = os.getenv("AGMARKNET_API_KEY", "")  # data.gov.in API key
+WEATHER_CITY = os.getenv("WEATHER_CITY", "Hyderabad")
+# Agmarknet market name, or "market, district, state" where several districts have a mandi of
+# that name; empty = any market
+MANDI_MARKET = os.getenv("MANDI_MARKET", "")
+WEATHER_TTL = float(os.getenv("WEATHER_TTL", "600"))
+PRICES_TTL = float(os.getenv("PRICES_TTL", "3600"))
+FEED_MAX_STALE = float(os.getenv("FEED_MAX_STALE", "86400"))
+# Seconds between reruns of the sidebar feed widgets (they read from the cache, so this is cheap)
+FEED_WIDGET_REFRESH = float(os.getenv("FEED_WIDGET_REFRESH", "60"))
+# Mandi price history (columnar .npy files, filled by scripts/ingest_prices.py)
+PRICE_HISTORY_DIR = DATA_DIR / "price_history"
+# Fraction of the TTL after which a read also starts a background refresh
+FEED_REFRESH_AHEAD = float(os.getenv("FEED_REFRESH_AHEAD", "0.8"))
+# After a failed fetch, reads return the fallback at once and retry in the background at most this
+# often (seconds), so a provider that is down never blocks a rerun for its request timeout
+FEED_RETRY_AFTER = float(os.getenv("FEED_RETRY_AFTER", "60"))
+
+# Text-to-speech: "gtts" (online) or "pyttsx3" (local, offline)
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+TTS_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", str(DATA_DIR / "tts_cache")))
+# Size cap for the audio cache (MB); the least recently played files are deleted first. 0 = no cap
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "500"))
+# Max characters per synthesized chunk (answers are split at sentence boundaries)
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "200"))
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+
+# Log how long each part of the Streamlit page takes to run (and show it in the sidebar)
+RERUN_TIMING = os.getenv("RERUN_TIMING", "").lower() in ("1", "true", "yes")
+
+# Per-request profiling (profiling.py): fraction of questions profiled (0-1), and users (comma-separated
+# emails) whose every question is profiled
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_USERS = {u.strip().lower() for u in os.getenv("PROFILE_USERS", "").split(",") if u.strip()}
+# "sampling" (wall-clock stack samples, flame-graph input) or "cprofile" (deterministic, pstats)
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampling")
+# Milliseconds between stack samples in sampling mode
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(DATA_DIR / "profiles")))
@@ -0,0 +1,182 @@
+"""
+Runtime for the offline edge bundle built by scripts/build_edge_bundle.py.
+Loads the int8 ONNX encoder (onnxruntime + tokenizers, no torch), the SQ8 FAISS index and
+memory-mapped metadata, choosing load options from RETRIEVAL_MEMORY_MB. retrieval.py uses this when
+EDGE_BUNDLE_DIR is set. Every load checks the file sizes against manifest.json; checksums are
+checked on the first load of a bundle.
+"""
+import functools
+import hashlib
+import json
+import logging
+import resource
+from pathlib import Path
+
+import numpy as np
+
+from config import EDGE_BUNDLE_DIR, RETRIEVAL_MEMORY_MB
+from index_versions import MANIFEST_FILE, verify
+
+log = logging.getLogger(__name__)
+
+# Above this budget, onnxruntime may keep its memory arena (faster, but it grows and is never returned)
+_ARENA_MIN_MB = 1024
+# Written into the bundle once all checksums match; holds the sha256 of the manifest it vouches for
+_VERIFIED_FILE = ".verified"
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:  # not Linux: fall back to the peak
+        return peak_rss_mb()
+
+
+class TextColumn:
+    """Read-only list of strings backed by a memory-mapped UTF-8 blob and an offsets array."""
+
+    def __init__(self, blob: Path, offsets: Path):
+        self._offsets = np.load(offsets, mmap_mode="r")
+        self._blob = np.memmap(blob, dtype=np.uint8, mode="r") if blob.stat().st_size else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def write_text_column(texts, blob: Path, offsets: Path) -> None:
+    """Write strings as one UTF-8 blob plus int64 offsets (len + 1 entries), for TextColumn."""
+    ends = [0]
+    with open(blob, "wb") as f:
+        for text in texts:
+            data = str(text).encode("utf-8")
+            f.write(data)
+            ends.append(ends[-1] + len(data))
+    np.save(offsets, np.asarray(ends, dtype=np.int64))
+
+
+def verify_bundle(path: Path) -> None:
+    """
+    Raise RuntimeError if a bundle file is missing or has the wrong size. The first load of a bundle
+    (per manifest) also compares checksums, which reads every file once.
+    """
+    stamp = hashlib.sha256((path / MANIFEST_FILE).read_bytes()).hexdigest()
+    marker = path / _VERIFIED_FILE
+    checked = marker.exists() and marker.read_text().strip() == stamp
+    problems = verify(path, checksums=not checked)
+    if problems:
+        raise RuntimeError(f"Edge bundle {path} is damaged: " + "; ".join(problems))
+    if not checked:
+        try:
+            marker.write_text(stamp)
+        except OSError:  # read-only bundle: checksums are compared again next start
+            log.info("Could not write %s; bundle checksums will be checked on every start", marker)
+
+
+class EdgeEncoder:
+    """Drop-in for SentenceTransformer.encode with the bundle's ONNX model (mean pooling, L2 normalized)."""
+
+    def __init__(self, bundle: Path, manifest: dict, low_memory: bool):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        enc = manifest["encoder"]
+        self.tokenizer = Tokenizer.from_file(str(bundle / enc["tokenizer"]))
+        self.tokenizer.enable_truncation(max_length=enc["max_seq_len"])
+        self.tokenizer.enable_padding(pad_id=enc["pad_id"], pad_token=enc["pad_token"])
+        self.inputs = enc["inputs"]
+        self.pooling = enc.get("pooling", "mean")
+        # The prefix belongs to the model the bundle was exported from, not to this machine's EMBEDDING_MODEL
+        self.query_prefix = "query: " if "e5" in enc.get("source_model", "").lower() else ""
+        options = ort.SessionOptions()
+        if low_memory:
+            options.enable_cpu_mem_arena = False
+            options.enable_mem_pattern = False
+            options.intra_op_num_threads = 1
+        self.session = ort.InferenceSession(str(bundle / enc["model"]), options, providers=["CPUExecutionProvider"])
+
+    def encode(self, texts, normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        batch = self.tokenizer.encode_batch(list(texts))
+        feeds = {
+            "input_ids": np.array([e.ids for e in batch], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in batch], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in batch], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: feeds[name] for name in self.inputs})[0]
+        if self.pooling == "cls":
+            emb = hidden[:, 0]
+        else:
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            emb = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if normalize_embeddings:
+            emb = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+        return emb.astype(np.float32)
+
+
+class EdgeBundle:
+    """
+    Encoder, index and metadata of an unpacked bundle, loaded for a RAM target (MB, 0 = none): the
+    index is memory-mapped instead of read into RAM when it would take more than half of it, and
+    onnxruntime runs single-threaded without its memory arena below 1 GB. The target is not enforced
+    after loading; check_memory only logs when resident memory goes over it.
+    """
+
+    def __init__(self, path, budget_mb: int = 0):
+        import faiss
+
+        self.path = Path(path)
+        verify_bundle(self.path)
+        with open(self.path / MANIFEST_FILE, encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.budget_mb = budget_mb
+        index_mb = (self.path / self.manifest["index"]).stat().st_size / 2**20
+        model_mb = (self.path / self.manifest["encoder"]["model"]).stat().st_size / 2**20
+        self.mmap_index = bool(budget_mb) and index_mb > budget_mb / 2
+        # onnxruntime needs roughly twice the model file while loading
+        needed = 2 * model_mb + (0 if self.mmap_index else index_mb)
+        if budget_mb and needed > budget_mb:
+            raise RuntimeError(
+                f"Edge bundle needs about {needed:.0f} MB for the encoder and index; "
+                f"RETRIEVAL_MEMORY_MB is {budget_mb}"
+            )
+
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if self.mmap_index else 0
+        self.index = faiss.read_index(str(self.path / self.manifest["index"]), flags)
+        self.encoder = EdgeEncoder(self.path, self.manifest, low_memory=bool(budget_mb) and budget_mb < _ARENA_MIN_MB)
+        self.meta = {
+            "queries": TextColumn(self.path / "queries.bin", self.path / "queries.offsets.npy"),
+            "dim": self.manifest["dim"],
+        }
+        if (self.path / "answer_ids.npy").exists():
+            self.meta["answer_table"] = TextColumn(self.path / "answer_table.bin", self.path / "answer_table.offsets.npy")
+        else:  # bundle built before answers were interned
+            self.meta["answers"] = TextColumn(self.path / "answers.bin", self.path / "answers.offsets.npy")
+        for name in ("answer_ids", "match_hashes", "match_ids", "counts"):
+            npy = self.path / f"{name}.npy"
+            if npy.exists():
+                self.meta[name] = np.load(npy, mmap_mode="r")
+        self._warned = False
+        self.check_memory()
+
+    def check_memory(self) -> None:
+        """Log once if resident memory goes over the budget (the OS may then start evicting mapped pages)."""
+        if self.budget_mb and not self._warned and current_rss_mb() > self.budget_mb:
+            self._warned = True
+            log.warning("Retrieval RSS %.0f MB is over RETRIEVAL_MEMORY_MB=%d", current_rss_mb(), self.budget_mb)
+
+
+@functools.lru_cache(maxsize=1)
+def get_edge_bundle() -> EdgeBundle:
+    return EdgeBundle(EDGE_BUNDLE_DIR, RETRIEVAL_MEMORY_MB)
@@ -0,0 +1,269 @@
+"""
+Feed layer for the sidebar widgets (weather, mandi prices).
+Providers fetch data for one key (a city or a market); FeedCache keeps the last value per key for
+a TTL and serves stale values while a background thread refreshes them, so widgets render from
+memory on every Streamlit rerun and only a cold key ever waits for the network.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+
+from config import (
+    AGMARKNET_API_KEY,
+    FEED_MAX_STALE,
+    FEED_REFRESH_AHEAD,
+    FEED_RETRY_AFTER,
+    OPENWEATHER_API_KEY,
+    PRICE_PROVIDER,
+    PRICES_TTL,
+    WEATHER_PROVIDER,
+    WEATHER_TTL,
+)
+
+
+class FeedProvider:
+    """Base class for feed sources. Subclasses implement fetch(key) and raise on failure."""
+
+    name = "base"
+
+    def fetch(self, key: str):
+        raise NotImplementedError
+
+
+class MockWeatherProvider(FeedProvider):
+    """Random demo weather."""
+
+    name = "mock"
+
+    def fetch(self, key: str) -> dict:
+        conditions = ["Sunny ☀️", "Cloudy ☁️", "Rainy 🌧️", "Windy 💨"]
+        return {
+            "temp": random.randint(20, 35),
+            "condition": random.choice(conditions),
+            "humidity": random.randint(30, 80),
+            "city": key,
+        }
+
+
+class StubWeatherProvider(FeedProvider):
+    """Fixed, offline weather for tests and demos without network."""
+
+    name = "stub"
+
+    def fetch(self, key: str) -> dict:
+        return {"temp": 28, "condition": "Sunny ☀️", "humidity": 55, "city": key}
+
+
+class OpenWeatherProvider(FeedProvider):
+    """Current weather from OpenWeatherMap (needs OPENWEATHER_API_KEY)."""
+
+    name = "openweather"
+    URL = "https://api.openweathermap.org/data/2.5/weather"
+    ICONS = {"Clear": "Sunny ☀️", "Clouds": "Cloudy ☁️", "Rain": "Rainy 🌧️", "Drizzle": "Rainy 🌧️",
+             "Thunderstorm": "Stormy ⛈️", "Mist": "Misty 🌫️", "Haze": "Hazy 🌫️"}
+
+    def fetch(self, key: str) -> dict:
+        if not OPENWEATHER_API_KEY:
+            raise RuntimeError("OPENWEATHER_API_KEY is not set")
+        r = requests.get(self.URL, params={"q": key, "appid": OPENWEATHER_API_KEY, "units": "metric"}, timeout=10)
+        r.raise_for_status()
+        data = r.json()
+        main = data["weather"][0]["main"] if data.get("weather") else ""
+        return {
+            "temp": round(data["main"]["temp"]),
+            "condition": self.ICONS.get(main, main),
+            "humidity": data["main"]["humidity"],
+            "city": data.get("name") or key,
+        }
+
+
+class MockPriceProvider(FeedProvider):
+    """Fixed demo mandi prices (also used as the stub)."""
+
+    name = "mock"
+
+    def fetch(self, key: str) -> list[dict]:
+        return [
+            {"crop": "Wheat", "price": "₹2125/qt"},
+            {"crop": "Mustard", "price": "₹5450/qt"},
+            {"crop": "Potato", "price": "₹1200/qt"},
+            {"crop": "Cotton", "price": "₹6300/qt"},
+        ]
+
+
+class PriceHistoryProvider(FeedProvider):
+    """Latest modal prices at a market from the local price history (scripts/ingest_prices.py)."""
+
+    name = "history"
+    MAX_CROPS = 6
+
+    def fetch(self, key: str) -> list[dict]:
+        from price_history import get_price_history
+
+        history = get_price_history()
+        market = history.find_market(key) if key else (history.market_keys() or [None])[0]
+        if market is None:
+            return []
+        latest = sorted(history.latest_prices(market), key=lambda p: p["date"], reverse=True)[: self.MAX_CROPS]
+        return [{"crop": p["crop"], "price": f"₹{p['price']}/qt"} for p in latest]
+
+
+class AgmarknetProvider(FeedProvider):
+    """Daily modal prices from the Agmarknet dataset on data.gov.in (needs AGMARKNET_API_KEY)."""
+
+    name = "agmarknet"
+    URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+    MAX_CROPS = 6
+
+    def fetch(self, key: str) -> list[dict]:
+        if not AGMARKNET_API_KEY:
+            raise RuntimeError("AGMARKNET_API_KEY is not set")
+        params = {"api-key": AGMARKNET_API_KEY, "format": "json", "limit": 100}
+        # key is a market name, optionally qualified as "market, district, state"
+        for field, value in zip(("market", "district", "state"), (p.strip() for p in key.split(","))):
+            if value:
+                params[f"filters[{field}]"] = value
+        r = requests.get(self.URL, params=params, timeout=15)
+        r.raise_for_status()
+        prices, seen = [], set()
+        for rec in r.json().get("records", []):
+            crop = rec.get("commodity")
+            if not crop or crop in seen or not rec.get("modal_price"):
+                continue
+            seen.add(crop)
+            prices.append({"crop": crop, "price": f"₹{rec['modal_price']}/qt"})
+            if len(prices) >= self.MAX_CROPS:
+                break
+        return prices
+
+
+WEATHER_PROVIDERS = {p.name: p for p in (MockWeatherProvider, StubWeatherProvider, OpenWeatherProvider)}
+PRICE_PROVIDERS = {
+    "mock": MockPriceProvider,
+    "stub": MockPriceProvider,
+    PriceHistoryProvider.name: PriceHistoryProvider,
+    AgmarknetProvider.name: AgmarknetProvider,
+}
+
+# Shared by all feeds; refreshes are short network calls
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="feed-refresh")
+
+
+class FeedCache:
+    """
+    Per-key cache in front of a provider.
+    Fresh (age < ttl): served from memory; past refresh_ahead * ttl a background refresh starts.
+    Stale (ttl <= age < max_stale): served from memory while a background refresh runs.
+    Missing or older than max_stale: fetched synchronously, unless the last fetch of the key failed:
+    then the old value (or the default) is returned at once and the fetch is retried in the
+    background every retry_after seconds. Failed refreshes keep the old value.
+    """
+
+    def __init__(self, provider: FeedProvider, ttl: float, max_stale: float = FEED_MAX_STALE,
+                 refresh_ahead: float = FEED_REFRESH_AHEAD, retry_after: float = FEED_RETRY_AFTER):
+        self.provider = provider
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.refresh_ahead = refresh_ahead
+        self.retry_after = retry_after
+        self._entries: dict = {}  # key -> (fetched_at, value)
+        self._errors: dict = {}  # key -> last error message
+        self._failed_at: dict = {}  # key -> time of the last failed fetch
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    def _refresh(self, key: str):
+        try:
+            value = self.provider.fetch(key)
+        except Exception as e:
+            with self._lock:
+                self._errors[key] = str(e)
+                self._failed_at[key] = time.time()
+            raise
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._errors.pop(key, None)
+            self._failed_at.pop(key, None)
+        return value
+
+    def _refresh_in_background(self, key: str) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return  # one refresh per key at a time
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._refresh(key)
+            except Exception:
+                pass  # keep serving the old value; error is in status()
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        _refresh_pool.submit(run)
+
+    def get(self, key: str, default=None):
+        """Cached value for key (possibly stale), fetching only on a cold or expired key; default if that fails."""
+        with self._lock:
+            entry = self._entries.get(key)
+            failed_at = self._failed_at.get(key)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age < self.max_stale:
+                if age >= self.ttl * self.refresh_ahead:
+                    self._refresh_in_background(key)
+                return entry[1]
+        if failed_at is not None:
+            # The provider was failing: do not block this rerun on it again
+            if time.time() - failed_at >= self.retry_after:
+                self._refresh_in_background(key)
+            return entry[1] if entry is not None else default
+        try:
+            return self._refresh(key)
+        except Exception:
+            return entry[1] if entry is not None else default
+
+    def warm(self, keys) -> None:
+        """Start background fetches for keys that are not cached yet (e.g. at app start)."""
+        for key in keys:
+            with self._lock:
+                cached = key in self._entries
+            if not cached:
+                self._refresh_in_background(key)
+
+    def status(self, key: str) -> dict:
+        """{age_s, stale, error} for key; age_s is None if never fetched."""
+        with self._lock:
+            entry = self._entries.get(key)
+            error = self._errors.get(key)
+        age = time.time() - entry[0] if entry else None
+        return {"age_s": age, "stale": age is not None and age >= self.ttl, "error": error}
+
+
+def _make(registry: dict, name: str) -> FeedProvider:
+    if name not in registry:
+        raise ValueError(f"Unknown feed provider '{name}'. Choose from: {', '.join(registry)}")
+    return registry[name]()
+
+
+_weather: Optional[FeedCache] = None
+_prices: Optional[FeedCache] = None
+
+
+def get_weather_feed() -> FeedCache:
+    global _weather
+    if _weather is None:
+        _weather = FeedCache(_make(WEATHER_PROVIDERS, WEATHER_PROVIDER), ttl=WEATHER_TTL)
+    return _weather
+
+
+def get_price_feed() -> FeedCache:
+    global _prices
+    if _prices is None:
+        _prices = FeedCache(_make(PRICE_PROVIDERS, PRICE_PROVIDER), ttl=PRICES_TTL)
+    return _prices
@@ -1,13 +1,21 @@
 """
-Save conversation data (query + answers) to Firebase Realtime Database.
+Save conversation data (query + answers) to Firebase Realtime Database and read it back per user.
 Uses REST API; no Firebase SDK required.
+Conversations live under /conversations/<user key>; history is read a page at a time
+(orderBy timestamp, limitToLast) and cached locally for HISTORY_CACHE_TTL seconds.
 """
+import json
 import os
+import re
+import threading
+import time
 from datetime import datetime, timezone
 from typing import Optional
 
 import requests
 
+from config import HISTORY_CACHE_TTL, HISTORY_PAGE_SIZE
+
 
 DEFAULT_FIREBASE_URL = "https://kishanagent-d81dc-default-rtdb.asia-southeast1.firebasedatabase.app"
 
@@ -21,24 +29,52 @@ def get_firebase_config():
     return url or None, key or None
 
 
+def firebase_key_for_email(email: str) -> str:
+    """Email as a Firebase key ('.', '#', '$', '[', ']' are not allowed in keys)."""
+    return re.sub(r"[.#$\[\]]", "_", email.strip().lower())
+
+
+def _resolve_config(base_url: Optional[str], api_key: Optional[str]):
+    url, key = get_firebase_config()
+    if base_url is not None:
+        url = (base_url or "").rstrip("/")
+    if api_key is not None:
+        key = api_key or None
+    return url, key
+
+
+# Read-through cache of history pages: (user key, cursor, limit) -> (fetched at, page)
+_history_cache: dict = {}
+_history_lock = threading.Lock()
+
+
+def _invalidate_history(user_key: str) -> None:
+    with _history_lock:
+        for cache_key in [k for k in _history_cache if k[0] == user_key]:
+            del _history_cache[cache_key]
+
+
 def save_to_firebase(
     query: str,
     offline_answer: str,
     online_answer: Optional[str] = None,
     *,
+    user_email: str = "",
+    results: Optional[list[dict]] = None,
+    language: str = "",
+    route: str = "",
     base_url: Optional[str] = None,
     api_key: Optional[str] = None,
 ) -> bool:
     """
-    Save one conversation entry to Firebase Realtime Database at /conversations.
+    Save one conversation entry to Firebase Realtime Database at /conversations/<user key>
+    (or /conversations when no user is logged in).
+    results (from get_offline_answer), language and route are logged for retrieval analytics
+    (scripts/analyze_conversations.py).
     Uses base_url and api_key from env if not provided.
     Returns True if saved successfully.
     """
-    url, key = get_firebase_config()
-    if base_url is not None:
-        url = (base_url or "").rstrip("/")
-    if api_key is not None:
-        key = api_key or None
+    url, key = _resolve_config(base_url, api_key)
     if not url:
         return False
 
@@ -47,9 +83,14 @@ def save_to_firebase(
         "offline_answer": offline_answer,
         "online_answer": online_answer or "",
         "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+        "language": language,
+        "route": route,
+        "hit_ids": [r["id"] for r in results or [] if "id" in r],
+        "scores": [round(r["score"], 4) for r in results or []],
     }
 
-    path = f"{url}/conversations.json"
+    user_key = firebase_key_for_email(user_email) if user_email else ""
+    path = f"{url}/conversations/{user_key}.json" if user_key else f"{url}/conversations.json"
     params = {}
     if key:
         params["auth"] = key
@@ -57,6 +98,62 @@ def save_to_firebase(
     try:
         r = requests.post(path, json=payload, params=params or None, timeout=10)
         r.raise_for_status()
-        return True
     except Exception:
         return False
+    if user_key:
+        _invalidate_history(user_key)
+    return True
+
+
+def load_history(
+    user_email: str,
+    limit: int = HISTORY_PAGE_SIZE,
+    before: Optional[str] = None,
+    *,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> tuple[list[dict], Optional[str]]:
+    """
+    One page of the user's saved conversations, newest first.
+    Pass the returned cursor as `before` to get the next (older) page; it is None on the last page.
+    Only `limit` entries are downloaded per call (needs ".indexOn": "timestamp", see README).
+    Returns ([], None) if Firebase is not configured or the read fails.
+    """
+    url, key = _resolve_config(base_url, api_key)
+    if not url or not user_email:
+        return [], None
+    user_key = firebase_key_for_email(user_email)
+    cache_key = (user_key, before, limit)
+    with _history_lock:
+        cached = _history_cache.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < HISTORY_CACHE_TTL:
+        return cached[1]
+
+    # endAt is inclusive, so ask for one extra to skip the entry the cursor points at,
+    # and one more to know whether an older page exists
+    params = {
+        "orderBy": json.dumps("timestamp"),
+        "limitToLast": limit + (2 if before else 1),
+    }
+    if before:
+        params["endAt"] = json.dumps(before)
+    if key:
+        params["auth"] = key
+    try:
+        r = requests.get(f"{url}/conversations/{user_key}.json", params=params, timeout=10)
+        r.raise_for_status()
+        data = r.json() or {}
+    except Exception:
+        return [], None
+
+    entries = [
+        dict(value, id=entry_id)
+        for entry_id, value in data.items()
+        if isinstance(value, dict) and value.get("timestamp") and value.get("timestamp") != before
+    ]
+    entries.sort(key=lambda e: e["timestamp"], reverse=True)
+    page = entries[:limit]
+    cursor = page[-1]["timestamp"] if len(entries) > limit else None
+    with _history_lock:
+        _history_cache[cache_key] = (time.monotonic(), (page, cursor))
+    return page, cursor
@@ -0,0 +1,285 @@
+"""
+Versioned index builds with atomic hot-swap.
+build_embeddings_faiss.py writes each build (index, metadata, embeddings and a manifest.json with
+checksums and the embedding model) to a new directory under data/index_versions/ and then points
+the CURRENT file at it with an atomic rename, so a reader never sees a half-written or mismatched
+pair. IndexManager serves queries from the version it has loaded, notices when CURRENT changes,
+loads and verifies the new version in a background thread and swaps it in with one reference
+assignment; queries never wait for a load. Rolling back is pointing CURRENT at an older version.
+Without any published version, the legacy data/kcc_faiss.index + meta.pkl are used.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL,
+    FAISS_INDEX,
+    INDEX_CHECK_INTERVAL,
+    INDEX_KEEP_VERSIONS,
+    INDEX_VERSIONS_DIR,
+    META_PKL,
+)
+
+log = logging.getLogger(__name__)
+
+INDEX_FILE = "kcc_faiss.index"
+META_FILE = "meta.pkl"
+EMBEDDINGS_FILE = "kcc_embeddings.pkl"
+MANIFEST_FILE = "manifest.json"
+_POINTER = "CURRENT"
+_STAGING_PREFIX = ".staging-"
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _version_order(name: str) -> tuple:
+    """Sort key for version names: build time, then the -N suffix of same-second builds as a number."""
+    base, _, suffix = name.rpartition("-")
+    if base.count("-") == 1 and suffix.isdigit():
+        return base, int(suffix)
+    return name, 1
+
+
+def new_version(root: Path = INDEX_VERSIONS_DIR) -> Path:
+    """Empty staging directory for a build; publish() turns it into a version."""
+    root.mkdir(parents=True, exist_ok=True)
+    name = time.strftime("%Y%m%d-%H%M%S")
+    suffix = 1
+    while (root / name).exists() or (root / f"{_STAGING_PREFIX}{name}").exists():
+        suffix += 1
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+    staging = root / f"{_STAGING_PREFIX}{name}"
+    staging.mkdir()
+    return staging
+
+
+def publish(staging: Path, info: dict, keep: int = INDEX_KEEP_VERSIONS) -> str:
+    """
+    Write the manifest (info + file sizes and sha256), move the staging directory into place, make it
+    CURRENT and prune old versions. Returns the version name.
+    """
+    root = staging.parent
+    version = staging.name[len(_STAGING_PREFIX):]
+    files = sorted(p for p in staging.iterdir() if p.is_file())
+    manifest = {
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        **info,
+        "files": {p.name: {"bytes": p.stat().st_size, "sha256": _sha256(p)} for p in files},
+    }
+    with open(staging / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging, root / version)
+    set_current(version, root)
+    prune(keep, root)
+    return version
+
+
+def set_current(version: str, root: Path = INDEX_VERSIONS_DIR) -> None:
+    """Atomically point CURRENT at a published version (also how rollback works)."""
+    if not (root / version / MANIFEST_FILE).exists():
+        raise ValueError(f"No published index version {version!r} in {root}")
+    tmp = root / f"{_POINTER}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, root / _POINTER)
+
+
+def current_version(root: Path = INDEX_VERSIONS_DIR) -> Optional[str]:
+    try:
+        return (root / _POINTER).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(root: Path = INDEX_VERSIONS_DIR) -> list[dict]:
+    """Manifests of all published versions, oldest first."""
+    if not root.exists():
+        return []
+    manifests = []
+    paths = (p for p in root.iterdir() if p.is_dir() and not p.name.startswith(_STAGING_PREFIX))
+    for path in sorted(paths, key=lambda p: _version_order(p.name)):
+        try:
+            with open(path / MANIFEST_FILE, encoding="utf-8") as f:
+                manifests.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # not a complete version
+    return manifests
+
+
+def previous_version(root: Path = INDEX_VERSIONS_DIR) -> Optional[str]:
+    """The newest published version older than CURRENT (the rollback target)."""
+    current = current_version(root)
+    older = [m["version"] for m in list_versions(root)
+             if current is None or _version_order(m["version"]) < _version_order(current)]
+    return older[-1] if older else None
+
+
+def verify(path: Path, names: Optional[list[str]] = None, checksums: bool = True) -> list[str]:
+    """
+    Problems with a version directory (missing files, size or checksum mismatch); empty if it is intact.
+    checksums=False only compares sizes, which needs no reads.
+    """
+    try:
+        with open(path / MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        return [f"manifest: {e}"]
+    problems = []
+    for name, info in manifest["files"].items():
+        if names is not None and name not in names:
+            continue
+        file = path / name
+        if not file.exists():
+            problems.append(f"{name}: missing")
+        elif file.stat().st_size != info["bytes"]:
+            problems.append(f"{name}: {file.stat().st_size} bytes, expected {info['bytes']}")
+        elif checksums and _sha256(file) != info["sha256"]:
+            problems.append(f"{name}: checksum mismatch")
+    return problems
+
+
+def prune(keep: int, root: Path = INDEX_VERSIONS_DIR) -> list[str]:
+    """Delete all but the newest `keep` versions (never CURRENT) and stale staging directories."""
+    current = current_version(root)
+    removed = []
+    versions = [m["version"] for m in list_versions(root)]
+    for version in versions[:-keep] if keep > 0 else []:
+        if version != current:
+            shutil.rmtree(root / version, ignore_errors=True)
+            removed.append(version)
+    cutoff = time.time() - 24 * 3600
+    for staging in root.glob(f"{_STAGING_PREFIX}*"):
+        if staging.stat().st_mtime < cutoff:  # a build that crashed over a day ago
+            shutil.rmtree(staging, ignore_errors=True)
+    return removed
+
+
+def current_paths(root: Path = INDEX_VERSIONS_DIR) -> tuple[Path, Path]:
+    """(index, meta.pkl) of the CURRENT version, or the legacy data/ files if nothing is published."""
+    version = current_version(root)
+    if version is None:
+        return FAISS_INDEX, META_PKL
+    return root / version / INDEX_FILE, root / version / META_FILE
+
+
+def load_version(path: Path):
+    """Verify and load a version's (index, meta). Raises ValueError if it is damaged or built with another model."""
+    import faiss
+
+    with open(path / MANIFEST_FILE, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("model") != EMBEDDING_MODEL:
+        raise ValueError(f"built with {manifest.get('model')}, but EMBEDDING_MODEL is {EMBEDDING_MODEL}")
+    problems = verify(path, [INDEX_FILE, META_FILE])
+    if problems:
+        raise ValueError("; ".join(problems))
+    index = faiss.read_index(str(path / INDEX_FILE))
+    with open(path / META_FILE, "rb") as f:
+        meta = pickle.load(f)
+    if index.ntotal != len(meta["queries"]):
+        raise ValueError(f"index has {index.ntotal} rows, metadata {len(meta['queries'])}")
+    return index, meta
+
+
+class IndexManager:
+    """The live (version, index, meta), swapped in the background when CURRENT changes."""
+
+    def __init__(self, root: Path = INDEX_VERSIONS_DIR, check_interval: float = INDEX_CHECK_INTERVAL):
+        self.root = root
+        self.check_interval = check_interval
+        self._active: Optional[tuple] = None  # (version, index, meta), replaced as a whole
+        self._lock = threading.Lock()
+        self._swapped = threading.Condition(self._lock)
+        self._loading: Optional[str] = None
+        self._failed: dict[str, str] = {}
+        self._next_check = 0.0
+
+    def get(self):
+        """(index, meta) of the live version, or None while none is loaded (the caller uses the legacy files)."""
+        active = self._active
+        self._maybe_check()
+        if active is None:
+            with self._lock:
+                # Without legacy files there is nothing else to serve: wait for the first load
+                while self._active is None and self._loading and not FAISS_INDEX.exists():
+                    self._swapped.wait()
+                active = self._active
+            if active is None:
+                return None
+        return active[1], active[2]
+
+    def _maybe_check(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check or self._loading:
+                return
+            self._next_check = now + self.check_interval
+            version = current_version(self.root)
+            live = self._active[0] if self._active else None
+            if version is None or version == live or version in self._failed:
+                return
+            self._loading = version
+        threading.Thread(target=self._swap_in, args=(version,), name="index-swap", daemon=True).start()
+
+    def _swap_in(self, version: str) -> None:
+        try:
+            index, meta = load_version(self.root / version)
+            if index.ntotal:
+                index.search(np.zeros((1, index.d), dtype=np.float32), 1)  # warm up before taking traffic
+        except Exception as e:
+            with self._lock:
+                live = self._active[0] if self._active else "the legacy index"
+                self._failed[version] = str(e)
+                self._loading = None
+                self._swapped.notify_all()
+            log.error("Index version %s not loaded, still serving %s: %s", version, live, e)
+            return
+        with self._lock:
+            previous = self._active[0] if self._active else "legacy"
+            # Queries already running keep the (index, meta) pair they read
+            self._active = (version, index, meta)
+            self._loading = None
+            self._swapped.notify_all()
+        log.info("Swapped index version %s -> %s", previous, version)
+
+    def status(self) -> dict:
+        """Live version (None = legacy files), the one being loaded, and versions that failed with their errors."""
+        with self._lock:
+            return {
+                "version": self._active[0] if self._active else None,
+                "loading": self._loading,
+                "failed": dict(self._failed),
+            }
+
+
+_managers: dict[Path, IndexManager] = {}
+_manager_lock = threading.Lock()
+
+
+def get_index_manager(root: Path = INDEX_VERSIONS_DIR) -> IndexManager:
+    """Process-wide manager for a versions root (INDEX_VERSIONS_DIR, or a language's under LANG_INDEX_DIR)."""
+    with _manager_lock:
+        if root not in _managers:
+            _managers[root] = IndexManager(root)
+        return _managers[root]
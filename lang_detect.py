@@ -0,0 +1,41 @@
+"""
+Query language detection from the Unicode script of its letters. Each of the app's Indic languages
+has its own script block, so counting letters per block is enough and needs no model. Hindi is
+reported for Devanagari (Marathi and Nepali share the script), and romanized Hindi ("kapas me
+keeda") is reported as English.
+"""
+from typing import Optional
+
+# Unicode block -> app language code (see LANG_OPTIONS)
+_SCRIPT_RANGES = (
+    (0x0900, 0x097F, "hi"),  # Devanagari
+    (0x0B80, 0x0BFF, "ta"),  # Tamil
+    (0x0C00, 0x0C7F, "te"),  # Telugu
+    (0x0C80, 0x0CFF, "kn"),  # Kannada
+)
+
+
+def _script_of(ch: str) -> Optional[str]:
+    if ch.isascii():
+        return "en" if ch.isalpha() else None
+    cp = ord(ch)
+    for low, high, lang in _SCRIPT_RANGES:
+        if low <= cp <= high:
+            return lang
+    return None
+
+
+def detect_language(text: str, default: str = "en") -> str:
+    """Language code of the script most of the text's letters are in; default if it has none we know."""
+    counts: dict[str, int] = {}
+    for ch in text:
+        lang = _script_of(ch)
+        if lang:
+            counts[lang] = counts.get(lang, 0) + 1
+    if not counts:
+        return default
+    # Indic script wins over Latin when they are close: "DAP खाद कब डालें" is a Hindi question
+    indic = {lang: n for lang, n in counts.items() if lang != "en"}
+    if indic and sum(indic.values()) * 2 >= counts.get("en", 0):
+        return max(indic, key=indic.get)
+    return max(counts, key=counts.get)
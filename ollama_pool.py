@@ -0,0 +1,211 @@
+"""
+Pool of Ollama servers.
+Tracks each node's health, in-flight requests, latency and installed models (from /api/tags),
+routes each request to the least-loaded healthy node that has the model, and fails over to the
+next node when one dies mid-request.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+
+from config import LLM_QUEUE_TIMEOUT, OLLAMA_BASE_URLS, OLLAMA_CONNECT_TIMEOUT, OLLAMA_HEALTH_INTERVAL
+from scheduler import PRIORITY_INTERACTIVE, get_scheduler
+
+# Weight of the newest sample in the latency moving average
+_EWMA_ALPHA = 0.3
+
+
+class NoBackendAvailable(requests.exceptions.ConnectionError):
+    """Every Ollama node failed or is down."""
+
+
+class OllamaNode:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True  # optimistic until the first health check
+        self.models: set[str] = set()
+        self.in_flight = 0
+        self.latency_s: Optional[float] = None  # EWMA of request latency
+        self.last_check = 0.0
+        self.failures = 0
+
+    def has_model(self, model: str) -> bool:
+        if not model:
+            return True
+        # "llama3" matches "llama3:latest"
+        return model in self.models or f"{model}:latest" in self.models
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "latency_s": self.latency_s,
+            "models": sorted(self.models),
+            "failures": self.failures,
+        }
+
+
+class OllamaPool:
+    def __init__(self, urls: list[str], health_interval: float = OLLAMA_HEALTH_INTERVAL):
+        self.nodes = [OllamaNode(u) for u in urls if u]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._checked_once = False
+
+    # --- health ---
+
+    def _check(self, node: OllamaNode) -> None:
+        try:
+            resp = requests.get(f"{node.url}/api/tags", timeout=3)
+            resp.raise_for_status()
+            models = {m["name"] for m in resp.json().get("models", [])}
+            with self._lock:
+                node.models = models
+                node.healthy = True
+                node.failures = 0
+        except Exception:
+            with self._lock:
+                node.healthy = False
+        node.last_check = time.monotonic()
+
+    def refresh(self, wait: bool = True) -> None:
+        """Health-check all nodes in parallel. With wait=False the check runs in the background."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with ThreadPoolExecutor(max_workers=max(1, len(self.nodes))) as pool:
+                    list(pool.map(self._check, self.nodes))
+            finally:
+                self._checked_once = True
+                with self._lock:
+                    self._refreshing = False
+
+        if wait:
+            run()
+        else:
+            threading.Thread(target=run, name="ollama-health", daemon=True).start()
+
+    def _maybe_refresh(self) -> None:
+        if not self._checked_once:
+            self.refresh(wait=True)
+            return
+        now = time.monotonic()
+        if any(now - n.last_check > self.health_interval for n in self.nodes):
+            self.refresh(wait=False)  # serve from current state, update in background
+
+    # --- routing ---
+
+    def models(self) -> list[str]:
+        """Union of models installed on healthy nodes."""
+        self._maybe_refresh()
+        with self._lock:
+            names = set()
+            for n in self.nodes:
+                if n.healthy:
+                    names |= n.models
+        return sorted(names)
+
+    def candidates(self, model: str = "") -> list[OllamaNode]:
+        """
+        Nodes to try, best first: healthy nodes that have the model, ordered by load (in flight +
+        queued) then latency; then other healthy nodes; down nodes only if nothing else is left.
+        """
+        self._maybe_refresh()
+        scheduler = get_scheduler()
+
+        def load_key(n: OllamaNode):
+            return (scheduler.load(n.url), n.latency_s if n.latency_s is not None else 0.0)
+
+        with self._lock:
+            healthy = [n for n in self.nodes if n.healthy]
+            with_model = sorted((n for n in healthy if n.has_model(model)), key=load_key)
+            others = sorted((n for n in healthy if not n.has_model(model)), key=load_key)
+            down = [n for n in self.nodes if not n.healthy]
+        return with_model + others + (down if not healthy else [])
+
+    def _mark_down(self, node: OllamaNode) -> None:
+        with self._lock:
+            node.healthy = False
+            node.failures += 1
+            node.last_check = time.monotonic()
+
+    def post(
+        self,
+        path: str,
+        payload: dict,
+        timeout: float = 120,
+        user: str = "",
+        priority: int = PRIORITY_INTERACTIVE,
+        queue_timeout: Optional[float] = LLM_QUEUE_TIMEOUT,
+    ) -> requests.Response:
+        """
+        POST to the best node (through the scheduler), failing over on connection errors (including
+        OLLAMA_CONNECT_TIMEOUT) and 5xx responses. Returns the first usable response (including 4xx,
+        e.g. 404 model not found). timeout is the read timeout: a node that accepted the request but
+        is slow to answer is alive, so requests.exceptions.ReadTimeout goes to the caller without
+        marking the node down or replaying the generation elsewhere.
+        Raises scheduler.QueueTimeout if the chosen node stays saturated, NoBackendAvailable if all fail.
+        """
+        model = payload.get("model", "")
+        tried: set[str] = set()
+        last_error: Optional[Exception] = None
+        last_resp: Optional[requests.Response] = None
+        while True:
+            node = next((n for n in self.candidates(model) if n.url not in tried), None)
+            if node is None:
+                if last_resp is not None:
+                    return last_resp  # every node answered 5xx; let the caller report it
+                raise NoBackendAvailable(f"All Ollama nodes failed: {last_error}")
+            tried.add(node.url)
+            with get_scheduler().slot(node.url, user=user, priority=priority, timeout=queue_timeout):
+                with self._lock:
+                    node.in_flight += 1
+                start = time.perf_counter()
+                try:
+                    resp = requests.post(f"{node.url}{path}", json=payload, timeout=(OLLAMA_CONNECT_TIMEOUT, timeout))
+                except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                    # Unreachable (ConnectTimeout is a ConnectionError) or died mid-request: take it
+                    # out of rotation until the next health check
+                    self._mark_down(node)
+                    last_error = e
+                    continue
+                finally:
+                    with self._lock:
+                        node.in_flight -= 1
+            elapsed = time.perf_counter() - start
+            if resp.status_code >= 500:
+                last_resp = resp
+                with self._lock:
+                    node.failures += 1
+                continue
+            with self._lock:
+                node.latency_s = elapsed if node.latency_s is None else (
+                    _EWMA_ALPHA * elapsed + (1 - _EWMA_ALPHA) * node.latency_s
+                )
+            return resp
+
+    def status(self) -> list[dict]:
+        with self._lock:
+            return [n.to_dict() for n in self.nodes]
+
+
+_pool: Optional[OllamaPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> OllamaPool:
+    """Process-wide pool built from OLLAMA_BASE_URLS."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OllamaPool(OLLAMA_BASE_URLS)
+        return _pool
@@ -0,0 +1,419 @@
+"""
+Plant Doctor: image preprocessing and diagnosis cache for Ollama vision models.
+Photos are downscaled to the model's input resolution before upload, and diagnoses are cached
+by a perceptual hash (dHash) and the prompt, so the same or a near-identical leaf photo asked the
+same question is answered instantly.
+"""
+import atexit
+import base64
+import hashlib
+import io
+import json
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import requests
+
+from config import (
+    BATCH_CONCURRENCY,
+    BATCH_RETRIES,
+    DIAGNOSIS_CACHE_FLUSH_S,
+    DIAGNOSIS_CACHE_JSON,
+    DIAGNOSIS_CACHE_MAX,
+    LLM_QUEUE_TIMEOUT,
+    OLLAMA_BASE_URLS,
+    PHASH_MAX_DISTANCE,
+    VISION_MODEL,
+)
+from ollama_pool import get_pool
+from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, QueueTimeout
+
+PLANT_PROMPT = "Analyze this plant image. Is it healthy? If not, what disease does it have and how to treat it? Keep it simple."
+
+# Native input resolution (pixels, longest side) of common Ollama vision models.
+# Sending anything larger only costs upload time; the model downscales internally.
+VISION_INPUT_SIZES = {
+    "moondream": 378,
+    "llava": 336,
+    "bakllava": 336,
+    "llava-phi3": 336,
+    "llava-llama3": 336,
+    "minicpm-v": 448,
+    "llama3.2-vision": 560,
+}
+DEFAULT_INPUT_SIZE = 512
+JPEG_QUALITY = 85
+
+
+def input_size_for(model: str) -> int:
+    """Input resolution for a model name such as 'llava:13b' (tag is ignored)."""
+    return VISION_INPUT_SIZES.get((model or "").split(":")[0].lower(), DEFAULT_INPUT_SIZE)
+
+
+def _dhash(img, size: int = 8) -> int:
+    """64-bit difference hash: compare neighbouring pixels of a tiny grayscale thumbnail."""
+    from PIL import Image
+
+    small = img.convert("L").resize((size + 1, size), Image.LANCZOS)
+    px = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = px[row * (size + 1) + col]
+            right = px[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def preprocess_image(image_bytes: bytes, model: str = VISION_MODEL) -> dict:
+    """
+    Resize and re-encode an uploaded photo for the given vision model.
+    Returns {b64, phash, bytes_original, bytes_sent}. Without Pillow the raw bytes are sent
+    and phash is an exact content hash (so only identical files hit the cache).
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        digest = hashlib.sha256(image_bytes).digest()
+        return {
+            "b64": base64.b64encode(image_bytes).decode("utf-8"),
+            "phash": int.from_bytes(digest[:8], "big"),
+            "bytes_original": len(image_bytes),
+            "bytes_sent": len(image_bytes),
+        }
+
+    size = input_size_for(model)
+    img = Image.open(io.BytesIO(image_bytes))
+    # JPEG decoder can downscale by 1/2..1/8 while decoding, much cheaper than a full decode
+    img.draft("RGB", (size, size))
+    img = ImageOps.exif_transpose(img)  # phone photos are often stored rotated
+    img = img.convert("RGB")
+    if max(img.size) > size:
+        img.thumbnail((size, size), Image.LANCZOS)
+    phash = _dhash(img)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    data = buf.getvalue()
+    if len(data) >= len(image_bytes):
+        # Already small: keep the original rather than re-compressing it
+        data = image_bytes
+    return {
+        "b64": base64.b64encode(data).decode("utf-8"),
+        "phash": phash,
+        "bytes_original": len(image_bytes),
+        "bytes_sent": len(data),
+    }
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class DiagnosisCache:
+    """
+    Perceptual-hash cache of diagnoses per model and prompt, persisted to a small JSON file.
+    The file is rewritten at most every flush_s seconds (plus flush() at the end of a batch and at
+    exit), so a batch of thousands of images does not rewrite it once per image.
+    """
+
+    def __init__(self, path: Path = DIAGNOSIS_CACHE_JSON, max_entries: int = DIAGNOSIS_CACHE_MAX,
+                 flush_s: float = DIAGNOSIS_CACHE_FLUSH_S):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.flush_s = flush_s
+        self._lock = threading.Lock()
+        self._entries: Optional[list[dict]] = None
+        self._dirty = False
+        self._saved_at = 0.0
+
+    def _load(self) -> list[dict]:
+        if self._entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = []
+        return self._entries
+
+    def _save(self) -> None:
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            tmp.replace(self.path)
+        except OSError:
+            pass
+
+    def get(self, phash: int, model: str, prompt: str = PLANT_PROMPT,
+            max_distance: int = PHASH_MAX_DISTANCE) -> Optional[dict]:
+        """Closest cached diagnosis for this model and prompt within max_distance bits, or None."""
+        best, best_dist = None, max_distance + 1
+        prompt_hash = _prompt_hash(prompt)
+        with self._lock:
+            for entry in self._load():
+                if entry["model"] != model or entry.get("prompt") != prompt_hash:
+                    continue
+                dist = bin(entry["phash"] ^ phash).count("1")
+                if dist < best_dist:
+                    best, best_dist = entry, dist
+        return best
+
+    def put(self, phash: int, model: str, response: str, latency_s: float, prompt: str = PLANT_PROMPT) -> None:
+        with self._lock:
+            entries = self._load()
+            entries.append({
+                "phash": phash,
+                "model": model,
+                "prompt": _prompt_hash(prompt),
+                "response": response,
+                "latency_s": round(latency_s, 3),
+                "created": time.time(),
+            })
+            if len(entries) > self.max_entries:
+                del entries[: len(entries) - self.max_entries]  # drop oldest
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.flush_s:
+                self._save()
+
+    def flush(self) -> None:
+        """Write diagnoses added since the last save."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+
+_cache = DiagnosisCache()
+atexit.register(_cache.flush)
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "cache_hits": 0,
+    "bytes_original": 0,
+    "bytes_sent": 0,
+    "latency_saved_s": 0.0,
+}
+
+
+def get_vision_stats() -> dict:
+    """Totals since process start: requests, cache hits, upload bytes before/after preprocessing, latency saved."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(bytes_original: int, bytes_sent: int, cache_hit: bool, latency_saved_s: float) -> None:
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["cache_hits"] += int(cache_hit)
+        _stats["bytes_original"] += bytes_original
+        _stats["bytes_sent"] += bytes_sent
+        _stats["latency_saved_s"] += latency_saved_s
+
+
+class TransientError(Exception):
+    """Vision call failed in a way worth retrying (connection drop, timeout, 429/5xx)."""
+
+
+def _new_result(bytes_original: int) -> dict:
+    return {"response": "", "ok": False, "cached": False, "bytes_original": bytes_original,
+            "bytes_sent": 0, "latency_s": 0.0, "latency_saved_s": 0.0, "attempts": 0}
+
+
+def _check_cache(prepared: dict, model: str, prompt: str, result: dict, start: float) -> bool:
+    """Fill result from the diagnosis cache; True on a hit."""
+    hit = _cache.get(prepared["phash"], model, prompt)
+    if hit is None:
+        return False
+    result.update(response=hit["response"], ok=True, cached=True,
+                  latency_s=time.perf_counter() - start)
+    result["latency_saved_s"] = max(0.0, hit["latency_s"] - result["latency_s"])
+    _record(result["bytes_original"], 0, True, result["latency_saved_s"])
+    return True
+
+
+def _post_vision(b64: str, model: str, prompt: str, timeout: float = 60, user: str = "",
+                 priority: int = PRIORITY_INTERACTIVE, queue_timeout: Optional[float] = LLM_QUEUE_TIMEOUT) -> tuple[bool, str]:
+    """
+    One /api/generate call on the Ollama pool (scheduled and load-balanced).
+    Returns (ok, response text); raises TransientError for retryable failures (including a full queue).
+    """
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "images": [b64],
+        "stream": False,
+    }
+    try:
+        resp = get_pool().post("/api/generate", payload, timeout=timeout, user=user,
+                               priority=priority, queue_timeout=queue_timeout)
+    except QueueTimeout as e:
+        raise TransientError(f"AI is busy, please try again in a minute ({e})") from e
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        raise TransientError(str(e)) from e
+    if resp.status_code == 200:
+        return True, resp.json().get("response", "No response from vision model.")
+    if resp.status_code == 404:
+        return False, (
+            f"⚠️ Model '{model}' not found. Run `ollama pull {model}` to enable real image analysis.\n\n"
+            "(Demo Result): The leaves show yellow spots, indicating early blight. Spray with Mancozeb."
+        )
+    if resp.status_code == 429 or resp.status_code >= 500:
+        raise TransientError(f"HTTP {resp.status_code}")
+    return False, (
+        "⚠️ Image Analysis Unavailable (Check logs). \n\n"
+        "(Mock Result): Identified: Tomato Leaf Spot. Treatment: Apply Copper Fungicide."
+    )
+
+
+def _call_vision(prepared: dict, model: str, prompt: str, result: dict, start: float, retries: int = 0,
+                 user: str = "", priority: int = PRIORITY_INTERACTIVE, queue_timeout: Optional[float] = LLM_QUEUE_TIMEOUT) -> dict:
+    """Send a prepared image, retrying transient failures with exponential backoff; caches successes."""
+    result["bytes_sent"] = prepared["bytes_sent"]
+    for attempt in range(retries + 1):
+        result["attempts"] = attempt + 1
+        try:
+            result["ok"], result["response"] = _post_vision(
+                prepared["b64"], model, prompt, user=user, priority=priority, queue_timeout=queue_timeout
+            )
+            break
+        except TransientError as e:
+            result["response"] = f"Error analyzing image: {e}"
+            if attempt < retries:
+                time.sleep(min(30.0, 2 ** attempt) + random.random())
+        except Exception as e:
+            result["response"] = f"Error analyzing image: {e}"
+            break
+    result["latency_s"] = time.perf_counter() - start
+
+    if result["ok"]:
+        _cache.put(prepared["phash"], model, result["response"], result["latency_s"], prompt)
+    _record(result["bytes_original"], result["bytes_sent"], False, 0.0)
+    return result
+
+
+def diagnose_plant_image(image_bytes: bytes, model: str = VISION_MODEL, prompt: str = PLANT_PROMPT, user_id: str = "") -> dict:
+    """
+    Diagnose a leaf photo with an Ollama vision model (user_id is used for fair queuing).
+    Returns {response, ok, cached, bytes_original, bytes_sent, latency_s, latency_saved_s, attempts}.
+    On failure ok is False and response holds a user-facing message.
+    """
+    model = model or VISION_MODEL
+    result = _new_result(len(image_bytes))
+    if not OLLAMA_BASE_URLS:
+        result["response"] = "Error: OLLAMA_BASE_URL not set."
+        return result
+
+    start = time.perf_counter()
+    try:
+        prepared = preprocess_image(image_bytes, model)
+    except Exception as e:
+        result["response"] = f"Error reading image: {e}"
+        return result
+    if _check_cache(prepared, model, prompt, result, start):
+        return result
+    return _call_vision(prepared, model, prompt, result, start, user=user_id)
+
+
+def diagnose_batch(
+    images: Iterable,
+    model: str = VISION_MODEL,
+    concurrency: int = BATCH_CONCURRENCY,
+    retries: int = BATCH_RETRIES,
+    prompt: str = PLANT_PROMPT,
+) -> Iterator[dict]:
+    """
+    Diagnose many images (file paths) and yield one result dict per image as each completes.
+    Reading, resizing and base64 encoding run on a CPU pool while up to `concurrency` vision calls
+    are in flight; at most 2 * concurrency prepared images are held in memory at once.
+    Each result is the diagnose_plant_image dict plus "image" (the path).
+    Calls run at batch priority and wait in the scheduler queue without a deadline, so interactive
+    users are always served first.
+    """
+    model = model or VISION_MODEL
+    concurrency = max(1, concurrency)
+    done_q: "queue.Queue" = queue.Queue()
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    stop = threading.Event()
+    lock = threading.Lock()
+    state = {"pending": 0, "fed": False}
+    _DONE = object()
+
+    prep_pool = ThreadPoolExecutor(max_workers=min(concurrency * 2, os.cpu_count() or 2))
+    call_pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    def finish(result: dict) -> None:
+        done_q.put(result)
+        slots.release()
+        with lock:
+            state["pending"] -= 1
+            last = state["fed"] and state["pending"] == 0
+        if last:
+            done_q.put(_DONE)
+
+    def prepare(path):
+        start = time.perf_counter()
+        data = Path(path).read_bytes()
+        result = _new_result(len(data))
+        result["image"] = str(path)
+        prepared = preprocess_image(data, model)
+        return prepared, result, start
+
+    def on_prepared(path, future):
+        try:
+            prepared, result, start = future.result()
+        except Exception as e:
+            result = _new_result(0)
+            result.update(image=str(path), response=f"Error reading image: {e}")
+            finish(result)
+            return
+        if stop.is_set() or _check_cache(prepared, model, prompt, result, start):
+            finish(result)
+            return
+        try:
+            call = call_pool.submit(_call_vision, prepared, model, prompt, result, start, retries,
+                                    "batch", PRIORITY_BATCH, None)
+        except RuntimeError:  # pool already shut down because the consumer stopped early
+            finish(result)
+            return
+        call.add_done_callback(lambda f: finish(f.result() if not f.cancelled() and f.exception() is None else result))
+
+    def feed():
+        try:
+            for path in images:
+                while not slots.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    slots.release()
+                    return
+                with lock:
+                    state["pending"] += 1
+                prep_pool.submit(prepare, path).add_done_callback(lambda f, p=path: on_prepared(p, f))
+        finally:
+            with lock:
+                state["fed"] = True
+                last = state["pending"] == 0
+            if last:
+                done_q.put(_DONE)
+
+    feeder = threading.Thread(target=feed, name="plant-batch-feeder", daemon=True)
+    feeder.start()
+    try:
+        while True:
+            item = done_q.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        prep_pool.shutdown(wait=False, cancel_futures=True)
+        call_pool.shutdown(wait=False, cancel_futures=True)
+        _cache.flush()
@@ -0,0 +1,253 @@
+"""
+Mandi price history: (market, commodity, date, min/max/modal price) in compact columnar files.
+Rows are kept sorted by a 64-bit key (commodity << 32 | market << 16 | day), so one commodity at
+one market over a date range is a contiguous slice found with binary search. Columns are .npy
+files opened memory-mapped: 20 bytes per row (about 150 MB per year of all-India Agmarknet data).
+Filled by scripts/ingest_prices.py from daily CSV dumps.
+Markets are identified by (state, district, market): many mandis in different districts share a name.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from config import PRICE_HISTORY_DIR
+
+PRICE_COLUMNS = ("min_price", "max_price", "modal_price")
+MARKET_COLUMNS = ["state", "district", "market"]
+_DAY = np.datetime64("1970-01-01", "D")
+
+
+def _to_days(dates) -> np.ndarray:
+    return (np.asarray(dates, dtype="datetime64[D]") - _DAY).astype(np.int64)
+
+
+def _make_key(commodity, market, day) -> np.ndarray:
+    return (np.asarray(commodity, dtype=np.int64) << 32) | (np.asarray(market, dtype=np.int64) << 16) | np.asarray(day, dtype=np.int64)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over the last `window` observations (shorter at the start)."""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return values
+    csum = np.cumsum(np.insert(values, 0, 0.0))
+    idx = np.arange(1, len(values) + 1)
+    start = np.maximum(idx - window, 0)
+    return (csum[idx] - csum[start]) / (idx - start)
+
+
+class PriceHistory:
+    def __init__(self, path: Path = PRICE_HISTORY_DIR):
+        self.path = Path(path)
+        self.commodities: list[str] = []
+        self.markets: list[dict] = []  # {market, district, state}, index = market id
+        self.key = np.zeros(0, dtype=np.int64)
+        self.prices = {c: np.zeros(0, dtype=np.int32) for c in PRICE_COLUMNS}
+        self._commodity_ids: dict[str, int] = {}
+        self._market_ids: dict[tuple[str, str, str], int] = {}  # (state, district, market) -> market id
+        self._districts: list[tuple[str, str]] = []  # (state, district), index = district id
+        self._market_district = np.zeros(0, dtype=np.int64)
+        self._mtime = None
+        self.load()
+
+    def load(self) -> None:
+        meta = self.path / "meta.json"
+        if not meta.exists():
+            return
+        self._mtime = meta.stat().st_mtime
+        with open(meta, encoding="utf-8") as f:
+            data = json.load(f)
+        self.commodities = data["commodities"]
+        self.markets = data["markets"]
+        self.key = np.load(self.path / "key.npy", mmap_mode="r")
+        self.prices = {c: np.load(self.path / f"{c}.npy", mmap_mode="r") for c in PRICE_COLUMNS}
+        self._commodity_ids = {name: i for i, name in enumerate(self.commodities)}
+        self._market_ids = {(m["state"], m["district"], m["market"]): i for i, m in enumerate(self.markets)}
+        self._districts = sorted({(m["state"], m["district"]) for m in self.markets})
+        district_ids = {d: i for i, d in enumerate(self._districts)}
+        self._market_district = np.array([district_ids[(m["state"], m["district"])] for m in self.markets], dtype=np.int64)
+
+    def reload_if_changed(self) -> None:
+        """Pick up data ingested by another process (meta.json is replaced last on every ingest)."""
+        meta = self.path / "meta.json"
+        if meta.exists() and meta.stat().st_mtime != self._mtime:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.key)
+
+    # --- ingestion ---
+
+    def _ids(self, names, table: list, lookup: dict) -> np.ndarray:
+        """Map names (or name tuples) to ids, appending new ones to table (vectorized over distinct names)."""
+        codes, uniques = pd.factorize(names)
+        ids = np.empty(len(uniques), dtype=np.int64)
+        for i, name in enumerate(uniques):
+            if name not in lookup:
+                lookup[name] = len(table)
+                table.append(name)
+            ids[i] = lookup[name]
+        return ids[codes]
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Merge rows with columns market, district, state, commodity, date, min_price, max_price, modal_price.
+        Several rows for the same (commodity, state, district, market, day), e.g. varieties, become one row
+        (lowest min, highest max, median modal); a re-ingested day replaces the stored one.
+        Returns the number of distinct (commodity, market, day) rows added or replaced.
+        """
+        if df.empty:
+            return 0
+        commodity_ids = dict(self._commodity_ids)
+        market_ids = dict(self._market_ids)
+        commodities = list(self.commodities)
+        markets = list(market_ids)
+
+        c = self._ids(df["commodity"], commodities, commodity_ids)
+        m = self._ids(pd.MultiIndex.from_frame(df[MARKET_COLUMNS].astype(str)), markets, market_ids)
+        if len(markets) >= 1 << 16:
+            raise ValueError("more than 65535 markets")
+        days = _to_days(df["date"].to_numpy())
+        new = pd.DataFrame({"key": _make_key(c, m, days)})
+        for col in PRICE_COLUMNS:
+            new[col] = df[col].to_numpy()
+        new = new.groupby("key", sort=True).agg(min_price=("min_price", "min"), max_price=("max_price", "max"),
+                                                 modal_price=("modal_price", "median"))
+
+        key = np.concatenate([np.asarray(self.key), new.index.to_numpy()])
+        cols = {col: np.concatenate([np.asarray(self.prices[col]), new[col].round().to_numpy().astype(np.int32)])
+                for col in PRICE_COLUMNS}
+        # Stable sort keeps new rows after old ones with the same key; keep the last of each key
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        last = np.ones(len(key), dtype=bool)
+        last[:-1] = key[1:] != key[:-1]
+        key = key[last]
+        cols = {col: arr[order][last] for col, arr in cols.items()}
+
+        market_rows = [dict(m_) for m_ in self.markets]
+        for state, district, name in markets[len(market_rows):]:
+            market_rows.append({"market": name, "district": district, "state": state})
+        self._save(key, cols, commodities, market_rows)
+        return len(new)
+
+    def _save(self, key: np.ndarray, cols: dict, commodities: list, markets: list) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Release memory maps of the old files before replacing them
+        self.key = np.zeros(0, dtype=np.int64)
+        self.prices = {}
+        for name, arr in [("key", key)] + list(cols.items()):
+            tmp = self.path / f"{name}.tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, self.path / f"{name}.npy")
+        tmp = self.path / "meta.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"commodities": commodities, "markets": markets}, f, ensure_ascii=False)
+        os.replace(tmp, self.path / "meta.json")
+        self.load()
+
+    # --- queries ---
+
+    def _slice(self, commodity_id: int, market_id: Optional[int], start=None, end=None) -> slice:
+        lo_market, hi_market = (market_id, market_id) if market_id is not None else (0, (1 << 16) - 1)
+        lo_day = _to_days(start) if start is not None else 0
+        hi_day = _to_days(end) if end is not None else (1 << 16) - 1
+        lo = np.searchsorted(self.key, _make_key(commodity_id, lo_market, lo_day), side="left")
+        hi = np.searchsorted(self.key, _make_key(commodity_id, hi_market, hi_day), side="right")
+        return slice(int(lo), int(hi))
+
+    def series(self, commodity: str, market: tuple, start=None, end=None) -> dict:
+        """{date (datetime64[D]), min_price, max_price, modal_price} for one commodity at one
+        (state, district, market), by date."""
+        c, m = self._commodity_ids.get(commodity), self._market_ids.get(market)
+        if c is None or m is None:
+            return {"date": np.zeros(0, dtype="datetime64[D]"), **{col: np.zeros(0, dtype=np.int32) for col in PRICE_COLUMNS}}
+        s = self._slice(c, m, start, end)
+        out = {"date": _DAY + (np.asarray(self.key[s]) & 0xFFFF).astype("timedelta64[D]")}
+        out.update({col: np.asarray(self.prices[col][s]) for col in PRICE_COLUMNS})
+        return out
+
+    def trend(self, commodity: str, market: tuple, days: int = 30, window: int = 7) -> Optional[dict]:
+        """Last `days` of modal prices with a rolling mean and the change since the start; None if no data."""
+        full = self.series(commodity, market)
+        if not len(full["date"]):
+            return None
+        start = full["date"][-1] - np.timedelta64(days, "D")
+        s = self.series(commodity, market, start=start)
+        modal = s["modal_price"].astype(np.float64)
+        return {
+            "date": s["date"],
+            "modal_price": modal,
+            "rolling_mean": rolling_mean(modal, window),
+            "last": float(modal[-1]),
+            "change_pct": float(100 * (modal[-1] - modal[0]) / modal[0]) if modal[0] else 0.0,
+        }
+
+    def district_summary(self, commodity: str, start=None, end=None) -> list[dict]:
+        """Mean modal price and number of quotes per district for a commodity in a date range."""
+        c = self._commodity_ids.get(commodity)
+        if c is None:
+            return []
+        s = self._slice(c, None)
+        key = np.asarray(self.key[s])
+        day = key & 0xFFFF
+        mask = np.ones(len(key), dtype=bool)
+        if start is not None:
+            mask &= day >= _to_days(start)
+        if end is not None:
+            mask &= day <= _to_days(end)
+        district = self._market_district[(key[mask] >> 16) & 0xFFFF]
+        modal = np.asarray(self.prices["modal_price"][s])[mask].astype(np.float64)
+        n = np.bincount(district, minlength=len(self._districts))
+        total = np.bincount(district, weights=modal, minlength=len(self._districts))
+        return [
+            {"state": self._districts[i][0], "district": self._districts[i][1], "quotes": int(n[i]),
+             "mean_modal_price": float(total[i] / n[i])}
+            for i in np.flatnonzero(n)
+        ]
+
+    def latest_prices(self, market: tuple) -> list[dict]:
+        """Most recent modal price of every commodity traded at a (state, district, market): [{crop, price, date}]."""
+        m = self._market_ids.get(market)
+        if m is None:
+            return []
+        out = []
+        for c, name in enumerate(self.commodities):
+            s = self._slice(c, m)
+            if s.stop > s.start:
+                i = s.stop - 1
+                out.append({"crop": name, "price": int(self.prices["modal_price"][i]),
+                            "date": str(_DAY + np.timedelta64(int(self.key[i]) & 0xFFFF, "D"))})
+        return out
+
+    def market_keys(self) -> list[tuple[str, str, str]]:
+        """(state, district, market) of every market, in market id order."""
+        return list(self._market_ids)
+
+    def find_market(self, spec: str) -> Optional[tuple[str, str, str]]:
+        """
+        Market key for a name ("Azadpur") or, where the name is not unique, "market, district, state"
+        (as in MANDI_MARKET). A bare name that several districts share matches the first one ingested.
+        """
+        parts = [p.strip().lower() for p in (spec or "").split(",")]
+        for key in self._market_ids:
+            wanted = [key[2], key[1], key[0]][: len(parts)]
+            if [w.lower() for w in wanted] == parts:
+                return key
+        return None
+
+
+_history: Optional[PriceHistory] = None
+
+
+def get_price_history() -> PriceHistory:
+    global _history
+    if _history is None:
+        _history = PriceHistory()
+    else:
+        _history.reload_if_changed()
+    return _history
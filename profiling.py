@@ -0,0 +1,141 @@
+"""
+On-demand profiling of individual questions.
+A fraction of questions (PROFILE_SAMPLE_RATE) and every question from PROFILE_USERS is profiled
+around the whole answer path (retrieval, LLM, PDF, save, speech). Each capture is saved in
+PROFILE_DIR as <id>.json (query, user, model, stage timings, wall time) plus the profile:
+  sampling  wall-clock stack samples of the request thread every PROFILE_INTERVAL_MS, written as
+            <id>.collapsed ("frame;frame;frame count" lines) for flamegraph.pl, speedscope or inferno;
+            shows time spent waiting on Ollama or Firebase as well as CPU
+  cprofile  deterministic cProfile of the request thread, written as <id>.prof (pstats; snakeviz,
+            gprof2dot or flameprof)
+scripts/show_profiles.py lists captures, prints their hottest frames and merges them.
+"""
+import contextlib
+import cProfile
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from config import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MODE, PROFILE_SAMPLE_RATE, PROFILE_USERS
+
+log = logging.getLogger(__name__)
+
+
+def should_profile(user: str = "") -> bool:
+    """Whether to profile this request: always for PROFILE_USERS, else with probability PROFILE_SAMPLE_RATE."""
+    if user and user.strip().lower() in PROFILE_USERS:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a background thread."""
+
+    def __init__(self, thread_id: int, interval_s: float):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def capture(query: str, user: str = "", mode: str = PROFILE_MODE, out_dir: Path = PROFILE_DIR, **meta):
+    """
+    Profile the code inside the block and save it with query, user and meta. Yields a dict the block
+    can add to (e.g. timings, model, route); it is saved with the capture.
+    """
+    info = dict(meta)
+    capture_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    sampler = profiler = None
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        mode = "sampling"
+        sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        sampler.start()
+    started = time.time()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    error = None
+    try:
+        yield info
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        cpu = time.thread_time() - cpu
+        wall = time.perf_counter() - wall
+        out_dir.mkdir(parents=True, exist_ok=True)
+        if profiler is not None:
+            profiler.disable()
+            profile_file = out_dir / f"{capture_id}.prof"
+            profiler.dump_stats(str(profile_file))
+        else:
+            sampler.stop()
+            profile_file = out_dir / f"{capture_id}.collapsed"
+            sampler.write_collapsed(profile_file)
+        record = {
+            "id": capture_id,
+            "query": query,
+            "user": user,
+            "mode": mode,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+            "wall_s": round(wall, 4),
+            "thread_cpu_s": round(cpu, 4),
+            **info,
+            "profile": profile_file.name,
+        }
+        if sampler is not None:
+            record.update(samples=sampler.samples, interval_ms=PROFILE_INTERVAL_MS)
+        if error:
+            record["error"] = error
+        with open(out_dir / f"{capture_id}.json", "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2, default=str)
+        log.info("Profile %s: %.0f ms, %r -> %s", capture_id, wall * 1000, query[:60], profile_file)
+
+
+@contextlib.contextmanager
+def maybe_capture(query: str, user: str = "", **meta):
+    """capture() if should_profile(user), else a no-op that still yields a dict."""
+    if should_profile(user):
+        with capture(query, user, **meta) as info:
+            yield info
+    else:
+        yield dict(meta)
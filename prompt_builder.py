@@ -0,0 +1,111 @@
+"""
+Prompt construction for the online (Ollama) answer.
+Ranks and deduplicates retrieved KCC passages, trims them to a token budget, and keeps the
+instructions in a fixed system prompt so Ollama can reuse the cached prefix between requests.
+"""
+import re
+from typing import Optional
+
+from config import PROMPT_CONTEXT_TOKENS
+
+# Fixed prefix: identical for every request so the model's KV cache for it can be reused.
+# Anything request-specific (language, reference, question) goes after it in the user prompt.
+SYSTEM_PROMPT = """You are a friendly agricultural expert helping Indian farmers. Your answer must be SIMPLE and CLEAR so that farmers with little formal education can understand.
+
+RULES:
+- Use very simple words. Avoid technical jargon; if you must use a term (e.g. pesticide name), explain in one short phrase.
+- Write short sentences. One idea per line. Use bullet points (•) or numbers for steps.
+- Base your answer ONLY on the reference below. Do not invent facts. If the reference does not fully cover the question, say so and give only the part that matches.
+- Be correct and actionable: what to do, how much, when, and any caution."""
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without loading a tokenizer: about 4 characters per token for English,
+    and about 2 per token for Indic scripts, which BPE vocabularies split more finely.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars + 1) // 2
+
+
+def _dedup_key(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text at a sentence (or word) boundary so it fits in budget tokens."""
+    if estimate_tokens(text) <= budget:
+        return text
+    out = ""
+    for sentence in re.split(r"(?<=[.!?।])\s+", text):
+        candidate = f"{out} {sentence}".strip()
+        if estimate_tokens(candidate) > budget:
+            break
+        out = candidate
+    if not out:
+        words = []
+        for word in text.split():
+            if estimate_tokens(" ".join(words + [word])) > budget:
+                break
+            words.append(word)
+        out = " ".join(words)
+    return out
+
+
+def build_context(results: list[dict], budget: int = PROMPT_CONTEXT_TOKENS) -> tuple[str, int]:
+    """
+    Turn retrieval results ({query, answer, score}) into the reference block for the prompt.
+    Best score first, duplicate answers dropped, passages added until the token budget is used;
+    the best passage is truncated rather than dropped if it alone is over budget.
+    Returns (context, estimated_tokens).
+    """
+    seen = set()
+    passages = []
+    used = 0
+    for r in sorted(results, key=lambda x: x.get("score", 0.0), reverse=True):
+        answer = (r.get("answer") or "").strip()
+        key = _dedup_key(answer)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        question = (r.get("query") or "").strip()
+        passage = f"Q: {question}\nA: {answer}" if question else answer
+        cost = estimate_tokens(passage) + 1
+        if used + cost > budget:
+            if not passages:
+                passage = _truncate_to_tokens(passage, budget)
+                passages.append(passage)
+                used = estimate_tokens(passage)
+            break
+        passages.append(passage)
+        used += cost
+    return "\n\n".join(passages), used
+
+
+def build_prompt(
+    query: str,
+    response_language: str,
+    results: Optional[list[dict]] = None,
+    offline_context: str = "",
+    budget: int = PROMPT_CONTEXT_TOKENS,
+) -> tuple[str, str]:
+    """
+    Return (system, prompt) for Ollama /api/generate.
+    Uses the structured results when given, else the formatted offline answer, trimmed to budget.
+    """
+    if results:
+        context, _ = build_context(results, budget)
+    else:
+        context = _truncate_to_tokens(offline_context.strip(), budget)
+    prompt = f"""Reference from Kisan Call Centre database:
+{context}
+
+Farmer's question (they may have asked in their own language): {query}
+
+Respond ONLY in {response_language}. Use simple words so farmers can understand.
+Give a short, simple, correct answer that a farmer can follow easily:"""
+    return SYSTEM_PROMPT, prompt
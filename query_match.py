@@ -0,0 +1,66 @@
+"""
+Exact-match fast path for retrieval.
+KCC queries are reduced to a match key (normalize_text, then lower-case with punctuation dropped)
+and hashed to 64 bits at index-build time; the sorted hashes and their row ids are stored in
+meta.pkl. A question whose key is in the table skips the encoder and FAISS entirely.
+"""
+import hashlib
+import re
+import unicodedata
+
+import numpy as np
+
+from answer_table import answer_key, row_answer, row_answer_id
+
+# Combining marks are not \w, but in Indic scripts they are the vowel signs: खाद must not become ख द
+_MARKS = "".join(chr(c) for c in range(0x300, 0x10000) if unicodedata.category(chr(c)).startswith("M"))
+_PUNCT = re.compile(rf"[^\w\s{re.escape(_MARKS)}]+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Clean and normalize text: strip, collapse whitespace, remove nulls."""
+    if not text or (isinstance(text, float) and text != text):  # None, "" or NaN
+        return ""
+    text = str(text).strip()
+    text = re.sub(r"\s+", " ", text)
+    return text
+
+
+def match_key(text: str) -> str:
+    """normalize_text, lower-cased, with punctuation removed: "How to control Aphids?" -> "how to control aphids"."""
+    return normalize_text(_PUNCT.sub(" ", normalize_text(text).lower()))
+
+
+def match_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(match_key(text).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def build_match_index(queries) -> tuple[np.ndarray, np.ndarray]:
+    """(sorted uint64 hashes, int32 row ids): 12 bytes per KCC row."""
+    hashes = np.fromiter((match_hash(q) for q in queries), dtype=np.uint64)
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], order.astype(np.int32)
+
+
+def lookup(hashes: np.ndarray, ids: np.ndarray, query: str) -> np.ndarray:
+    """Row ids whose KCC query has the same match key as query (empty if none)."""
+    h = np.uint64(match_hash(query))
+    lo = np.searchsorted(hashes, h, side="left")
+    hi = np.searchsorted(hashes, h, side="right")
+    return ids[lo:hi]
+
+
+def exact_matches(meta: dict, query: str) -> list[dict]:
+    """Rows of meta whose query equals this one after normalization, as results with score 1.0."""
+    if "match_hashes" not in meta:
+        return []  # index built before the fast path existed
+    results, seen = [], set()
+    for idx in lookup(meta["match_hashes"], meta["match_ids"], query):
+        q = meta["queries"][idx]
+        hit = {"id": int(idx), "query": q, "answer": row_answer(meta, idx), "answer_id": row_answer_id(meta, idx),
+               "score": 1.0}
+        if match_key(q) != match_key(query) or answer_key(hit) in seen:
+            continue  # 64-bit hash collision, or another row with the same answer
+        seen.add(answer_key(hit))
+        results.append(hit)
+    return results[:3]
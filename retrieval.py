@@ -2,35 +2,105 @@
 Semantic query handling and optional IBM Watsonx Granite LLM integration.
 Step 4: FAISS retrieval; Step 5: Online LLM (Watsonx) when enabled.
 """
+import functools
 import pickle
+import threading
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 import faiss
 
 from config import (
+    ANSWER_OVERFETCH,
+    EDGE_BUNDLE_DIR,
     EMBEDDING_MODEL,
+    EMBEDDING_QUERY_PREFIX,
     FAISS_INDEX,
+    LANG_INDEX_DIR,
     META_PKL,
     TOP_K,
     MIN_SIMILARITY,
-    OLLAMA_BASE_URL,
+    LLM_QUEUE_TIMEOUT,
+    OLLAMA_BASE_URLS,
+    OLLAMA_KEEP_ALIVE,
     OLLAMA_MODEL,
+    PRECOMPUTED_MIN_SCORE,
+    SHARD_URLS,
 )
+from answer_store import get_answer_store
+from answer_table import answer_key, row_answer, row_answer_id
+from index_versions import current_version, get_index_manager
+from lang_detect import detect_language
+from ollama_pool import get_pool
+from prompt_builder import build_prompt
+from query_match import exact_matches
+from scheduler import PRIORITY_INTERACTIVE, QueueTimeout
 
+# Shown above the knowledge-base answer when the AI expert is too busy to answer in time
+BUSY_NOTICE = "⏳ The AI expert is busy right now. Here is the answer from the Kisan Call Centre knowledge base:"
 
+
+@functools.lru_cache(maxsize=1)
 def _get_embedder():
+    """Load the sentence encoder once per process; shared by every session and thread."""
+    if EDGE_BUNDLE_DIR:
+        from edge_runtime import get_edge_bundle
+        return get_edge_bundle().encoder
     from sentence_transformers import SentenceTransformer
     return SentenceTransformer(EMBEDDING_MODEL)
 
 
-def _load_faiss_and_meta():
+def _encode_queries(queries: list[str]) -> np.ndarray:
+    """Normalized float32 query embeddings (with the model's query prefix, if it needs one)."""
+    embedder = _get_embedder()
+    prefix = embedder.query_prefix if EDGE_BUNDLE_DIR else EMBEDDING_QUERY_PREFIX
+    q_emb = embedder.encode([prefix + q for q in queries], normalize_embeddings=True)
+    return np.array(q_emb, dtype=np.float32)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_faiss_and_meta_cached(index_mtime: float, meta_mtime: float):
     index = faiss.read_index(str(FAISS_INDEX))
     with open(META_PKL, "rb") as f:
         meta = pickle.load(f)
     return index, meta
 
 
+def _load_faiss_and_meta():
+    """
+    Index and metadata of the live index version (swapped in the background when a new build is
+    published, see index_versions.py). Before the first versioned build, the legacy files are loaded
+    once and reloaded only when build_embeddings_faiss.py rewrites them.
+    """
+    if EDGE_BUNDLE_DIR:
+        from edge_runtime import get_edge_bundle
+        bundle = get_edge_bundle()
+        bundle.check_memory()
+        return bundle.index, bundle.meta
+    loaded = get_index_manager().get()
+    if loaded is not None:
+        return loaded
+    return _load_faiss_and_meta_cached(FAISS_INDEX.stat().st_mtime, META_PKL.stat().st_mtime)
+
+
+def _load_lang_index(lang: str):
+    """(index, meta) of the translated KCC index for a language, or None if none is published."""
+    root = LANG_INDEX_DIR / lang
+    if EDGE_BUNDLE_DIR or current_version(root) is None:
+        return None
+    return get_index_manager(root).get()
+
+
+def index_available() -> bool:
+    """Whether there is an index to search: shard workers, edge bundle, an index version or the legacy files."""
+    if SHARD_URLS:
+        return True
+    if EDGE_BUNDLE_DIR:
+        return (Path(EDGE_BUNDLE_DIR) / "manifest.json").exists()
+    return current_version() is not None or (FAISS_INDEX.exists() and META_PKL.exists())
+
+
 def _format_simple_for_farmer(answer: str) -> str:
     """Break answer into short, clear lines so farmers can read easily."""
     if not answer or not answer.strip():
@@ -46,51 +116,140 @@ def _format_simple_for_farmer(answer: str) -> str:
     return "\n".join(f"• {p}" for p in parts)
 
 
-def get_offline_answer(query: str, top_k: int = TOP_K) -> tuple[list[dict], str]:
-    """
-    Embed query, run FAISS search, return list of {query, answer} and a simple, clean offline answer for farmers.
-    Only shows answers above MIN_SIMILARITY; formats in short bullet points.
-    """
-    index, meta = _load_faiss_and_meta()
-    model = _get_embedder()
-    q_emb = model.encode([query], normalize_embeddings=True)
-    q_emb = np.array(q_emb, dtype=np.float32)
-    scores, indices = index.search(q_emb, min(top_k, index.ntotal))
-    seen = set()
-    results = []
-    for score, idx in zip(scores[0], indices[0]):
-        if idx < 0 or score < MIN_SIMILARITY:
-            continue
-        q = meta["queries"][idx]
-        a = meta["answers"][idx]
-        key = (q, a)
-        if key in seen:
-            continue
-        seen.add(key)
-        results.append({"query": q, "answer": a, "score": float(score)})
-    # Sort by score (best first), take up to 3 to keep answer clean
-    results.sort(key=lambda x: x["score"], reverse=True)
-    results = results[:3]
+def _compose_offline_answer(results: list[dict]) -> str:
     if not results:
-        offline_answer = (
+        return (
             "हमें इस सवाल का सही जवाब डेटाबेस में नहीं मिला। "
             "कृपया सवाल थोड़ा अलग शब्दों में पूछें, या अपने क्षेत्र के कृषि अधिकारी से संपर्क करें.\n\n"
             "We could not find a close match for this question. Try asking in different words or contact your local agriculture office."
         )
-        return [], offline_answer
     # One main answer, formatted simply; add more only if we have 2+ and they add value
     main = results[0]["answer"]
     offline_answer = _format_simple_for_farmer(main)
-    if len(results) > 1 and results[1]["answer"].strip() != main.strip():
+    if len(results) > 1:  # always a different answer: _rank_hits keeps one hit per answer
         other = results[1]["answer"].strip()
-        if other and other[:50] != main[:50]:  # avoid duplicate
+        if other and other[:50] != main[:50]:  # near duplicate: same advice, different ending
             offline_answer += "\n\nअधिक जानकारी (More):\n" + _format_simple_for_farmer(other)
-    return results, offline_answer
+    return offline_answer
+
+
+_match_lock = threading.Lock()
+_match_stats = {"lookups": 0, "exact_hits": 0}
+
+
+def get_match_stats() -> dict:
+    """{lookups, exact_hits, hit_rate} of the exact-match fast path since process start."""
+    with _match_lock:
+        stats = dict(_match_stats)
+    stats["hit_rate"] = stats["exact_hits"] / stats["lookups"] if stats["lookups"] else 0.0
+    return stats
+
+
+def _rank_hits(hits: list[dict]) -> list[dict]:
+    """Best 3 hits above MIN_SIMILARITY, one per distinct answer (by answer id); hits may come from several shards."""
+    seen = set()
+    results = []
+    for hit in sorted(hits, key=lambda x: x["score"], reverse=True):
+        key = answer_key(hit)
+        if hit["score"] < MIN_SIMILARITY or key in seen:
+            continue
+        seen.add(key)
+        results.append(hit)
+    return results[:3]
 
 
-def get_available_models(base_url: str = OLLAMA_BASE_URL) -> list[str]:
-    """Fetch list of available models from Ollama."""
+def _kcc_ids(meta: dict, hits: list[dict]) -> list[dict]:
+    """
+    Hit ids as KCC row ids: a translated index stores the row each of its rows was translated from
+    (-1 if unknown). Its answer ids index its own answer table, so those hits dedup by text instead.
+    """
+    row_ids = meta.get("row_ids")
+    if row_ids is not None:
+        for hit in hits:
+            hit["id"] = int(row_ids[hit["id"]])
+            hit["answer_id"] = None
+    return hits
+
+
+def _search_hits(index, meta: dict, q_emb: np.ndarray, top_k: int) -> list[list[dict]]:
+    """
+    One FAISS search for a batch of query embeddings; raw hits (no threshold) per query. Fetches
+    top_k * ANSWER_OVERFETCH rows, since many rows share an answer and _rank_hits keeps one per answer.
+    """
+    scores, indices = index.search(q_emb, min(top_k * ANSWER_OVERFETCH, index.ntotal))
+    return [
+        _kcc_ids(meta, [
+            {"id": int(idx), "query": meta["queries"][idx], "answer": row_answer(meta, idx),
+             "answer_id": row_answer_id(meta, idx), "score": float(score)}
+            for score, idx in zip(scores[row], indices[row])
+            if idx >= 0
+        ])
+        for row in range(len(q_emb))
+    ]
+
+
+def get_offline_answer(query: str, top_k: int = TOP_K) -> tuple[list[dict], str]:
+    """
+    Embed query, run FAISS search, return list of {id, query, answer, score} and a simple, clean offline answer for farmers.
+    A question that matches a KCC query after case/whitespace/punctuation normalization is answered
+    from the exact-match table without the encoder (score 1.0).
+    With SHARD_URLS set, both steps are sent to every shard worker and the hits merged here, so
+    MIN_SIMILARITY and deduplication apply across shards; shards slower than SHARD_TIMEOUT are skipped.
+    A question in Hindi, Tamil, Telugu or Kannada script also searches that language's translated KCC
+    index (LANG_INDEX_DIR) if one is published; its hits compete with the main index's by score.
+    Only shows answers above MIN_SIMILARITY; formats in short bullet points.
+    """
+    return get_offline_answers([query], top_k)[0]
+
+
+def get_offline_answers(queries: list[str], top_k: int = TOP_K) -> list[tuple[list[dict], str]]:
+    """get_offline_answer for many questions: one encoder batch and one FAISS search for all non-exact matches."""
+    if SHARD_URLS:
+        from shards import get_shard_pool
+        pool = get_shard_pool()
+        found = [_rank_hits(pool.search(q)[0]) for q in queries]
+    else:
+        index, meta = _load_faiss_and_meta()
+        found = [exact_matches(meta, q) for q in queries]
+        lang_indexes = {}  # language -> (index, meta) or None
+        lang_of = {}  # position in queries -> language with a translated index
+        for i, q in enumerate(queries):
+            lang = detect_language(q)
+            if lang == "en":
+                continue
+            if lang not in lang_indexes:
+                lang_indexes[lang] = _load_lang_index(lang)
+            if lang_indexes[lang] is not None:
+                lang_of[i] = lang
+                if not found[i]:
+                    found[i] = _kcc_ids(lang_indexes[lang][1], exact_matches(lang_indexes[lang][1], q))
+    with _match_lock:
+        _match_stats["lookups"] += len(queries)
+        _match_stats["exact_hits"] += sum(bool(r) for r in found)
+
+    todo = [i for i, r in enumerate(found) if not r]
+    if todo:
+        q_emb = _encode_queries([queries[i] for i in todo])
+        if SHARD_URLS:
+            for row, i in enumerate(todo):
+                found[i] = _rank_hits(pool.search(queries[i], q_emb[row], top_k * ANSWER_OVERFETCH)[0])
+        else:
+            hits = dict(zip(todo, _search_hits(index, meta, q_emb, top_k)))
+            for lang, (lang_index, lang_meta) in ((k, v) for k, v in lang_indexes.items() if v is not None):
+                rows = [row for row, i in enumerate(todo) if lang_of.get(i) == lang]
+                if rows:
+                    for row, lang_hits in zip(rows, _search_hits(lang_index, lang_meta, q_emb[rows], top_k)):
+                        hits[todo[row]] += lang_hits
+            for i in todo:
+                found[i] = _rank_hits(hits[i])
+    return [(results, _compose_offline_answer(results)) for results in found]
+
+
+def get_available_models(base_url: Optional[str] = None) -> list[str]:
+    """Fetch list of available models from Ollama (all healthy servers in the pool, or one base_url)."""
     try:
+        if base_url is None:
+            return get_pool().models()
         import requests
         url = f"{base_url.rstrip('/')}/api/tags"
         resp = requests.get(url, timeout=5)
@@ -102,63 +261,112 @@ def get_available_models(base_url: str = OLLAMA_BASE_URL) -> list[str]:
     return []
 
 
-def get_online_answer(query: str, offline_context: str, response_language: str = "English", model_name: str = OLLAMA_MODEL) -> str:
+def generate_online_answer(
+    query: str,
+    offline_context: str,
+    response_language: str = "English",
+    model_name: str = OLLAMA_MODEL,
+    user_id: str = "",
+    priority: int = PRIORITY_INTERACTIVE,
+    results: Optional[list[dict]] = None,
+    use_precomputed: bool = True,
+    queue_timeout: Optional[float] = LLM_QUEUE_TIMEOUT,
+) -> dict:
     """
-    Call Ollama (local LLM) with query + offline context; return generated answer.
-    response_language: e.g. "English", "Hindi", "Tamil", "Telugu", "Kannada" — answer will be in this language.
-    model_name: specific model to use (e.g. "llama3", "granite4:micro").
-    Returns error message if API not configured or request fails.
+    Call Ollama (local LLM) with query + KCC reference; return {answer, ok, busy, source, prompt_tokens,
+    prompt_eval_s, eval_tokens, eval_s, total_s}. Token counts and timings come from Ollama's response
+    (prompt_eval_count / prompt_eval_duration etc.) and are 0 when unavailable.
+    results: structured hits from get_offline_answer; when given they are ranked, deduplicated and
+    trimmed to PROMPT_CONTEXT_TOKENS instead of pasting the whole formatted offline answer.
+    If the top hit scores at least PRECOMPUTED_MIN_SCORE and scripts/precompute_answers.py stored an
+    answer for it in this language, that answer is returned without calling Ollama (source "precomputed").
     """
-    if not OLLAMA_BASE_URL:
-        return "Online mode requires OLLAMA_BASE_URL in config.py"
-
-    lang_instruction = f"Respond ONLY in {response_language}. Use simple words so farmers can understand."
-
-    prompt = f"""You are a friendly agricultural expert helping Indian farmers. Your answer must be SIMPLE and CLEAR so that farmers with little formal education can understand.
+    out = {"answer": "", "ok": False, "busy": False, "source": "llm", "prompt_tokens": 0,
+           "prompt_eval_s": 0.0, "eval_tokens": 0, "eval_s": 0.0, "total_s": 0.0}
+    if use_precomputed and results and results[0]["score"] >= PRECOMPUTED_MIN_SCORE and "id" in results[0]:
+        try:
+            stored = get_answer_store().get(results[0]["id"], response_language, results[0]["query"])
+        except Exception:
+            stored = None  # store missing or unreadable: fall through to the LLM
+        if stored is not None:
+            out.update(answer=stored["answer"], ok=True, source="precomputed")
+            return out
+    if not OLLAMA_BASE_URLS:
+        out["answer"] = "Online mode requires OLLAMA_BASE_URL in config.py"
+        return out
 
-RULES:
-- Use very simple words. Avoid technical jargon; if you must use a term (e.g. pesticide name), explain in one short phrase.
-- Write short sentences. One idea per line. Use bullet points (•) or numbers for steps.
-- Base your answer ONLY on the reference below. Do not invent facts. If the reference does not fully cover the question, say so and give only the part that matches.
-- Be correct and actionable: what to do, how much, when, and any caution.
-- {lang_instruction}
-
-Reference from Kisan Call Centre database:
-{offline_context}
-
-Farmer's question (they may have asked in their own language): {query}
-
-Give a short, simple, correct answer that a farmer can follow easily:"""
+    system, prompt = build_prompt(query, response_language, results=results, offline_context=offline_context)
 
     try:
         import requests
-        url = f"{OLLAMA_BASE_URL.rstrip('/')}/api/generate"
-        
+
         payload = {
             "model": model_name,
+            "system": system,
             "prompt": prompt,
             "stream": False,
+            # Keep the model (and its cached system-prompt prefix) loaded between questions
+            "keep_alive": OLLAMA_KEEP_ALIVE,
             "options": {
                 "temperature": 0.3,
                 "top_p": 0.9,
             }
         }
-        
-        # Short timeout for connection, longer for generation
-        resp = requests.post(url, json=payload, timeout=120)
-        
+
+        # Least-loaded server with this model; fails over if a server dies mid-request
+        resp = get_pool().post("/api/generate", payload, timeout=120, user=user_id, priority=priority,
+                               queue_timeout=queue_timeout)
+
         if resp.status_code == 404:
-             return f"Error: Model '{model_name}' not found. Run 'ollama pull {model_name}'"
-             
+            out["answer"] = f"Error: Model '{model_name}' not found. Run 'ollama pull {model_name}'"
+            return out
+
         resp.raise_for_status()
         data = resp.json()
-        
-        if "response" in data:
-            return data["response"].strip()
-            
-        return "Error: No response from Ollama."
-        
+
+        if "response" not in data:
+            out["answer"] = "Error: No response from Ollama."
+            return out
+        out.update(
+            answer=data["response"].strip(),
+            ok=True,
+            prompt_tokens=data.get("prompt_eval_count", 0),
+            prompt_eval_s=data.get("prompt_eval_duration", 0) / 1e9,
+            eval_tokens=data.get("eval_count", 0),
+            eval_s=data.get("eval_duration", 0) / 1e9,
+            total_s=data.get("total_duration", 0) / 1e9,
+        )
+        return out
+
+    except QueueTimeout:
+        out.update(answer=f"{BUSY_NOTICE}\n\n{offline_context}", busy=True)
     except requests.exceptions.ConnectionError:
-        return "Error: Could not connect to Ollama. Make sure it is running (e.g. 'ollama serve')."
+        out["answer"] = "Error: Could not connect to Ollama. Make sure it is running (e.g. 'ollama serve')."
+    except requests.exceptions.ReadTimeout:
+        out["answer"] = "Error: Ollama took too long to answer. Please try again."
     except Exception as e:
-        return f"Online LLM error: {e}"
+        out["answer"] = f"Online LLM error: {e}"
+    return out
+
+
+def get_online_answer(
+    query: str,
+    offline_context: str,
+    response_language: str = "English",
+    model_name: str = OLLAMA_MODEL,
+    user_id: str = "",
+    priority: int = PRIORITY_INTERACTIVE,
+    results: Optional[list[dict]] = None,
+) -> str:
+    """
+    Call Ollama (local LLM) with query + offline context; return generated answer.
+    response_language: e.g. "English", "Hindi", "Tamil", "Telugu", "Kannada" — answer will be in this language.
+    model_name: specific model to use (e.g. "llama3", "granite4:micro").
+    user_id: used by the scheduler to share Ollama fairly between users.
+    If Ollama is saturated and no slot frees up within LLM_QUEUE_TIMEOUT, returns the offline context
+    with a short notice instead of waiting.
+    Returns error message if API not configured or request fails.
+    """
+    return generate_online_answer(
+        query, offline_context, response_language, model_name, user_id, priority, results
+    )["answer"]
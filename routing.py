@@ -0,0 +1,74 @@
+"""
+Per-request routing: decide whether a question needs the LLM at all.
+A confident English KCC match (high top score, clear gap to the runner-up) is shown directly,
+and the bar is lowered while requests are queued for Ollama. Counts each route and the latency it saved.
+"""
+import threading
+from typing import Optional
+
+from config import BYPASS_BUSY_MIN_SCORE, BYPASS_MIN_GAP, BYPASS_MIN_SCORE
+from scheduler import get_scheduler
+
+ROUTE_LLM = "llm"
+ROUTE_PRECOMPUTED = "precomputed"
+ROUTE_KCC_DIRECT = "kcc_direct"
+
+# Until real LLM latencies are observed, assume a typical CPU generation time (s)
+_DEFAULT_LLM_LATENCY_S = 20.0
+_EWMA_ALPHA = 0.2
+
+_lock = threading.Lock()
+_stats = {
+    "routes": {ROUTE_LLM: 0, ROUTE_PRECOMPUTED: 0, ROUTE_KCC_DIRECT: 0},
+    "llm_latency_s": None,  # EWMA of LLM answer time
+    "latency_saved_s": 0.0,
+}
+
+
+def queued_requests() -> int:
+    """LLM requests waiting for a slot on any Ollama backend (all slots of that backend are busy)."""
+    return sum(m["queued"] for m in get_scheduler().metrics().values())
+
+
+def choose_route(results: list[dict], language: str = "en", queued: Optional[int] = None) -> dict:
+    """
+    Return {route, reason} for a query given its get_offline_answer results and the user's language code.
+    Only English can bypass the LLM (KCC answers are in English; other languages need translation).
+    While any request is queued for Ollama (queued > 0), BYPASS_BUSY_MIN_SCORE applies.
+    """
+    if not results:
+        return {"route": ROUTE_LLM, "reason": "no close KCC match"}
+    if language != "en":
+        return {"route": ROUTE_LLM, "reason": f"translation needed ({language})"}
+    top = results[0]["score"]
+    gap = top - results[1]["score"] if len(results) > 1 else top
+    queued = queued_requests() if queued is None else queued
+    min_score = BYPASS_BUSY_MIN_SCORE if queued > 0 else BYPASS_MIN_SCORE
+    if top >= min_score and gap >= BYPASS_MIN_GAP:
+        return {"route": ROUTE_KCC_DIRECT, "reason": f"confident match (score {top:.2f}, gap {gap:.2f}, {queued} queued)"}
+    return {"route": ROUTE_LLM, "reason": f"score {top:.2f}, gap {gap:.2f} below threshold"}
+
+
+def record_route(route: str, latency_s: float = 0.0) -> None:
+    """
+    Count a served request. For LLM answers pass the measured latency (updates the running estimate);
+    for other routes the saving is estimated as LLM latency minus the time actually taken.
+    """
+    with _lock:
+        _stats["routes"][route] = _stats["routes"].get(route, 0) + 1
+        llm = _stats["llm_latency_s"]
+        if route == ROUTE_LLM:
+            _stats["llm_latency_s"] = latency_s if llm is None else _EWMA_ALPHA * latency_s + (1 - _EWMA_ALPHA) * llm
+        else:
+            estimate = _DEFAULT_LLM_LATENCY_S if llm is None else llm
+            _stats["latency_saved_s"] += max(0.0, estimate - latency_s)
+
+
+def get_route_stats() -> dict:
+    """{routes: {route: count}, llm_latency_s, latency_saved_s} since process start."""
+    with _lock:
+        return {
+            "routes": dict(_stats["routes"]),
+            "llm_latency_s": _stats["llm_latency_s"],
+            "latency_saved_s": _stats["latency_saved_s"],
+        }
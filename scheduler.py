@@ -0,0 +1,152 @@
+"""
+Admission control for Ollama calls.
+Every Streamlit session runs in its own thread of one process, so a shared in-process scheduler
+caps concurrent requests per backend, queues the rest fairly across users, and gives up after a
+deadline so callers can fall back to the offline answer instead of waiting for a 120 s timeout.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from config import LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+# Forget per-user fairness history after this long without a request
+_USER_IDLE_S = 3600
+
+
+class QueueTimeout(TimeoutError):
+    """Request waited longer than its queue deadline without getting a slot."""
+
+
+class _Backend:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting: list[tuple] = []  # (priority, seq, user)
+        self.user_in_flight: dict[str, int] = {}
+        self.last_grant: dict[str, float] = {}
+        self.waits = deque(maxlen=1000)  # recent queue wait times (s)
+        self.served = 0
+        self.timeouts = 0
+
+
+class LLMScheduler:
+    """
+    Per-backend concurrency limit with a fair queue.
+    Among waiting requests the next slot goes to the best priority, then to the user with the fewest
+    requests in flight, then to the user served least recently, then first come first served.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self._cond = threading.Condition()
+        self._backends: dict[str, _Backend] = {}
+        self._seq = itertools.count()
+
+    def _backend(self, key: str) -> _Backend:
+        b = self._backends.get(key)
+        if b is None:
+            b = self._backends[key] = _Backend(self.max_concurrency)
+        return b
+
+    def set_limit(self, key: str, limit: int) -> None:
+        """Override the concurrency limit of one backend (e.g. a bigger GPU box)."""
+        with self._cond:
+            self._backend(key).limit = max(1, limit)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _rank(b: _Backend, ticket: tuple) -> tuple:
+        priority, seq, user = ticket
+        return (priority, b.user_in_flight.get(user, 0), b.last_grant.get(user, 0.0), seq)
+
+    @contextmanager
+    def slot(self, key: str, user: str = "", priority: int = PRIORITY_INTERACTIVE,
+             timeout: Optional[float] = LLM_QUEUE_TIMEOUT):
+        """
+        Hold one of the backend's slots for the duration of the block.
+        Raises QueueTimeout if no slot is granted within `timeout` seconds (None waits forever).
+        """
+        enqueued = time.monotonic()
+        deadline = None if timeout is None else enqueued + timeout
+        with self._cond:
+            b = self._backend(key)
+            ticket = (priority, next(self._seq), user)
+            b.waiting.append(ticket)
+            while True:
+                if b.in_flight < b.limit and min(b.waiting, key=lambda t: self._rank(b, t)) is ticket:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    b.waiting.remove(ticket)
+                    b.timeouts += 1
+                    self._cond.notify_all()  # ranking changed for the others
+                    raise QueueTimeout(f"No free slot on {key} after {timeout:.0f}s")
+                self._cond.wait(remaining)
+            b.waiting.remove(ticket)
+            b.in_flight += 1
+            b.user_in_flight[user] = b.user_in_flight.get(user, 0) + 1
+            now = time.monotonic()
+            b.last_grant[user] = now
+            b.waits.append(now - enqueued)
+            b.served += 1
+            if len(b.last_grant) > 1000:
+                for u, t in list(b.last_grant.items()):
+                    if now - t > _USER_IDLE_S and not b.user_in_flight.get(u):
+                        del b.last_grant[u]
+            self._cond.notify_all()  # another waiter may fit if slots remain
+        try:
+            yield
+        finally:
+            with self._cond:
+                b.in_flight -= 1
+                left = b.user_in_flight[user] - 1
+                if left:
+                    b.user_in_flight[user] = left
+                else:
+                    del b.user_in_flight[user]
+                self._cond.notify_all()
+
+    def load(self, key: str) -> int:
+        """Requests in flight plus queued on a backend."""
+        with self._cond:
+            b = self._backends.get(key)
+            return 0 if b is None else b.in_flight + len(b.waiting)
+
+    def metrics(self) -> dict:
+        """Per backend: limit, in_flight, queued, served, timeouts, avg/p95/max queue wait (s) over recent requests."""
+        out = {}
+        with self._cond:
+            for key, b in self._backends.items():
+                waits = sorted(b.waits)
+                out[key] = {
+                    "limit": b.limit,
+                    "in_flight": b.in_flight,
+                    "queued": len(b.waiting),
+                    "served": b.served,
+                    "timeouts": b.timeouts,
+                    "avg_wait_s": sum(waits) / len(waits) if waits else 0.0,
+                    "p95_wait_s": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                    "max_wait_s": waits[-1] if waits else 0.0,
+                }
+        return out
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Process-wide scheduler shared by all sessions."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
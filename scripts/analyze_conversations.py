@@ -0,0 +1,215 @@
+"""
+Incremental analytics over the conversation log, to find gaps in the KCC knowledge base.
+Each run reads only conversations saved since the last run (per-user timestamp checkpoint),
+folds them into running counts in data/analytics/state.json, and rewrites small CSV reports:
+  top_queries.csv         most frequent questions
+  unmatched_clusters.csv  questions with no close KCC match (or a low top score), grouped by similarity
+  languages.csv           questions per language and per route
+  scores.csv              histogram of top retrieval scores
+Usage: python scripts/analyze_conversations.py [--rebuild]
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import requests
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import ANALYTICS_DIR, ANALYTICS_LOW_SCORE, ANALYTICS_MAX_QUERIES
+from firebase_helper import get_firebase_config
+from near_dedup import NearDuplicateIndex, pick_canonical
+
+STATE_JSON = ANALYTICS_DIR / "state.json"
+# Entries fetched per request when catching up on a user's history
+FETCH_PAGE = 1000
+SCORE_BINS = 20
+# Unmatched questions this similar (character 3-grams) are reported as one cluster
+CLUSTER_THRESHOLD = 0.5
+TOP_N = 200
+
+
+def _empty_state() -> dict:
+    return {
+        "checkpoints": {},  # user key -> {ts, ids}: last timestamp processed and the entry ids at it
+        "records": 0,
+        "no_match": 0,
+        "queries": {},
+        "unmatched": {},
+        "languages": {},
+        "routes": {},
+        "score_hist": [0] * SCORE_BINS,
+        "updated": None,
+    }
+
+
+def load_state(path: Path = STATE_JSON) -> dict:
+    if not path.exists():
+        return _empty_state()
+    with open(path, encoding="utf-8") as f:
+        return {**_empty_state(), **json.load(f)}
+
+
+def _write_atomic(path: Path, write) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case, collapse whitespace, drop trailing punctuation, so trivial variants count together."""
+    return re.sub(r"\s+", " ", (query or "").lower()).strip().rstrip("?.!। ")
+
+
+def _bump(counts: dict, key: str, n: int = 1) -> None:
+    counts[key] = counts.get(key, 0) + n
+
+
+def _prune(counts: dict, cap: int) -> None:
+    """Keep the running counts bounded: past cap, drop the least frequent half (rare queries)."""
+    if len(counts) <= cap:
+        return
+    keep = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[: cap // 2]
+    counts.clear()
+    counts.update(keep)
+
+
+def fold(state: dict, entry: dict) -> None:
+    """Add one conversation entry to the running aggregates."""
+    query = normalize_query(entry.get("query", ""))
+    if not query:
+        return
+    scores = entry.get("scores") or []
+    state["records"] += 1
+    _bump(state["queries"], query)
+    _bump(state["languages"], entry.get("language") or "unknown")
+    _bump(state["routes"], entry.get("route") or "unknown")
+    if scores:
+        top = float(scores[0])
+        state["score_hist"][min(max(int(top * SCORE_BINS), 0), SCORE_BINS - 1)] += 1
+    else:
+        state["no_match"] += 1
+    if not scores or scores[0] < ANALYTICS_LOW_SCORE:
+        _bump(state["unmatched"], query)
+
+
+def _get(url: str, params: dict):
+    r = requests.get(url, params=params, timeout=30)
+    r.raise_for_status()
+    return r.json()
+
+
+def fetch_new_entries(state: dict):
+    """Yield (user key, entry) for every conversation saved after the user's checkpoint, oldest first."""
+    url, key = get_firebase_config()
+    auth = {"auth": key} if key else {}
+    users = _get(f"{url}/conversations.json", {"shallow": "true", **auth}) or {}
+    for user in users:
+        if user.startswith("-"):
+            continue  # legacy entry saved before per-user history (push ids start with '-')
+        checkpoint = state["checkpoints"].get(user, {"ts": "", "ids": []})
+        while True:
+            params = {"orderBy": json.dumps("timestamp"), "limitToFirst": FETCH_PAGE, **auth}
+            if checkpoint["ts"]:
+                params["startAt"] = json.dumps(checkpoint["ts"])  # inclusive; ids at ts are skipped below
+            page = _get(f"{url}/conversations/{user}.json", params) or {}
+            entries = sorted(
+                ((entry_id, e) for entry_id, e in page.items() if isinstance(e, dict) and e.get("timestamp")),
+                key=lambda item: item[1]["timestamp"],
+            )
+            fresh = 0
+            for entry_id, entry in entries:
+                ts = entry["timestamp"]
+                if ts == checkpoint["ts"] and entry_id in checkpoint["ids"]:
+                    continue
+                fresh += 1
+                yield user, entry
+                checkpoint = {"ts": ts, "ids": checkpoint["ids"] + [entry_id] if ts == checkpoint["ts"] else [entry_id]}
+                state["checkpoints"][user] = checkpoint
+            if len(page) < FETCH_PAGE or not fresh:
+                break
+
+
+def cluster_unmatched(unmatched: dict) -> list[dict]:
+    """Group similar unmatched questions; each cluster's example is its most frequent variant."""
+    if not unmatched:
+        return []
+    texts = list(unmatched)
+    counts = np.array([unmatched[t] for t in texts], dtype=np.int64)
+    index = NearDuplicateIndex(threshold=CLUSTER_THRESHOLD, shingle=3)
+    index.add_batch(texts)
+    clusters = index.clusters()
+    reps, totals = pick_canonical(clusters, counts, np.array([len(t) for t in texts], dtype=np.int64))
+    sizes = np.bincount(clusters, minlength=len(texts))
+    rows = [
+        {"count": int(total), "variants": int(sizes[clusters[rep]]), "example": texts[rep]}
+        for rep, total in zip(reps, totals)
+    ]
+    rows.sort(key=lambda r: r["count"], reverse=True)
+    return rows
+
+
+def write_reports(state: dict, out_dir: Path = ANALYTICS_DIR) -> None:
+    def table(name: str, header: list, rows) -> None:
+        def write(f):
+            w = csv.writer(f)
+            w.writerow(header)
+            w.writerows(rows)
+        _write_atomic(out_dir / name, write)
+
+    top = sorted(state["queries"].items(), key=lambda kv: kv[1], reverse=True)[:TOP_N]
+    table("top_queries.csv", ["query", "count"], top)
+    clusters = cluster_unmatched(state["unmatched"])[:TOP_N]
+    table("unmatched_clusters.csv", ["count", "variants", "example"],
+          [(c["count"], c["variants"], c["example"]) for c in clusters])
+    table("languages.csv", ["kind", "name", "count"],
+          [("language", k, v) for k, v in sorted(state["languages"].items())]
+          + [("route", k, v) for k, v in sorted(state["routes"].items())])
+    width = 1 / SCORE_BINS
+    table("scores.csv", ["score_from", "score_to", "count"],
+          [("none", "none", state["no_match"])]
+          + [(round(i * width, 2), round((i + 1) * width, 2), n) for i, n in enumerate(state["score_hist"])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate new conversation logs into analytics reports.")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the checkpoint and start from scratch")
+    args = parser.parse_args()
+
+    url, _ = get_firebase_config()
+    if not url:
+        print("Firebase not configured. Set FIREBASE_DATABASE_URL.")
+        sys.exit(1)
+    ANALYTICS_DIR.mkdir(parents=True, exist_ok=True)
+    state = _empty_state() if args.rebuild else load_state()
+
+    start = time.perf_counter()
+    new = 0
+    try:
+        for _, entry in fetch_new_entries(state):
+            fold(state, entry)
+            new += 1
+    except requests.RequestException as e:
+        print(f"Stopped early, keeping progress so far: {e}")
+    _prune(state["queries"], ANALYTICS_MAX_QUERIES)
+    _prune(state["unmatched"], ANALYTICS_MAX_QUERIES)
+    state["updated"] = datetime.now(tz=timezone.utc).isoformat()
+    # State (with the checkpoint) last: if anything fails before, the next run redoes this batch
+    write_reports(state)
+    _write_atomic(STATE_JSON, lambda f: json.dump(state, f, ensure_ascii=False, separators=(",", ":")))
+
+    unmatched = sum(state["unmatched"].values())
+    print(f"Processed {new} new conversations in {time.perf_counter() - start:.1f}s "
+          f"({state['records']} total, {unmatched} unmatched). Reports in {ANALYTICS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Batch Plant Doctor: diagnose a folder (or list) of leaf photos and stream results as JSONL.
+Usage: python scripts/batch_diagnose.py survey_photos/ --concurrency 8 --output results.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import BATCH_CONCURRENCY, BATCH_RETRIES, VISION_MODEL
+from plant_doctor import diagnose_batch
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def iter_images(inputs: list[str]):
+    """Yield image paths from files and (recursively) directories, in sorted order."""
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            for f in sorted(p.rglob("*")):
+                if f.suffix.lower() in IMAGE_EXTENSIONS:
+                    yield f
+        elif p.suffix.lower() in IMAGE_EXTENSIONS:
+            yield p
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diagnose many leaf photos with an Ollama vision model.")
+    parser.add_argument("inputs", nargs="+", help="Image files or folders")
+    parser.add_argument("--model", default=VISION_MODEL, help=f"Vision model (default: {VISION_MODEL})")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Parallel vision calls")
+    parser.add_argument("--retries", type=int, default=BATCH_RETRIES, help="Retries per image on transient errors")
+    parser.add_argument("--output", "-o", help="JSONL output file (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    total = ok = cached = 0
+    sent = original = 0
+    start = time.perf_counter()
+    try:
+        for result in diagnose_batch(iter_images(args.inputs), args.model, args.concurrency, args.retries):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()  # results are usable while the batch is still running
+            total += 1
+            ok += result["ok"]
+            cached += result["cached"]
+            sent += result["bytes_sent"]
+            original += result["bytes_original"]
+    except KeyboardInterrupt:
+        print("\nInterrupted.", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Diagnosed {total} images in {elapsed:.1f}s ({ok} ok, {cached} cached, {total - ok} failed). "
+        f"Uploaded {sent / 1e6:.1f} MB of {original / 1e6:.1f} MB original.",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare full retrieval (SentenceTransformer + float32 index + meta.pkl) with the edge bundle
+(int8 ONNX encoder + SQ8 index + memory-mapped metadata): cold load, query latency, peak RSS
+and how often both return the same top hit. Each mode runs in a fresh process.
+Usage: python scripts/bench_edge.py --bundle data/edge --memory-mb 512 --queries 200
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from index_versions import current_paths
+
+_, META_PKL = current_paths()
+
+
+def _run(queries: list[str], results) -> None:
+    import retrieval
+    from edge_runtime import peak_rss_mb
+
+    start = time.perf_counter()
+    first, _ = retrieval.get_offline_answer(queries[0])
+    load = time.perf_counter() - start
+    times, top = [], [first[0]["id"] if first else -1]
+    for q in queries[1:]:
+        t = time.perf_counter()
+        hits, _ = retrieval.get_offline_answer(q)
+        times.append(time.perf_counter() - t)
+        top.append(hits[0]["id"] if hits else -1)
+    results.put((load, sorted(times), top, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the edge bundle against full retrieval.")
+    parser.add_argument("--bundle", default="data/edge", help="Unpacked edge bundle directory")
+    parser.add_argument("--memory-mb", type=int, default=512, help="RETRIEVAL_MEMORY_MB for the edge run")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if not META_PKL.exists() or not (Path(args.bundle) / "manifest.json").exists():
+        print("Need meta.pkl (build_embeddings_faiss.py) and an unpacked bundle (build_edge_bundle.py)")
+        sys.exit(1)
+    with open(META_PKL, "rb") as f:
+        kb_queries = pickle.load(f)["queries"]
+    rng = random.Random(0)
+    # Reworded so they go through the encoder rather than the exact-match table
+    queries = [f"please tell {q.lower()} urgently" for q in rng.choices(kb_queries, k=args.queries + 1)]
+
+    ctx = multiprocessing.get_context("spawn")
+    runs = {}
+    for mode in ("full", "edge"):
+        # config reads these at import, which in a spawned child happens before _run
+        if mode == "edge":
+            os.environ["EDGE_BUNDLE_DIR"] = str(Path(args.bundle).resolve())
+            os.environ["RETRIEVAL_MEMORY_MB"] = str(args.memory_mb)
+        results = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(queries, results))
+        proc.start()
+        runs[mode] = results.get()
+        proc.join()
+        load, times, _, rss = runs[mode]
+        p50, p95 = times[len(times) // 2], times[int(len(times) * 0.95)]
+        print(f"{mode:5s} load {load:6.2f}s  p50 {p50 * 1000:6.1f} ms  p95 {p95 * 1000:6.1f} ms  peak RSS {rss:6.0f} MB")
+    same = sum(a == b for a, b in zip(runs["full"][2], runs["edge"][2]))
+    print(f"Same top hit in {same}/{len(queries)} queries ({same / len(queries):.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Benchmark retrieval quality and latency of embedding models per query language.
+The eval file (CSV or JSONL) has a question, the id of the KCC row that answers it and optionally a
+language code (detected from the script otherwise); e.g. a sample of KCC questions translated into
+Hindi, Tamil, Telugu and Kannada with their original row ids. Each model encodes the KCC corpus of
+the current index (plus any translated corpora, searched for questions in their language like
+retrieval.py does) and reports recall@k and per-question encode + search latency for each language.
+Usage: python scripts/bench_multilingual.py eval.csv
+       python scripts/bench_multilingual.py eval.csv --models all-MiniLM-L6-v2 intfloat/multilingual-e5-small \
+           --lang-corpus hi=data/kcc_hi.csv --corpus-sample 20000
+"""
+import argparse
+import csv
+import json
+import pickle
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from answer_table import row_answer
+from config import EMBEDDING_MODEL, EMBEDDING_PASSAGE_PREFIX, EMBEDDING_QUERY_PREFIX
+from index_versions import current_paths
+from lang_detect import detect_language
+
+
+def prefixes(model_name: str) -> tuple[str, str]:
+    """(query, passage) prefixes: config's for EMBEDDING_MODEL, the E5 convention for other E5 models."""
+    if model_name == EMBEDDING_MODEL:
+        return EMBEDDING_QUERY_PREFIX, EMBEDDING_PASSAGE_PREFIX
+    return ("query: ", "passage: ") if "e5" in model_name.lower() else ("", "")
+
+
+def read_eval(path: Path) -> list[dict]:
+    if path.suffix.lower() in (".jsonl", ".json"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    items = []
+    for row in rows:
+        question = str(row.get("question") or row.get("query") or "").strip()
+        if not question or row.get("id") in (None, ""):
+            continue
+        items.append({"question": question, "id": int(row["id"]), "lang": row.get("lang") or detect_language(question)})
+    return items
+
+
+def read_corpus(path: Path) -> pd.DataFrame:
+    df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+    df = df.dropna(subset=["query", "answer"])
+    if "id" not in df.columns:
+        df["id"] = -1
+    return df[["query", "answer", "id"]]
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def bench_model(model_name: str, corpus: pd.DataFrame, lang_corpora: dict, items: list[dict], ks: list[int]) -> dict:
+    import faiss
+    from sentence_transformers import SentenceTransformer
+
+    query_prefix, passage_prefix = prefixes(model_name)
+    t = time.perf_counter()
+    model = SentenceTransformer(model_name, device="cpu")
+    load_s = time.perf_counter() - t
+
+    def build(df: pd.DataFrame):
+        emb = model.encode((passage_prefix + df["query"] + " " + df["answer"]).tolist(), batch_size=64,
+                           normalize_embeddings=True, show_progress_bar=False)
+        index = faiss.IndexFlatIP(emb.shape[1])
+        index.add(np.asarray(emb, dtype=np.float32))
+        return index, df["id"].to_numpy()
+
+    t = time.perf_counter()
+    indexes = {"en": build(corpus)}
+    for lang, df in lang_corpora.items():
+        indexes[lang] = build(df)
+    rows = len(corpus) + sum(len(df) for df in lang_corpora.values())
+    encode_rate = rows / (time.perf_counter() - t)
+
+    k_max = max(ks)
+    per_lang: dict[str, dict] = {}
+    model.encode([query_prefix + "warm up"], normalize_embeddings=True)
+    for item in items:
+        t = time.perf_counter()
+        q = np.asarray(model.encode([query_prefix + item["question"]], normalize_embeddings=True), dtype=np.float32)
+        hits = []
+        for name in {"en", item["lang"]} & indexes.keys():
+            index, ids = indexes[name]
+            scores, found = index.search(q, min(k_max, index.ntotal))
+            hits += [(float(s), int(ids[i])) for s, i in zip(scores[0], found[0]) if i >= 0]
+        latency_ms = (time.perf_counter() - t) * 1000
+        ranked = []
+        for _, row_id in sorted(hits, reverse=True):
+            if row_id not in ranked:
+                ranked.append(row_id)
+        stats = per_lang.setdefault(item["lang"], {"n": 0, "hits": {k: 0 for k in ks}, "latency_ms": []})
+        stats["n"] += 1
+        stats["latency_ms"].append(latency_ms)
+        for k in ks:
+            stats["hits"][k] += item["id"] in ranked[:k]
+
+    return {
+        "model": model_name,
+        "dim": indexes["en"][0].d,
+        "load_s": round(load_s, 2),
+        "corpus_rows_per_s": round(encode_rate, 1),
+        "languages": {
+            lang: {
+                "n": s["n"],
+                **{f"recall@{k}": round(s["hits"][k] / s["n"], 4) for k in ks},
+                "p50_ms": round(percentile(s["latency_ms"], 50), 2),
+                "p95_ms": round(percentile(s["latency_ms"], 95), 2),
+            }
+            for lang, s in sorted(per_lang.items())
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and latency per language for embedding models.")
+    parser.add_argument("eval", type=Path, help="CSV/JSONL with question, id (KCC row) and optional lang")
+    parser.add_argument("--models", nargs="+", default=[EMBEDDING_MODEL, "intfloat/multilingual-e5-small"])
+    parser.add_argument("--lang-corpus", nargs="*", default=[], metavar="LANG=FILE",
+                        help="Translated KCC corpus searched for questions in LANG (query, answer, id)")
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 5, 10])
+    parser.add_argument("--corpus-sample", type=int, default=0,
+                        help="Search only the eval rows plus this many random others (0 = whole corpus)")
+    parser.add_argument("--json", type=Path, help="Also write the results as JSON here")
+    args = parser.parse_args()
+
+    items = read_eval(args.eval)
+    if not items:
+        print(f"No questions with an id in {args.eval}")
+        sys.exit(1)
+    _, meta_pkl = current_paths()
+    with open(meta_pkl, "rb") as f:
+        meta = pickle.load(f)
+    rows = range(len(meta["queries"]))
+    corpus = pd.DataFrame({"query": meta["queries"], "answer": [row_answer(meta, i) for i in rows], "id": rows})
+    if args.corpus_sample and args.corpus_sample < len(corpus):
+        wanted = {item["id"] for item in items}
+        others = [i for i in range(len(corpus)) if i not in wanted]
+        keep = sorted(wanted | set(random.Random(0).sample(others, min(len(others), args.corpus_sample))))
+        corpus = corpus.iloc[[i for i in keep if i < len(corpus)]]
+    lang_corpora = {}
+    for spec in args.lang_corpus:
+        lang, _, path = spec.partition("=")
+        lang_corpora[lang] = read_corpus(Path(path))
+
+    counts = {}
+    for item in items:
+        counts[item["lang"]] = counts.get(item["lang"], 0) + 1
+    print(f"{len(items)} questions (" + ", ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+          + f"), corpus {len(corpus)} rows" + "".join(f" + {k} {len(v)}" for k, v in lang_corpora.items()))
+
+    results = []
+    for model_name in args.models:
+        print(f"\n{model_name}", flush=True)
+        try:
+            result = bench_model(model_name, corpus, lang_corpora, items, args.k)
+        except Exception as e:  # e.g. model not downloadable here
+            print(f"  skipped: {e}")
+            continue
+        results.append(result)
+        print(f"  dim {result['dim']}, loaded in {result['load_s']}s, corpus {result['corpus_rows_per_s']} rows/s")
+        header = "  lang     n " + " ".join(f"{'R@' + str(k):>7s}" for k in args.k) + f" {'p50 ms':>8s} {'p95 ms':>8s}"
+        print(header)
+        for lang, row in result["languages"].items():
+            print(f"  {lang:5s} {row['n']:5d} " + " ".join(f"{row[f'recall@{k}']:7.3f}" for k in args.k)
+                  + f" {row['p50_ms']:8.2f} {row['p95_ms']:8.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Timing comparison: original in-memory preprocessing vs the streaming pipeline.
+Generates a synthetic raw KCC file (with exact and near duplicates) and times both.
+Usage: python scripts/bench_preprocessing.py --rows 1000000
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data_preprocessing import detect_qa_columns, normalize_text, preprocess
+
+CROPS = ["wheat", "paddy", "mustard", "cotton", "tomato", "potato", "chilli", "maize", "soybean", "onion"]
+PESTS = ["aphids", "whitefly", "stem borer", "leaf spot", "blight", "thrips", "jassids", "wilt", "rust", "mites"]
+CHEMS = ["Imidacloprid 17.8 SL", "Mancozeb 75% WP", "Dimethoate 30 EC", "Carbendazim 50 WP", "Thiamethoxam 25 WG"]
+
+
+def make_raw_csv(path: Path, rows: int, seed: int = 0) -> None:
+    """Synthetic KCC-like dump: ~40% exact repeats and ~10% spacing/punctuation variants."""
+    rng = random.Random(seed)
+    uniques = []
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("QueryText,KccAns\n")
+        for i in range(rows):
+            r = rng.random()
+            if uniques and r < 0.4:
+                q, a = rng.choice(uniques)
+            elif uniques and r < 0.5:
+                q, a = rng.choice(uniques)
+                q = "  " + q.replace(" ", "  ", 1).rstrip("?") + " ?"
+            else:
+                crop, pest, chem = rng.choice(CROPS), rng.choice(PESTS), rng.choice(CHEMS)
+                q = f"How to control {pest} in {crop} field {i}?"
+                a = (f"For {pest} in {crop}, spray {chem} @ {rng.randint(1, 5)} ml/litre. "
+                     f"Repeat after {rng.randint(7, 15)} days if needed. Ref {i}.")
+                uniques.append((q, a))
+            f.write(f"\"{q}\",\"{a}\"\n")
+
+
+def legacy_preprocess(raw_csv: Path, clean_csv: Path, qa_json: Path) -> int:
+    """The original implementation: full read, row-wise map, iterrows, indented JSON array."""
+    df = pd.read_csv(raw_csv)
+    q_col, a_col = detect_qa_columns(df)
+    df["query"] = df[q_col].map(normalize_text)
+    df["answer"] = df[a_col].map(normalize_text)
+    df = df[["query", "answer"]]
+    df = df[(df["query"].str.len() > 0) & (df["answer"].str.len() > 0)]
+    df = df.drop_duplicates(subset=["query", "answer"])
+    df = df.reset_index(drop=True)
+    df.to_csv(clean_csv, index=False)
+    qa_pairs = [{"query": r["query"], "answer": r["answer"]} for _, r in df.iterrows()]
+    with open(qa_json, "w", encoding="utf-8") as f:
+        json.dump(qa_pairs, f, ensure_ascii=False, indent=2)
+    return len(df)
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _run(name: str, raw: Path, tmp: Path, results) -> None:
+    """Run one variant in a fresh process so peak RSS is per variant."""
+    start = time.perf_counter()
+    if name == "legacy":
+        kept = legacy_preprocess(raw, tmp / "a.csv", tmp / "a.json")
+    else:
+        parquet = tmp / f"{name}.parquet" if "parquet" in name else None
+        kept = preprocess(raw, tmp / f"{name}.csv", tmp / f"{name}.jsonl", parquet,
+                          near_dedup="near" in name)["kept_rows"]
+    results.put((time.perf_counter() - start, kept, _peak_rss_mb()))
+
+
+VARIANTS = {
+    "legacy": "legacy (in-memory, row-wise)",
+    "stream": "streaming, exact dedup",
+    "stream_parquet": "streaming + parquet, exact dedup",
+    "stream_near": "streaming, near dedup",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark KCC preprocessing.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        raw = tmp / "raw.csv"
+        make_raw_csv(raw, args.rows)
+        print(f"Synthetic raw file: {args.rows} rows, {raw.stat().st_size / 1e6:.0f} MB")
+        for name, label in VARIANTS.items():
+            results = ctx.Queue()
+            proc = ctx.Process(target=_run, args=(name, raw, tmp, results))
+            proc.start()
+            elapsed, kept, rss = results.get()
+            proc.join()
+            print(f"{label:34s} {elapsed:7.1f}s  {kept:>9} rows kept  peak RSS {rss:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Package the knowledge base as one offline bundle for low-memory kiosks (no torch needed at runtime):
+  encoder.onnx          sentence encoder exported to ONNX, weights quantized to int8
+  tokenizer.json        its fast tokenizer
+  index.faiss           SQ8 index (1 byte per dimension instead of 4)
+  queries.bin           KCC queries as a UTF-8 blob + offsets, memory-mapped at runtime
+  answer_table.bin      each distinct answer once, the same way; answer_ids.npy maps rows to it
+  match_*.npy, counts   exact-match table and row counts
+  answers.sqlite        precomputed LLM answers (if any)
+  manifest.json         file list with sizes and checksums
+Needs torch, sentence-transformers, onnx and onnxruntime on the build machine only.
+Usage: python scripts/build_edge_bundle.py --output dist/kcc_edge.tar.gz
+On the kiosk: tar xzf kcc_edge.tar.gz -C data/edge and set EDGE_BUNDLE_DIR=data/edge (+ RETRIEVAL_MEMORY_MB).
+"""
+import argparse
+import inspect
+import json
+import pickle
+import sqlite3
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import ANSWER_STORE_DB, DATA_DIR, EDGE_MAX_SEQ_LEN, EMBEDDING_MODEL
+from edge_runtime import write_text_column
+from index_versions import _sha256, current_paths
+from query_match import build_match_index
+
+# The build the app is serving: the CURRENT index version, or the legacy files
+FAISS_INDEX, META_PKL = current_paths()
+
+
+def export_encoder(out: Path, max_seq_len: int, quantize: bool = True) -> dict:
+    """Export the SentenceTransformer's transformer to ONNX (+ int8 dynamic quantization) and its tokenizer."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    transformer = st_model[0]
+    model, tokenizer = transformer.auto_model.eval(), transformer.tokenizer
+    pooling = "mean"
+    if len(st_model) > 1 and getattr(st_model[1], "pooling_mode_cls_token", False):
+        pooling = "cls"
+
+    sample = tokenizer(["How to control aphids in mustard?"], return_tensors="pt")
+    inputs = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    axes = {name: {0: "batch", 1: "seq"} for name in inputs}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+    class Encoder(torch.nn.Module):
+        """Positional inputs -> last hidden state (HF forward() signatures vary between versions)."""
+
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *tensors):
+            return self.model(**dict(zip(inputs, tensors)), return_dict=True).last_hidden_state
+
+    fp32 = out / "encoder.fp32.onnx"
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(),
+            tuple(sample[name] for name in inputs),
+            str(fp32),
+            input_names=inputs,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=14,
+            **kwargs,
+        )
+    model_file = out / "encoder.onnx"
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32), str(model_file), weight_type=QuantType.QInt8)
+        fp32.unlink()
+    else:
+        fp32.rename(model_file)
+    tokenizer.backend_tokenizer.save(str(out / "tokenizer.json"))
+    return {
+        "model": model_file.name,
+        "tokenizer": "tokenizer.json",
+        "inputs": inputs,
+        "pad_id": tokenizer.pad_token_id or 0,
+        "pad_token": tokenizer.pad_token or "[PAD]",
+        "max_seq_len": min(max_seq_len, transformer.max_seq_length or max_seq_len),
+        "pooling": pooling,
+        "quantized": quantize,
+        "source_model": EMBEDDING_MODEL,
+    }
+
+
+def build_sq8_index(out: Path) -> tuple[int, int]:
+    """Re-encode the flat float32 index as 8-bit scalar-quantized (inner product, same vectors)."""
+    flat = faiss.read_index(str(FAISS_INDEX))
+    vectors = flat.reconstruct_n(0, flat.ntotal).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexScalarQuantizer(flat.d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add(vectors)
+    faiss.write_index(index, str(out / "index.faiss"))
+    return flat.ntotal, flat.d
+
+
+def write_metadata(out: Path) -> dict:
+    with open(META_PKL, "rb") as f:
+        meta = pickle.load(f)
+    write_text_column(meta["queries"], out / "queries.bin", out / "queries.offsets.npy")
+    if "answer_ids" in meta:
+        write_text_column(meta["answer_table"], out / "answer_table.bin", out / "answer_table.offsets.npy")
+        np.save(out / "answer_ids.npy", np.asarray(meta["answer_ids"], dtype=np.int32))
+    else:
+        write_text_column(meta["answers"], out / "answers.bin", out / "answers.offsets.npy")
+    if "match_hashes" in meta:
+        hashes, ids = meta["match_hashes"], meta["match_ids"]
+    else:
+        hashes, ids = build_match_index(meta["queries"])
+    np.save(out / "match_hashes.npy", hashes)
+    np.save(out / "match_ids.npy", ids)
+    if "counts" in meta:
+        np.save(out / "counts.npy", np.asarray(meta["counts"], dtype=np.int32))
+    return meta
+
+
+def copy_answers(out: Path) -> int:
+    """Consistent copy of the precomputed answer store (WAL folded in); returns the number of answers."""
+    if not ANSWER_STORE_DB.exists():
+        return 0
+    src = sqlite3.connect(str(ANSWER_STORE_DB))
+    dst = sqlite3.connect(str(out / "answers.sqlite"))
+    src.backup(dst)
+    count = dst.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+    dst.execute("PRAGMA journal_mode=DELETE")
+    dst.close()
+    src.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline edge bundle.")
+    parser.add_argument("--output", "-o", type=Path, default=DATA_DIR / "kcc_edge_bundle.tar.gz")
+    parser.add_argument("--max-seq-len", type=int, default=EDGE_MAX_SEQ_LEN)
+    parser.add_argument("--no-quantize", action="store_true", help="Keep the encoder in float32")
+    args = parser.parse_args()
+
+    if not FAISS_INDEX.exists() or not META_PKL.exists():
+        print("Run build_embeddings_faiss.py first to create the index and meta.pkl")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "bundle"
+        out.mkdir()
+        print("Exporting encoder to ONNX...")
+        encoder = export_encoder(out, args.max_seq_len, quantize=not args.no_quantize)
+        print("Building SQ8 index...")
+        rows, dim = build_sq8_index(out)
+        print("Writing metadata...")
+        write_metadata(out)
+        answers = copy_answers(out)
+
+        files = sorted(p for p in out.iterdir() if p.is_file())
+        manifest = {
+            "format": 1,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "rows": rows,
+            "dim": dim,
+            "index": "index.faiss",
+            "encoder": encoder,
+            "answers": answers,
+            "files": {p.name: {"bytes": p.stat().st_size, "sha256": _sha256(p)} for p in files},
+        }
+        with open(out / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with tarfile.open(args.output, "w:gz") as tar:
+            for p in sorted(out.iterdir()):
+                tar.add(p, arcname=p.name)
+
+        original = FAISS_INDEX.stat().st_size + META_PKL.stat().st_size
+        unpacked = sum(p.stat().st_size for p in out.iterdir())
+        for name, info in manifest["files"].items():
+            print(f"  {name:24s} {info['bytes'] / 1e6:8.2f} MB")
+    print(f"{rows} rows, {answers} precomputed answers. Index + metadata {original / 1e6:.1f} MB -> bundle "
+          f"{unpacked / 1e6:.1f} MB unpacked, {args.output.stat().st_size / 1e6:.1f} MB compressed "
+          f"({args.output}) in {time.perf_counter() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
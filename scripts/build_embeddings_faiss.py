@@ -1,7 +1,14 @@
 """
 Steps 2 & 3: Embedding generation and FAISS index creation.
-Uses Sentence Transformer (all-MiniLM-L6-v2), saves kcc_embeddings.pkl and FAISS index + meta.pkl.
+Uses Sentence Transformer (all-MiniLM-L6-v2), saves kcc_embeddings.pkl and FAISS index + meta.pkl
+as a new version under data/index_versions/ (see index_versions.py). A running app picks it up
+without a restart; roll back with scripts/manage_index.py.
+With --lang, builds the per-language index of a translated KCC file instead (columns query, answer
+and optionally id, the KCC row it was translated from) under data/lang_indexes/<lang>/.
+Usage: python scripts/build_embeddings_faiss.py
+       python scripts/build_embeddings_faiss.py --lang hi --input data/kcc_hi.csv
 """
+import argparse
 import pickle
 import sys
 from pathlib import Path
@@ -15,26 +22,48 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from config import (
     DATA_DIR,
     CLEAN_CSV,
+    CLEAN_PARQUET,
     EMBEDDING_MODEL,
-    EMBEDDINGS_PKL,
-    FAISS_INDEX,
-    META_PKL,
+    EMBEDDING_PASSAGE_PREFIX,
+    LANG_INDEX_DIR,
+    LANG_OPTIONS,
 )
+from answer_table import intern_answers
+from index_versions import EMBEDDINGS_FILE, INDEX_FILE, META_FILE, new_version, publish
+from query_match import build_match_index
 
 
 def main():
     from sentence_transformers import SentenceTransformer
 
+    parser = argparse.ArgumentParser(description="Build the FAISS index (or a language's translated index).")
+    parser.add_argument("--lang", choices=[code for code in LANG_OPTIONS if code != "en"],
+                        help="Build the translated index for this language")
+    parser.add_argument("--input", type=Path, help="Translated KCC CSV or Parquet (with --lang)")
+    args = parser.parse_args()
+    if args.lang and not args.input:
+        parser.error("--lang needs --input")
+
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    if not CLEAN_CSV.exists():
+    if args.lang:
+        df = pd.read_parquet(args.input) if args.input.suffix == ".parquet" else pd.read_csv(args.input)
+        df = df.dropna(subset=["query", "answer"])
+        if "id" not in df.columns:
+            print("No id column: hits from this index will not use precomputed answers")
+    elif CLEAN_PARQUET.exists() and (
+        not CLEAN_CSV.exists() or CLEAN_PARQUET.stat().st_mtime >= CLEAN_CSV.stat().st_mtime
+    ):
+        # Columnar file, unless a later preprocessing run without --parquet left it older than the CSV
+        df = pd.read_parquet(CLEAN_PARQUET, columns=["query", "answer", "count"])
+    elif CLEAN_CSV.exists():
+        df = pd.read_csv(CLEAN_CSV)
+        if "query" not in df.columns or "answer" not in df.columns:
+            df = pd.read_csv(CLEAN_CSV)
+            df.columns = ["query", "answer"]
+    else:
         print("Run data_preprocessing.py first to create clean_kcc.csv")
         sys.exit(1)
-
-    df = pd.read_csv(CLEAN_CSV)
-    if "query" not in df.columns or "answer" not in df.columns:
-        df = pd.read_csv(CLEAN_CSV)
-        df.columns = ["query", "answer"]
-    texts = (df["query"] + " " + df["answer"]).tolist()
+    texts = (EMBEDDING_PASSAGE_PREFIX + df["query"] + " " + df["answer"]).tolist()
 
     print(f"Loading model: {EMBEDDING_MODEL}")
     model = SentenceTransformer(EMBEDDING_MODEL)
@@ -42,24 +71,44 @@ def main():
     embeddings = model.encode(texts, show_progress_bar=True)
     embeddings = np.array(embeddings, dtype=np.float32)
 
-    with open(EMBEDDINGS_PKL, "wb") as f:
+    # Everything goes to a staging directory; the app only sees it once publish() makes it CURRENT
+    out = new_version(LANG_INDEX_DIR / args.lang) if args.lang else new_version()
+    with open(out / EMBEDDINGS_FILE, "wb") as f:
         pickle.dump(embeddings, f)
-    print(f"Saved embeddings to {EMBEDDINGS_PKL}")
+    print(f"Saved embeddings to {out / EMBEDDINGS_FILE}")
 
     index = faiss.IndexFlatIP(embeddings.shape[1])
     faiss.normalize_L2(embeddings)
     index.add(embeddings)
-    faiss.write_index(index, str(FAISS_INDEX))
-    print(f"Saved FAISS index to {FAISS_INDEX}")
+    faiss.write_index(index, str(out / INDEX_FILE))
+    print(f"Saved FAISS index to {out / INDEX_FILE}")
 
+    # Each distinct answer is stored once (see answer_table.py)
+    answer_table, answer_ids = intern_answers(df["answer"].tolist())
     meta = {
         "queries": df["query"].tolist(),
-        "answers": df["answer"].tolist(),
+        "answer_table": answer_table,
+        "answer_ids": answer_ids,
         "dim": embeddings.shape[1],
     }
-    with open(META_PKL, "wb") as f:
+    print(f"{len(answer_ids)} rows share {len(answer_table)} distinct answers")
+    # Exact/normalized-query fast path (see query_match.py)
+    meta["match_hashes"], meta["match_ids"] = build_match_index(meta["queries"])
+    if "count" in df.columns:
+        # How many raw KCC records each row stands for (after exact and near dedup)
+        meta["counts"] = df["count"].astype(int).tolist()
+    if args.lang:
+        # KCC row each translated row came from, so hits keep the main index's ids (see retrieval._kcc_ids)
+        meta["row_ids"] = df["id"].fillna(-1).astype(int).tolist() if "id" in df.columns else [-1] * len(df)
+    with open(out / META_FILE, "wb") as f:
         pickle.dump(meta, f)
-    print(f"Saved metadata to {META_PKL}")
+    print(f"Saved metadata to {out / META_FILE}")
+
+    info = {"model": EMBEDDING_MODEL, "rows": index.ntotal, "dim": int(embeddings.shape[1])}
+    if args.lang:
+        info["lang"] = args.lang
+    version = publish(out, info)
+    print(f"Published {args.lang + ' ' if args.lang else ''}index version {version}")
 
 
 if __name__ == "__main__":
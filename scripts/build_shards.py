@@ -0,0 +1,79 @@
+"""
+Split kcc_faiss.index + meta.pkl into N shards for sharded retrieval (see shards.py).
+Each shard is a contiguous range of KCC rows with its own index.faiss, meta.pkl (queries, answers,
+exact-match table, counts and the global row offset) under data/shards/shard_NN/.
+Usage: python scripts/build_shards.py --shards 4
+Then: python scripts/serve_shards.py, and set SHARD_URLS to the URLs it prints.
+"""
+import argparse
+import json
+import pickle
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import SHARD_DIR
+from index_versions import current_paths
+from query_match import build_match_index
+
+# The build the app is serving: the CURRENT index version, or the legacy files
+FAISS_INDEX, META_PKL = current_paths()
+
+
+def build_shards(n: int, out_dir: Path) -> list[dict]:
+    index = faiss.read_index(str(FAISS_INDEX))
+    with open(META_PKL, "rb") as f:
+        meta = pickle.load(f)
+    bounds = np.linspace(0, index.ntotal, n + 1).astype(int)
+    shards = []
+    for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        start, end = int(start), int(end)
+        path = out_dir / f"shard_{i:02d}"
+        path.mkdir(parents=True)
+        # Same index type as build_embeddings_faiss.py, over this row range only
+        part = faiss.IndexFlatIP(index.d)
+        if end > start:
+            part.add(index.reconstruct_n(start, end - start))
+        faiss.write_index(part, str(path / "index.faiss"))
+        shard_meta = {"queries": meta["queries"][start:end], "dim": meta["dim"], "offset": start}
+        if "answer_ids" in meta:
+            # Global answer ids (so results dedup across shards), and only the answers this shard uses
+            shard_meta["answer_ids"] = meta["answer_ids"][start:end]
+            shard_meta["answer_table"] = {int(a): meta["answer_table"][a] for a in np.unique(shard_meta["answer_ids"])}
+        else:
+            shard_meta["answers"] = meta["answers"][start:end]
+        shard_meta["match_hashes"], shard_meta["match_ids"] = build_match_index(shard_meta["queries"])
+        if "counts" in meta:
+            shard_meta["counts"] = meta["counts"][start:end]
+        with open(path / "meta.pkl", "wb") as f:
+            pickle.dump(shard_meta, f)
+        shards.append({"name": path.name, "offset": start, "rows": end - start})
+    return shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the FAISS index into shards.")
+    parser.add_argument("--shards", "-n", type=int, default=4)
+    parser.add_argument("--output", "-o", type=Path, default=SHARD_DIR)
+    args = parser.parse_args()
+
+    if not FAISS_INDEX.exists() or not META_PKL.exists():
+        print("Run build_embeddings_faiss.py first to create the index and meta.pkl")
+        sys.exit(1)
+    if args.output.exists():
+        shutil.rmtree(args.output)
+    shards = build_shards(args.shards, args.output)
+    with open(args.output / "shards.json", "w", encoding="utf-8") as f:
+        json.dump({"rows": sum(s["rows"] for s in shards), "shards": shards}, f, indent=2)
+    for s in shards:
+        print(f"{s['name']}: rows {s['offset']}-{s['offset'] + s['rows'] - 1}")
+    print(f"Wrote {len(shards)} shards to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
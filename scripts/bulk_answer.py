@@ -0,0 +1,231 @@
+"""
+Bulk question answering for QA evaluation: run a CSV/JSONL of farmer questions through the same
+pipeline as the app (KCC retrieval, confidence routing, precomputed answers, Ollama) and write one
+JSONL record per question with the answers, KCC matches and timings.
+Input columns/keys: question (or query), optional language (code or name, e.g. hi / Hindi) and id.
+Retrieval runs in batches; LLM calls run in parallel at batch priority, optionally rate-limited.
+Results are appended as they finish, so an interrupted run (crash or Ctrl-C) resumes where it
+stopped when re-run with the same output file; failed questions are retried.
+Usage: python scripts/bulk_answer.py questions.csv -o answers.jsonl --concurrency 2 --rate 1
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import LANG_OPTIONS, LLM_MAX_CONCURRENCY, OLLAMA_MODEL, TOP_K
+from retrieval import generate_online_answer, get_offline_answers
+from routing import ROUTE_KCC_DIRECT, choose_route
+from scheduler import PRIORITY_BATCH
+
+_QUESTION_KEYS = ("question", "query", "QueryText")
+_LANGUAGE_KEYS = ("language", "lang")
+
+
+def _language_code(value: str, default: str) -> str:
+    """App language code for a code, English name or native name ("hi", "Hindi", "हिंदी"); default if unknown."""
+    value = (value or "").strip()
+    for code, (name, native) in LANG_OPTIONS.items():
+        if value.lower() in (code, name.lower()) or value == native:
+            return code
+    return default
+
+
+def read_questions(path: Path, default_lang: str) -> list[dict]:
+    """[{key, id, question, lang}] from a CSV or JSONL file; key is the id column, else the row number."""
+    if path.suffix.lower() in (".jsonl", ".json"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    questions = []
+    for n, row in enumerate(rows, 1):
+        question = next((row[k] for k in _QUESTION_KEYS if row.get(k)), "")
+        if not str(question).strip():
+            continue
+        lang = next((row[k] for k in _LANGUAGE_KEYS if row.get(k)), "")
+        row_id = row.get("id")
+        questions.append({
+            "key": str(row_id) if row_id not in (None, "") else f"row{n}",
+            "id": row_id,
+            "question": str(question).strip(),
+            "lang": _language_code(lang, default_lang),
+        })
+    return questions
+
+
+def load_done(path: Path) -> set[str]:
+    """Keys already answered successfully in an earlier run. Drops a line half-written by a crash."""
+    if not path.exists():
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[: data.rfind(b"\n") + 1]
+    status = {}
+    for line in data.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        status[record["key"]] = record["ok"]  # a later record (a retry) wins
+    return {key for key, ok in status.items() if ok}
+
+
+class RateLimiter:
+    """Spaces calls out to at most `rate` per second across threads (0 = unlimited)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+def answer_one(item: dict, results: list[dict], offline_answer: str, args, limiter: RateLimiter) -> dict:
+    """Route and (if needed) generate the answer for one question; never raises."""
+    record = {
+        "key": item["key"],
+        "id": item["id"],
+        "question": item["question"],
+        "language": LANG_OPTIONS[item["lang"]][0],
+        "kcc_matches": [{"id": r["id"], "score": round(r["score"], 4), "query": r["query"]} for r in results],
+        "offline_answer": offline_answer,
+        "retrieval_ms": item["retrieval_ms"],
+    }
+    route = None if args.always_llm else choose_route(results, item["lang"])
+    if route is not None and route["route"] == ROUTE_KCC_DIRECT:
+        return {**record, "route": ROUTE_KCC_DIRECT, "reason": route["reason"], "answer": offline_answer,
+                "ok": True, "llm_s": 0.0}
+    limiter.wait()
+    start = time.perf_counter()
+    try:
+        generation = generate_online_answer(
+            item["question"],
+            offline_answer,
+            response_language=record["language"],
+            model_name=args.model,
+            user_id="bulk",
+            priority=PRIORITY_BATCH,
+            results=results,
+            use_precomputed=not args.no_precomputed,
+            queue_timeout=None,  # wait for a slot rather than falling back like the app does
+        )
+    except Exception as e:
+        return {**record, "route": "error", "answer": "", "ok": False, "error": str(e),
+                "llm_s": round(time.perf_counter() - start, 3)}
+    return {
+        **record,
+        "route": generation["source"] if generation["ok"] else "error",
+        "answer": generation["answer"],
+        "ok": generation["ok"],
+        "llm_s": round(time.perf_counter() - start, 3),
+        "prompt_tokens": generation["prompt_tokens"],
+        "eval_tokens": generation["eval_tokens"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of farmer questions in bulk.")
+    parser.add_argument("input", type=Path, help="CSV or JSONL with a question column")
+    parser.add_argument("--output", "-o", type=Path, required=True, help="JSONL results (appended; resumes)")
+    parser.add_argument("--lang", default="en", choices=list(LANG_OPTIONS), help="Language when a row has none")
+    parser.add_argument("--model", default=OLLAMA_MODEL, help=f"Ollama model (default: {OLLAMA_MODEL})")
+    parser.add_argument("--concurrency", type=int, default=LLM_MAX_CONCURRENCY, help="Parallel LLM calls")
+    parser.add_argument("--rate", type=float, default=0, help="Max LLM calls started per second (0 = no limit)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Questions per retrieval batch")
+    parser.add_argument("--always-llm", action="store_true", help="Call the LLM even for confident KCC matches")
+    parser.add_argument("--no-precomputed", action="store_true", help="Generate instead of using stored answers")
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N questions")
+    args = parser.parse_args()
+
+    questions = read_questions(args.input, args.lang)
+    if args.limit:
+        questions = questions[: args.limit]
+    done = load_done(args.output)
+    todo = [q for q in questions if q["key"] not in done]
+    print(f"{len(questions)} questions, {len(questions) - len(todo)} already answered, {len(todo)} to go",
+          file=sys.stderr)
+
+    limiter = RateLimiter(args.rate)
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix="bulk")
+    # Keep retrieval only a little ahead of the LLM so an interrupt loses little work
+    max_pending = 2 * max(1, args.concurrency) + args.batch_size
+    pending = set()
+    routes, llm_times = {}, []
+    written = failed = 0
+    start = time.perf_counter()
+    out = open(args.output, "a", encoding="utf-8")
+
+    def write(finished) -> None:
+        nonlocal written, failed
+        for future in finished:
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            written += 1
+            failed += not record["ok"]
+            routes[record["route"]] = routes.get(record["route"], 0) + 1
+            if record["llm_s"]:
+                llm_times.append(record["llm_s"])
+            if written % 50 == 0:
+                rate = written / (time.perf_counter() - start)
+                print(f"  {written}/{len(todo)} ({rate:.2f}/s, {failed} failed)", file=sys.stderr)
+
+    try:
+        for b in range(0, len(todo), args.batch_size):
+            batch = todo[b : b + args.batch_size]
+            t = time.perf_counter()
+            answers = get_offline_answers([q["question"] for q in batch], top_k=TOP_K)
+            per_question_ms = round((time.perf_counter() - t) * 1000 / len(batch), 2)
+            for item, (results, offline_answer) in zip(batch, answers):
+                item["retrieval_ms"] = per_question_ms  # share of the batch
+                pending.add(executor.submit(answer_one, item, results, offline_answer, args, limiter))
+            finished = {f for f in pending if f.done()}
+            pending -= finished
+            write(finished)
+            while len(pending) >= max_pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write(finished)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            write(finished)
+        executor.shutdown()
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        write([f for f in pending if f.done() and not f.cancelled()])
+        print("\nInterrupted. Re-run the same command to resume.", file=sys.stderr)
+    finally:
+        out.close()
+
+    elapsed = time.perf_counter() - start
+    llm_times.sort()
+    summary = f"Answered {written} questions in {elapsed:.1f}s ({failed} failed)"
+    if routes:
+        summary += ". Routes: " + ", ".join(f"{route} {count}" for route, count in sorted(routes.items()))
+    if llm_times:
+        summary += (f". LLM p50 {llm_times[len(llm_times) // 2]:.1f}s, "
+                    f"p95 {llm_times[int(len(llm_times) * 0.95)]:.1f}s")
+    print(summary, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
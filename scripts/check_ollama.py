@@ -1,18 +1,20 @@
-import requests
 import sys
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ollama_pool import get_pool
 
 def check_ollama_models():
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        if response.status_code == 200:
-            models = response.json().get("models", [])
-            print(f"Found {len(models)} models:")
-            for m in models:
-                print(f" - {m.get('name')}")
-        else:
-            print(f"Error: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"Failed to connect to Ollama: {e}")
+    pool = get_pool()
+    pool.refresh()
+    for node in pool.status():
+        if not node["healthy"]:
+            print(f"{node['url']}: Failed to connect to Ollama")
+            continue
+        print(f"{node['url']}: Found {len(node['models'])} models:")
+        for m in node["models"]:
+            print(f" - {m}")
 
 if __name__ == "__main__":
     check_ollama_models()
@@ -1,26 +1,29 @@
 """
 Step 1: Data Preprocessing for Kisan Call Centre Query Assistant.
-Loads raw_kcc.csv, cleans and standardizes Q&A pairs, saves clean_kcc.csv and kcc_qa_pairs.json.
+Streams raw_kcc.csv in chunks with vectorized cleaning, collapses exact and near duplicates
+(MinHash/LSH, see near_dedup.py), and writes clean_kcc.csv (with a count per pair),
+kcc_qa_pairs.jsonl and, with --parquet, clean_kcc.parquet for column-wise reads.
+Pass --no-near-dedup to keep near-identical rows.
 """
-import json
-import re
+import os
 import sys
+import time
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 # Add project root
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from config import DATA_DIR, RAW_CSV, CLEAN_CSV, QA_JSON
+from config import DATA_DIR, RAW_CSV, CLEAN_CSV, CLEAN_PARQUET, QA_JSONL, NEAR_DUP_THRESHOLD
+from near_dedup import NearDuplicateIndex, pick_canonical
+from query_match import normalize_text  # shared with the retrieval fast path
 
-
-def normalize_text(text: str) -> str:
-    """Clean and normalize text: strip, collapse whitespace, remove nulls."""
-    if not text or (isinstance(text, float) and pd.isna(text)):
-        return ""
-    text = str(text).strip()
-    text = re.sub(r"\s+", " ", text)
-    return text
+# float32 vector of all-MiniLM-L6-v2 in the flat FAISS index
+EMBEDDING_BYTES_PER_ROW = 384 * 4
+# Rows per chunk. This bounds the frames being read and normalized; per-pair dedup state (about
+# 40 bytes per distinct pair, plus the LSH index with near-dedup) still grows with the data
+CHUNK_ROWS = 200_000
 
 
 def detect_qa_columns(df: pd.DataFrame) -> tuple[str, str]:
@@ -51,33 +54,171 @@ def detect_qa_columns(df: pd.DataFrame) -> tuple[str, str]:
     return q_col or df.columns[0], a_col or df.columns[-1]
 
 
-def main():
+def normalize_series(s: pd.Series) -> pd.Series:
+    """Vectorized normalize_text for a whole column."""
+    return s.fillna("").astype(str).str.strip().str.replace(r"\s+", " ", regex=True)
+
+
+def _read_clean_chunks(raw_csv: Path, q_col: str, a_col: str, chunk_rows: int):
+    """Yield DataFrames of normalized, non-empty (query, answer) rows plus a 64-bit hash 'key' per pair."""
+    for chunk in pd.read_csv(raw_csv, usecols=[q_col, a_col], dtype=str, chunksize=chunk_rows):
+        q = normalize_series(chunk[q_col])
+        a = normalize_series(chunk[a_col])
+        mask = (q.str.len() > 0) & (a.str.len() > 0)
+        out = pd.DataFrame({"query": q[mask], "answer": a[mask]})
+        out["key"] = pd.util.hash_pandas_object(out, index=False).to_numpy()
+        yield out
+
+
+class _PairIds:
+    """Pair hash -> pair id (in first-seen order), kept as two arrays sorted by hash instead of a dict."""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Id of each key, -1 for keys not added yet."""
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[pos] == keys, self.ids[pos], -1)
+
+    def add(self, keys: np.ndarray) -> np.ndarray:
+        """Give new, distinct keys the next ids in the order given; returns those ids."""
+        new_ids = np.arange(len(self.keys), len(self.keys) + len(keys), dtype=np.int64)
+        order = np.argsort(keys)
+        pos = np.searchsorted(self.keys, keys[order])
+        self.keys = np.insert(self.keys, pos, keys[order])
+        self.ids = np.insert(self.ids, pos, new_ids[order])
+        return new_ids
+
+
+class _Writers:
+    """Streaming writers for the CSV, JSONL and optional Parquet outputs (written to .tmp, renamed on close)."""
+
+    def __init__(self, clean_csv: Path, qa_jsonl: Path, parquet_path=None):
+        self.targets = [Path(clean_csv), Path(qa_jsonl)] + ([Path(parquet_path)] if parquet_path else [])
+        self.csv = open(f"{clean_csv}.tmp", "w", encoding="utf-8", newline="")
+        self.jsonl = open(f"{qa_jsonl}.tmp", "w", encoding="utf-8")
+        self.parquet = None
+        self.parquet_path = parquet_path
+        self.header = True
+
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        df.to_csv(self.csv, header=self.header, index=False)
+        self.header = False
+        lines = df[["query", "answer"]].to_json(orient="records", lines=True, force_ascii=False)
+        self.jsonl.write(lines if lines.endswith("\n") else lines + "\n")
+        if self.parquet_path:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.parquet is None:
+                self.parquet = pq.ParquetWriter(f"{self.parquet_path}.tmp", table.schema, compression="zstd")
+            self.parquet.write_table(table)
+
+    def close(self) -> None:
+        if self.header:  # no rows at all: still write a header
+            self.csv.write("query,answer,count\n")
+        self.csv.close()
+        self.jsonl.close()
+        if self.parquet is not None:
+            self.parquet.close()
+        for target in self.targets:
+            if os.path.exists(f"{target}.tmp"):
+                os.replace(f"{target}.tmp", target)
+
+
+def preprocess(
+    raw_csv: Path = RAW_CSV,
+    clean_csv: Path = CLEAN_CSV,
+    qa_jsonl: Path = QA_JSONL,
+    parquet_path=None,
+    near_dedup: bool = True,
+    threshold: float = NEAR_DUP_THRESHOLD,
+    chunk_rows: int = CHUNK_ROWS,
+) -> dict:
+    """
+    Two streaming passes over raw_csv.
+    Pass 1 counts each distinct (query, answer) pair by hash and feeds new pairs to the LSH index.
+    Pass 2 re-reads the file and writes the canonical row of each cluster at its first occurrence.
+    Returns row counts for reporting.
+    """
+    q_col, a_col = detect_qa_columns(pd.read_csv(raw_csv, nrows=0))
+    print(f"Using columns: question='{q_col}', answer='{a_col}'")
+
+    ids = _PairIds()
+    counts = np.empty(0, dtype=np.int64)
+    lengths = np.empty(0, dtype=np.int64)
+    index = NearDuplicateIndex(threshold=threshold) if near_dedup else None
+    raw_rows = 0
+    for chunk in _read_clean_chunks(raw_csv, q_col, a_col, chunk_rows):
+        raw_rows += len(chunk)
+        firsts = chunk.drop_duplicates("key")
+        keys = firsts["key"].to_numpy(dtype=np.uint64)
+        per_key = firsts["key"].map(chunk["key"].value_counts(sort=False)).to_numpy(dtype=np.int64)
+        uids = ids.lookup(keys)
+        new = uids < 0
+        uids[new] = ids.add(keys[new])
+        counts = np.concatenate([counts, np.zeros(int(new.sum()), dtype=np.int64)])
+        lengths = np.concatenate([lengths, firsts["answer"].str.len().to_numpy(dtype=np.int64)[new]])
+        counts[uids] += per_key  # keys are distinct within firsts
+        if index is not None:
+            queries = firsts["query"][new]
+            index.add_batch((queries + " || " + firsts["answer"][new]).tolist(), queries.tolist())
+
+    keep_count = counts.copy()
+    if index is not None and len(counts):
+        reps, totals = pick_canonical(index.clusters(), counts, lengths)
+        keep_count = np.zeros_like(counts)
+        keep_count[reps] = totals
+
+    writers = _Writers(clean_csv, qa_jsonl, parquet_path)
+    emitted = np.zeros(len(counts), dtype=bool)
+    kept = 0
+    try:
+        for chunk in _read_clean_chunks(raw_csv, q_col, a_col, chunk_rows):
+            firsts = chunk.drop_duplicates("key")
+            uids = ids.lookup(firsts["key"].to_numpy(dtype=np.uint64))
+            sel = (keep_count[uids] > 0) & ~emitted[uids]
+            emitted[uids[sel]] = True
+            out = firsts.loc[sel, ["query", "answer"]]
+            out["count"] = keep_count[uids[sel]]
+            writers.write(out)
+            kept += len(out)
+    finally:
+        writers.close()
+
+    return {"raw_rows": raw_rows, "exact_rows": len(counts), "kept_rows": kept}
+
+
+def main(near_dedup: bool = True, parquet: bool = False):
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     if not RAW_CSV.exists():
         print(f"Raw data not found: {RAW_CSV}")
         print("Please add raw_kcc.csv with columns: query (or question), answer")
         sys.exit(1)
 
-    df = pd.read_csv(RAW_CSV)
-    q_col, a_col = detect_qa_columns(df)
-    print(f"Using columns: question='{q_col}', answer='{a_col}'")
-
-    df["query"] = df[q_col].map(normalize_text)
-    df["answer"] = df[a_col].map(normalize_text)
-    df = df[["query", "answer"]]
-
-    # Drop empty or duplicate rows
-    df = df[(df["query"].str.len() > 0) & (df["answer"].str.len() > 0)]
-    df = df.drop_duplicates(subset=["query", "answer"])
-    df = df.reset_index(drop=True)
-
-    df.to_csv(CLEAN_CSV, index=False)
-    qa_pairs = [{"query": r["query"], "answer": r["answer"]} for _, r in df.iterrows()]
-    with open(QA_JSON, "w", encoding="utf-8") as f:
-        json.dump(qa_pairs, f, ensure_ascii=False, indent=2)
+    if not parquet and CLEAN_PARQUET.exists():
+        # A parquet file from an earlier --parquet run would no longer match clean_kcc.csv
+        CLEAN_PARQUET.unlink()
+        print(f"Removed stale {CLEAN_PARQUET}")
 
-    print(f"Cleaned {len(df)} Q&A pairs. Saved to {CLEAN_CSV} and {QA_JSON}")
+    start = time.perf_counter()
+    stats = preprocess(parquet_path=CLEAN_PARQUET if parquet else None, near_dedup=near_dedup)
+    raw_rows, kept = stats["raw_rows"], stats["kept_rows"]
+    print(
+        f"Rows: {raw_rows} -> {stats['exact_rows']} after exact dedup -> {kept} after near-dedup "
+        f"({100 * (1 - kept / max(raw_rows, 1)):.1f}% smaller). "
+        f"Index size: {raw_rows * EMBEDDING_BYTES_PER_ROW / 1e6:.2f} MB -> {kept * EMBEDDING_BYTES_PER_ROW / 1e6:.2f} MB"
+    )
+    saved = [CLEAN_CSV, QA_JSONL] + ([CLEAN_PARQUET] if parquet else [])
+    print(f"Cleaned {kept} Q&A pairs in {time.perf_counter() - start:.1f}s. Saved to {', '.join(map(str, saved))}")
 
 
 if __name__ == "__main__":
-    main()
+    main(near_dedup="--no-near-dedup" not in sys.argv, parquet="--parquet" in sys.argv)
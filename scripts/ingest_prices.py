@@ -0,0 +1,71 @@
+"""
+Bulk-load daily mandi price CSV dumps (Agmarknet / data.gov.in format) into the price history store.
+Expected columns (case-insensitive, "_x0020_" or spaces allowed): State, District, Market, Commodity,
+Arrival_Date, Min_Price, Max_Price, Modal_Price. Re-ingesting a day replaces its stored prices.
+Usage: python scripts/ingest_prices.py dumps/*.csv
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from price_history import PRICE_COLUMNS, get_price_history
+
+CHUNK_ROWS = 200_000
+# Rows merged into the store at once; the store is rewritten once per batch
+BATCH_ROWS = 5_000_000
+COLUMNS = ["state", "district", "market", "commodity", "date"] + list(PRICE_COLUMNS)
+
+
+def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [c.strip().lower().replace("_x0020_", "_").replace(" ", "_") for c in df.columns]
+    return df.rename(columns={"arrival_date": "date"})
+
+
+def read_dump(path: Path, chunk_rows: int = CHUNK_ROWS):
+    """Yield cleaned chunks of one CSV dump with the COLUMNS above; rows with a bad date or price are dropped."""
+    for chunk in pd.read_csv(path, dtype=str, chunksize=chunk_rows):
+        chunk = _normalize_columns(chunk)
+        missing = [c for c in COLUMNS if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"{path}: missing columns {', '.join(missing)}")
+        chunk = chunk[COLUMNS]
+        for col in ("state", "district", "market", "commodity"):
+            chunk[col] = chunk[col].fillna("").str.strip()
+        chunk["date"] = pd.to_datetime(chunk["date"], dayfirst=True, errors="coerce")
+        for col in PRICE_COLUMNS:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+        chunk = chunk.dropna(subset=["date", *PRICE_COLUMNS])
+        yield chunk[chunk["market"].ne("") & chunk["commodity"].ne("")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest mandi price CSV dumps into the price history store.")
+    parser.add_argument("csv", nargs="+", type=Path, help="CSV dump files")
+    args = parser.parse_args()
+
+    history = get_price_history()
+    start = time.perf_counter()
+    before = len(history)
+    pending, pending_rows, merged = [], 0, 0
+    for path in args.csv:
+        for chunk in read_dump(path):
+            pending.append(chunk)
+            pending_rows += len(chunk)
+            if pending_rows >= BATCH_ROWS:
+                merged += history.append(pd.concat(pending, ignore_index=True))
+                pending, pending_rows = [], 0
+        print(f"Read {path}")
+    if pending:
+        merged += history.append(pd.concat(pending, ignore_index=True))
+    print(f"Merged {merged} daily prices in {time.perf_counter() - start:.1f}s: "
+          f"{before} -> {len(history)} rows, {len(history.commodities)} commodities, {len(history.markets)} markets "
+          f"({len(history) * 20 / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Load test: simulate concurrent farmer sessions through the app's question pipeline
+(retrieval -> routing -> LLM -> PDF -> save to Firebase) and report throughput and p50/p95/p99
+latency per stage. By default Ollama and Firebase are the local stand-ins from stub_servers.py,
+started in this process, so the numbers show the app's own limits (scheduler, encoder, PDF, I/O)
+for a given LLM speed.
+Usage: python scripts/load_test.py --sessions 20 --questions 5 --tokens-per-s 15 --parallel 4
+       python scripts/load_test.py --ollama-url http://gpu-box:11434 --sessions 8   (real Ollama, stub Firebase)
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from stub_servers import FirebaseStub, OllamaStub, start
+
+STAGES = ["retrieval", "llm", "llm_queue", "pdf", "save", "total"]
+
+_FALLBACK_QUESTIONS = [
+    "How to control aphids in mustard?",
+    "Which fertilizer for wheat at tillering stage?",
+    "Yellow leaves in paddy nursery what to do",
+    "Tomato leaf curl virus remedy",
+    "When to sow chickpea in rabi season?",
+]
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def load_questions(n: int, seed: int = 0) -> list[str]:
+    """Knowledge-base questions, half of them reworded so they go through the encoder."""
+    from index_versions import current_paths
+
+    _, meta_pkl = current_paths()
+    queries = _FALLBACK_QUESTIONS
+    if meta_pkl.exists():
+        with open(meta_pkl, "rb") as f:
+            queries = pickle.load(f)["queries"] or queries
+    rng = random.Random(seed)
+    picked = rng.choices(queries, k=n)
+    return [q if i % 2 else f"please tell me {q.lower()}" for i, q in enumerate(picked)]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {stage: [] for stage in STAGES}
+        self.routes: dict[str, int] = {}
+        self.errors: list[str] = []
+
+    def add(self, timings: dict, route: str, error: str = "") -> None:
+        with self._lock:
+            for stage, seconds in timings.items():
+                self.samples[stage].append(seconds)
+            self.routes[route] = self.routes.get(route, 0) + 1
+            if error:
+                self.errors.append(error)
+
+
+def run_session(n: int, questions: list[str], args, recorder: Recorder, out_dir: Path, start_at: float) -> None:
+    """One farmer: asks its questions one after another, like _answer_question in app.py."""
+    from config import LANG_OPTIONS
+    from firebase_helper import save_to_firebase
+    from report_gen import generate_prescription
+    from retrieval import generate_online_answer, get_offline_answer
+    from routing import ROUTE_KCC_DIRECT, choose_route
+
+    rng = random.Random(n)
+    email = f"loadtest{n}@example.com"
+    time.sleep(max(0.0, start_at - time.monotonic()))
+    for query in questions:
+        lang = rng.choice(args.langs)
+        timings, error = {}, ""
+        t0 = time.perf_counter()
+        results, offline_answer = get_offline_answer(query)
+        timings["retrieval"] = time.perf_counter() - t0
+
+        route = choose_route(results, lang)["route"]
+        online_answer = ""
+        if route != ROUTE_KCC_DIRECT:
+            t = time.perf_counter()
+            generation = generate_online_answer(
+                query, offline_answer, response_language=LANG_OPTIONS[lang][0], model_name=args.model,
+                user_id=email, results=results,
+            )
+            timings["llm"] = time.perf_counter() - t
+            online_answer = generation["answer"]
+            if generation["ok"] and generation["source"] != "precomputed":
+                # Time waiting in the app's scheduler and Ollama's own queue
+                timings["llm_queue"] = max(0.0, timings["llm"] - generation["eval_s"] - generation["prompt_eval_s"])
+            route = generation["source"] if generation["ok"] else ("busy" if generation["busy"] else "error")
+            if route == "error":
+                error = online_answer[:200]
+
+        t = time.perf_counter()
+        generate_prescription(query, offline_answer, online_answer or None, filename=str(out_dir / f"session{n}.pdf"))
+        timings["pdf"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        if not save_to_firebase(query, offline_answer, online_answer or None, user_email=email,
+                                results=results, language=lang, route=route):
+            error = error or "save_to_firebase failed"
+        timings["save"] = time.perf_counter() - t
+        timings["total"] = time.perf_counter() - t0
+        recorder.add(timings, route, error)
+        if args.think:
+            time.sleep(rng.uniform(0, 2 * args.think))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the question pipeline.")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent farmer sessions")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per session")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which sessions start")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean pause between a session's questions (s)")
+    parser.add_argument("--langs", nargs="+", default=["en", "hi"], help="Question languages (codes)")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--ollama-url", help="Use this Ollama instead of the stub")
+    parser.add_argument("--firebase-url", help="Use this Firebase instead of the stub")
+    stub = parser.add_argument_group("Ollama stub")
+    stub.add_argument("--latency", type=float, default=0.2, help="Fixed seconds per LLM request")
+    stub.add_argument("--tokens-per-s", type=float, default=15.0)
+    stub.add_argument("--answer-tokens", type=int, default=120)
+    stub.add_argument("--parallel", type=int, default=4, help="Requests the stub generates at once")
+    stub.add_argument("--firebase-latency", type=float, default=0.03)
+    parser.add_argument("--json", type=Path, help="Also write the summary as JSON here")
+    args = parser.parse_args()
+
+    ollama = firebase = None
+    if not args.ollama_url:
+        ollama = OllamaStub([args.model], args.latency, args.tokens_per_s, answer_tokens=args.answer_tokens,
+                            parallel=args.parallel)
+        args.ollama_url = f"http://127.0.0.1:{start(ollama).server_port}"
+    if not args.firebase_url:
+        firebase = FirebaseStub(args.firebase_latency)
+        args.firebase_url = f"http://127.0.0.1:{start(firebase).server_port}"
+    # config reads these at import, so set them before importing any app module
+    os.environ["OLLAMA_BASE_URLS"] = args.ollama_url
+    os.environ["FIREBASE_DATABASE_URL"] = args.firebase_url
+    os.environ.pop("FIREBASE_API_KEY", None)
+
+    from retrieval import get_offline_answer, index_available
+
+    if not index_available():
+        print("Run build_embeddings_faiss.py first")
+        sys.exit(1)
+    get_offline_answer("warm up")  # load the encoder and index outside the measurement
+    questions = load_questions(args.sessions * args.questions)
+    recorder = Recorder()
+    print(f"{args.sessions} sessions x {args.questions} questions, Ollama {args.ollama_url}, "
+          f"Firebase {args.firebase_url}", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        begin = time.monotonic()
+        threads = [
+            threading.Thread(
+                target=run_session,
+                args=(n, questions[n * args.questions:(n + 1) * args.questions], args, recorder, Path(tmp),
+                      begin + args.ramp * n / max(1, args.sessions)),
+                name=f"session{n}",
+            )
+            for n in range(args.sessions)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - begin
+
+    done = len(recorder.samples["total"])
+    summary = {
+        "sessions": args.sessions,
+        "questions": done,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_qps": round(done / elapsed, 3),
+        "routes": recorder.routes,
+        "errors": len(recorder.errors),
+        "stages": {},
+    }
+    print(f"\n{'stage':10s} {'count':>6s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}  (seconds)")
+    for stage in STAGES:
+        values = sorted(recorder.samples[stage])
+        if not values:
+            continue
+        row = {"count": len(values), **{f"p{p}": round(percentile(values, p), 4) for p in (50, 95, 99)},
+               "max": round(values[-1], 4)}
+        summary["stages"][stage] = row
+        print(f"{stage:10s} {row['count']:6d} {row['p50']:8.3f} {row['p95']:8.3f} {row['p99']:8.3f} {row['max']:8.3f}")
+    print(f"\n{done} questions in {elapsed:.1f}s: {done / elapsed:.2f} questions/s. Routes: "
+          + ", ".join(f"{k} {v}" for k, v in sorted(recorder.routes.items())))
+    if ollama:
+        summary["ollama"] = ollama.stats()
+        print(f"Ollama stub: {summary['ollama']['requests']} requests, at most "
+              f"{summary['ollama']['max_in_flight']} generating at once")
+    if firebase:
+        summary["firebase"] = firebase.stats()
+    if recorder.errors:
+        print(f"{len(recorder.errors)} errors, first: {recorder.errors[0]}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+List, verify, roll back and prune the versioned index builds (see index_versions.py).
+Usage: python scripts/manage_index.py list
+       python scripts/manage_index.py rollback            # to the version before CURRENT
+       python scripts/manage_index.py activate 20250101-120000
+       python scripts/manage_index.py verify [VERSION]
+       python scripts/manage_index.py prune --keep 3
+       python scripts/manage_index.py --lang hi list      # a language's translated index
+Running apps pick up a changed CURRENT within INDEX_CHECK_INTERVAL seconds.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import INDEX_KEEP_VERSIONS, INDEX_VERSIONS_DIR, LANG_INDEX_DIR
+from index_versions import current_version, list_versions, previous_version, prune, set_current, verify
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned index builds.")
+    parser.add_argument("--lang", help="Manage this language's translated index instead of the main one")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show published versions")
+    sub.add_parser("rollback", help="Make the version before CURRENT live")
+    activate = sub.add_parser("activate", help="Make a version live")
+    activate.add_argument("version")
+    check = sub.add_parser("verify", help="Check file sizes and checksums")
+    check.add_argument("version", nargs="?")
+    trim = sub.add_parser("prune", help="Delete old versions")
+    trim.add_argument("--keep", type=int, default=INDEX_KEEP_VERSIONS)
+    args = parser.parse_args()
+    root = LANG_INDEX_DIR / args.lang if args.lang else INDEX_VERSIONS_DIR
+
+    current = current_version(root)
+    if args.command == "list":
+        for m in list_versions(root):
+            marker = "*" if m["version"] == current else " "
+            size = sum(f["bytes"] for f in m["files"].values()) / 1e6
+            print(f"{marker} {m['version']}  {m['rows']:>9} rows  {m['model']}  {size:.0f} MB")
+        if current is None:
+            print(f"No published {args.lang} index" if args.lang else
+                  "No published version; the app uses the legacy data/kcc_faiss.index + meta.pkl")
+    elif args.command in ("rollback", "activate"):
+        target = args.version if args.command == "activate" else previous_version(root)
+        if target is None:
+            print("No older version to roll back to")
+            sys.exit(1)
+        problems = verify(root / target)
+        if problems:
+            print(f"{target} is damaged: {'; '.join(problems)}")
+            sys.exit(1)
+        set_current(target, root)
+        print(f"CURRENT: {current} -> {target}")
+    elif args.command == "verify":
+        version = args.version or current
+        if version is None:
+            print("No published version")
+            sys.exit(1)
+        problems = verify(root / version)
+        print(f"{version}: " + ("; ".join(problems) if problems else "OK"))
+        sys.exit(1 if problems else 0)
+    elif args.command == "prune":
+        removed = prune(args.keep, root)
+        print(f"Removed {len(removed)} versions: {', '.join(removed)}" if removed else "Nothing to remove")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Near-duplicate detection for KCC Q&A pairs with MinHash + LSH.
+Records that differ only in spacing, punctuation or a small typo get the same cluster, in roughly
+linear time: each record is hashed once and only compared with records sharing an LSH bucket.
+"""
+import re
+import zlib
+from typing import Optional
+
+import numpy as np
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# Mersenne prime for the universal hash family h(x) = (a*x + b) mod p; a*x stays below 2**62
+_PRIME = (1 << 31) - 1
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def _number_hash(text: str) -> int:
+    """Hash of the numbers in the text in order; records that differ in a dose or interval never merge."""
+    return zlib.crc32(" ".join(_NUMBER.findall(text)).encode("ascii"))
+
+
+def _shingle_hashes(text: str, k: int) -> np.ndarray:
+    """CRC32 of every character k-gram of the lower-cased, punctuation-free text."""
+    text = _NON_WORD.sub(" ", text.lower()).strip()
+    if len(text) <= k:
+        return np.array([zlib.crc32(text.encode("utf-8"))], dtype=np.uint64)
+    grams = {text[i:i + k] for i in range(len(text) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class NearDuplicateIndex:
+    """
+    Incremental MinHash/LSH clustering.
+    add_batch() can be called repeatedly (e.g. once per CSV chunk); clusters() returns the
+    cluster root of every record added so far. Memory per record: one uint16 signature
+    (num_perm * 2 bytes, twice with queries), a number hash, and one bucket entry per band.
+    Two records only merge if they contain the same numbers (doses, intervals), since a near-identical
+    answer with a different dose is different advice. When queries are given, their own signatures
+    must be similar too, so a long stock answer shared by different questions does not merge them.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 8, shingle: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self._buckets = [dict() for _ in range(bands)]
+        self._sigs: list[np.ndarray] = []  # uint16 signature blocks, one per batch
+        self._numbers: list[np.ndarray] = []  # uint32 number hashes, one block per batch
+        self._query_sigs: list[Optional[np.ndarray]] = []  # uint16 query signatures (None: no queries)
+        self._parent: list[int] = []
+        self._n = 0
+
+    def _signature(self, text: str) -> np.ndarray:
+        x = _shingle_hashes(text, self.shingle) % _PRIME
+        return ((self.a[:, None] * x[None, :] + self.b[:, None]) % _PRIME).min(axis=1)
+
+    def _find(self, i: int) -> int:
+        parent = self._parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]  # path halving
+            i = parent[i]
+        return i
+
+    def _lookup(self, i: int) -> tuple[np.ndarray, int, Optional[np.ndarray]]:
+        """(uint16 signature, number hash, uint16 query signature or None) of record i."""
+        for sigs, numbers, query_sigs in zip(self._sigs, self._numbers, self._query_sigs):
+            if i < len(sigs):
+                return sigs[i], numbers[i], None if query_sigs is None else query_sigs[i]
+            i -= len(sigs)
+        raise IndexError(i)
+
+    def _similar(self, a: np.ndarray, b: np.ndarray) -> bool:
+        return np.mean(a == b) >= self.threshold
+
+    def add_batch(self, texts, queries=None) -> None:
+        """
+        Add records (one string per record, e.g. query + answer) and link them to near duplicates.
+        queries (one per record, optional) must then be near duplicates as well.
+        """
+        texts = list(texts)
+        if not texts:
+            return
+        sigs = np.stack([self._signature(t) for t in texts])
+        sig16 = (sigs & 0xFFFF).astype(np.uint16)  # 16 bits are plenty to estimate Jaccard
+        numbers = np.fromiter((_number_hash(t) for t in texts), dtype=np.uint32, count=len(texts))
+        query16 = None
+        if queries is not None:
+            query16 = (np.stack([self._signature(q) for q in queries]) & 0xFFFF).astype(np.uint16)
+        self._sigs.append(sig16)
+        self._numbers.append(numbers)
+        self._query_sigs.append(query16)
+        start = self._n
+        self._parent.extend(range(start, start + len(texts)))
+        self._n += len(texts)
+        band_keys = sigs.astype(np.uint32).reshape(len(texts), self.bands, self.rows)
+        for j in range(len(texts)):
+            doc = start + j
+            for band in range(self.bands):
+                key = band_keys[j, band].tobytes()
+                other = self._buckets[band].setdefault(key, doc)
+                if other == doc:
+                    continue
+                # Candidate pair: confirm with the estimated Jaccard similarity before merging
+                ra, rb = self._find(doc), self._find(other)
+                if ra == rb:
+                    continue
+                other_sig, other_numbers, other_query = self._lookup(other)
+                if other_numbers != numbers[j] or not self._similar(sig16[j], other_sig):
+                    continue
+                if query16 is not None and other_query is not None and not self._similar(query16[j], other_query):
+                    continue
+                self._parent[max(ra, rb)] = min(ra, rb)
+
+    def clusters(self) -> np.ndarray:
+        """Cluster id (the earliest member's index) of every record, in insertion order."""
+        return np.fromiter((self._find(i) for i in range(self._n)), dtype=np.int64, count=self._n)
+
+    def __len__(self) -> int:
+        return self._n
+
+
+def pick_canonical(clusters: np.ndarray, weights: np.ndarray, lengths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Choose one representative per cluster: the most frequent exact variant, then the longest.
+    Returns (representative row indices, total weight of each representative's cluster).
+    """
+    order = np.lexsort((-lengths, -weights, clusters))  # by cluster, then best first
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = clusters[order][1:] != clusters[order][:-1]
+    reps = order[first]
+    totals = np.bincount(clusters, weights=weights, minlength=clusters.max() + 1 if len(clusters) else 0)
+    return reps, totals[clusters[reps]].astype(np.int64)
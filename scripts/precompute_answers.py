@@ -0,0 +1,108 @@
+"""
+Precompute simplified LLM answers for KCC entries in every app language.
+Uses the same prompt as the live "AI Expert" answer and stores results in the answer store
+(data/answer_store.sqlite). Safe to stop at any time: re-running skips answers already stored.
+Usage: python scripts/precompute_answers.py --top-n 1000 --langs English Hindi --concurrency 2
+"""
+import argparse
+import pickle
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import LANG_OPTIONS, LLM_MAX_CONCURRENCY, OLLAMA_MODEL
+from answer_store import get_answer_store, query_hash
+from answer_table import row_answer
+from index_versions import current_paths
+from retrieval import generate_online_answer
+from scheduler import PRIORITY_BATCH
+
+# The build the app is serving: the CURRENT index version, or the legacy files
+_, META_PKL = current_paths()
+
+
+def load_rows(top_n: int) -> list[tuple[int, str, str]]:
+    """(row_id, query, answer) for the top_n most frequent KCC entries (all rows if top_n is 0)."""
+    with open(META_PKL, "rb") as f:
+        meta = pickle.load(f)
+    ids = list(range(len(meta["queries"])))
+    counts = meta.get("counts")
+    if counts is not None:
+        # Most asked first; stable sort keeps file order for ties
+        ids.sort(key=lambda i: -counts[i])
+    if top_n:
+        ids = ids[:top_n]
+    return [(i, meta["queries"][i], row_answer(meta, i)) for i in ids]
+
+
+def precompute_one(row_id: int, query: str, answer: str, language: str, model: str) -> dict:
+    hit = {"id": row_id, "query": query, "answer": answer, "score": 1.0}
+    return generate_online_answer(
+        query,
+        answer,
+        response_language=language,
+        model_name=model,
+        user_id="precompute",
+        priority=PRIORITY_BATCH,
+        results=[hit],
+        use_precomputed=False,
+        queue_timeout=None,  # batch work waits its turn behind interactive users
+    )
+
+
+def main():
+    all_langs = [name for name, _ in LANG_OPTIONS.values()]
+    parser = argparse.ArgumentParser(description="Precompute LLM answers for KCC entries.")
+    parser.add_argument("--top-n", type=int, default=0, help="Only the N most frequent entries (default: all)")
+    parser.add_argument("--langs", nargs="+", default=all_langs, choices=all_langs, help="Response languages")
+    parser.add_argument("--model", default=OLLAMA_MODEL, help=f"Ollama model (default: {OLLAMA_MODEL})")
+    parser.add_argument("--concurrency", type=int, default=LLM_MAX_CONCURRENCY, help="Parallel LLM calls")
+    args = parser.parse_args()
+
+    if not META_PKL.exists():
+        print("Run build_embeddings_faiss.py first to create meta.pkl")
+        sys.exit(1)
+
+    store = get_answer_store()
+    done = store.done_keys()
+    todo = [
+        (row_id, q, a, lang)
+        for row_id, q, a in load_rows(args.top_n)
+        for lang in args.langs
+        if (row_id, lang, query_hash(q)) not in done
+    ]
+    print(f"{len(todo)} answers to generate ({store.count()} already stored)")
+
+    start = time.perf_counter()
+    ok = failed = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, args.concurrency))
+    try:
+        futures = {
+            pool.submit(precompute_one, row_id, q, a, lang, args.model): (row_id, q, lang)
+            for row_id, q, a, lang in todo
+        }
+        for future in as_completed(futures):
+            row_id, q, lang = futures[future]
+            result = future.result()
+            if result["ok"]:
+                store.put(row_id, lang, q, args.model, result["answer"])
+                ok += 1
+            else:
+                failed += 1
+                print(f"\n[{row_id}/{lang}] {result['answer'][:120]}")
+            rate = (ok + failed) / max(time.perf_counter() - start, 1e-9)
+            sys.stdout.write(f"\r{ok + failed}/{len(todo)} done ({failed} failed, {rate:.2f}/s)")
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        print("\nInterrupted; re-run to resume.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        sys.exit(130)
+    pool.shutdown()
+    print(f"\nStored {ok} answers in {time.perf_counter() - start:.0f}s ({failed} failed).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Serve the shards from build_shards.py, one worker process per shard, on consecutive ports.
+Usage: python scripts/serve_shards.py --base-port 8601
+       python scripts/serve_shards.py --shard shard_02 --host 0.0.0.0 --port 8601   (one shard per node)
+Then start the app with SHARD_URLS set to the printed URLs.
+"""
+import argparse
+import multiprocessing
+import sys
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import SHARD_DIR
+from shards import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve retrieval shards.")
+    parser.add_argument("--dir", type=Path, default=SHARD_DIR)
+    parser.add_argument("--shard", help="Serve only this shard (e.g. shard_02)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", "--base-port", dest="port", type=int, default=8601)
+    parser.add_argument("--threads", type=int, default=1, help="FAISS threads per shard")
+    args = parser.parse_args()
+
+    paths = [args.dir / args.shard] if args.shard else sorted(p for p in args.dir.glob("shard_*") if p.is_dir())
+    if not paths or not all((p / "index.faiss").exists() for p in paths):
+        print("Run build_shards.py first")
+        sys.exit(1)
+    if len(paths) == 1:
+        serve(paths[0], args.host, args.port, args.threads)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(target=serve, args=(p, args.host, args.port + i, args.threads), name=p.name)
+        for i, p in enumerate(paths)
+    ]
+    for proc in procs:
+        proc.start()
+    print("SHARD_URLS=" + ",".join(f"http://{args.host}:{args.port + i}" for i in range(len(paths))), flush=True)
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+List and inspect per-question profiles captured by profiling.py (PROFILE_SAMPLE_RATE / PROFILE_USERS).
+Usage: python scripts/show_profiles.py                    list captures, newest first
+       python scripts/show_profiles.py <id>               stage timings and hottest functions of one capture
+       python scripts/show_profiles.py --merge all.collapsed [--min-ms 2000]
+                                                          merge sampling captures into one flame graph input
+Flame graph: flamegraph.pl all.collapsed > all.svg, or open the .collapsed file in speedscope.app.
+cProfile captures (.prof): snakeviz data/profiles/<id>.prof
+"""
+import argparse
+import json
+import pstats
+import sys
+from collections import Counter
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import PROFILE_DIR
+
+
+def load_captures(directory: Path) -> list[dict]:
+    captures = []
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        try:
+            with open(path, encoding="utf-8") as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+def read_collapsed(path: Path) -> Counter:
+    stacks = Counter()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def show(capture: dict, directory: Path, top: int) -> None:
+    print(f"{capture['id']}  {capture['mode']}  {capture['wall_s'] * 1000:.0f} ms wall, "
+          f"{capture['thread_cpu_s'] * 1000:.0f} ms CPU")
+    print(f"query: {capture['query']}")
+    print(f"user: {capture.get('user') or '-'}  model: {capture.get('model') or '-'}  "
+          f"route: {capture.get('route') or '-'}  language: {capture.get('language') or '-'}")
+    if capture.get("timings"):
+        print("stages (ms): " + ", ".join(f"{k} {v}" for k, v in capture["timings"].items()))
+    path = directory / capture["profile"]
+    if capture["mode"] == "cprofile":
+        print()
+        pstats.Stats(str(path)).sort_stats("cumulative").print_stats(top)
+        return
+    stacks = read_collapsed(path)
+    total = sum(stacks.values()) or 1
+    own, inclusive = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    ms = capture.get("interval_ms", 0)
+    print(f"\n{total} samples every {ms} ms. Own time (where the thread was when sampled):")
+    for frame, count in own.most_common(top):
+        print(f"  {100 * count / total:5.1f}%  {frame}")
+    print("Inclusive time:")
+    for frame, count in inclusive.most_common(top):
+        print(f"  {100 * count / total:5.1f}%  {frame}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List and inspect per-question profiles.")
+    parser.add_argument("id", nargs="?", help="Capture to show (a unique prefix is enough)")
+    parser.add_argument("--dir", type=Path, default=PROFILE_DIR)
+    parser.add_argument("--top", type=int, default=15, help="Functions to print")
+    parser.add_argument("--merge", type=Path, help="Write all sampling captures as one .collapsed file")
+    parser.add_argument("--min-ms", type=float, default=0, help="Only captures at least this slow")
+    parser.add_argument("--limit", type=int, default=30, help="Captures to list")
+    args = parser.parse_args()
+
+    captures = [c for c in load_captures(args.dir) if c["wall_s"] * 1000 >= args.min_ms]
+    if not captures:
+        print(f"No profiles in {args.dir}. Set PROFILE_SAMPLE_RATE or PROFILE_USERS and ask some questions.")
+        return
+
+    if args.merge:
+        merged = Counter()
+        for capture in captures:
+            if capture["mode"] == "sampling":
+                merged.update(read_collapsed(args.dir / capture["profile"]))
+        with open(args.merge, "w", encoding="utf-8") as f:
+            for stack, count in merged.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"Wrote {sum(merged.values())} samples from {len(captures)} captures to {args.merge}")
+        return
+
+    if args.id:
+        matches = [c for c in captures if c["id"].startswith(args.id)]
+        if len(matches) != 1:
+            print(f"{len(matches)} captures match {args.id!r}")
+            sys.exit(1)
+        show(matches[0], args.dir, args.top)
+        return
+
+    print(f"{'id':24s} {'mode':9s} {'wall ms':>8s} {'model':12s} query")
+    for capture in captures[: args.limit]:
+        print(f"{capture['id']:24s} {capture['mode']:9s} {capture['wall_s'] * 1000:8.0f} "
+              f"{(capture.get('model') or '-')[:12]:12s} {capture['query'][:60]}")
+
+
+if __name__ == "__main__":
+    main()
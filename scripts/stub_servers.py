@@ -0,0 +1,325 @@
+"""
+Local stand-ins for Ollama and the Firebase Realtime Database REST API, for load tests and
+offline development. Nothing leaves the machine.
+  Ollama:   GET /api/tags, POST /api/generate (stream true/false). Latency is modelled as a fixed
+            overhead + prompt tokens / prompt rate + answer tokens / token rate, with at most
+            --parallel requests generating at once (like OLLAMA_NUM_PARALLEL); the rest queue.
+  Firebase: GET/PUT/POST/PATCH/DELETE on /<path>.json over an in-memory tree, with orderBy,
+            limitToFirst/limitToLast, startAt/endAt/equalTo, ETags and conditional PUT (if-match).
+Usage: python scripts/stub_servers.py --ollama-port 11435 --firebase-port 9000 --tokens-per-s 15
+Then: OLLAMA_BASE_URLS=http://127.0.0.1:11435 FIREBASE_DATABASE_URL=http://127.0.0.1:9000 streamlit run app.py
+"""
+import argparse
+import copy
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+_ANSWER_WORDS = (
+    "Spray neem oil at 5 ml per litre of water in the evening. Remove and destroy affected leaves. "
+    "Keep the field clean and avoid excess nitrogen. If the attack continues, contact your local "
+    "agriculture officer for a recommended insecticide and dose."
+).split()
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _reply(self, code: int, body, headers: Optional[dict] = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# --- Ollama ---
+
+
+class OllamaStub:
+    def __init__(
+        self,
+        models=("llama3", "llava"),
+        latency: float = 0.2,
+        tokens_per_s: float = 15.0,
+        prompt_tokens_per_s: float = 200.0,
+        answer_tokens: int = 120,
+        parallel: int = 4,
+    ):
+        self.models = list(models)
+        self.latency = latency
+        self.tokens_per_s = tokens_per_s
+        self.prompt_tokens_per_s = prompt_tokens_per_s
+        self.answer_tokens = answer_tokens
+        self._slots = threading.Semaphore(max(1, parallel))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def handler(self):
+        stub = self
+
+        class Handler(_JsonHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/api/tags":
+                    self._reply(404, {"error": "not found"})
+                    return
+                self._reply(200, {"models": [{"name": f"{m}:latest", "model": f"{m}:latest"} for m in stub.models]})
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self._reply(404, {"error": "not found"})
+                    return
+                request = self._body() or {}
+                model = request.get("model", "")
+                if model.split(":")[0] not in stub.models:
+                    self._reply(404, {"error": f"model '{model}' not found, try pulling it first"})
+                    return
+                stub.generate(self, request)
+
+        return Handler
+
+    def generate(self, handler: _JsonHandler, request: dict) -> None:
+        start = time.perf_counter()
+        prompt_tokens = max(1, len(request.get("system", "") + request.get("prompt", "")) // 4)
+        n_tokens = int((request.get("options") or {}).get("num_predict") or self.answer_tokens)
+        with self._lock:
+            self.requests += 1
+        with self._slots:
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                load_s = self.latency
+                prompt_s = prompt_tokens / self.prompt_tokens_per_s
+                time.sleep(load_s + prompt_s)
+                words = [_ANSWER_WORDS[i % len(_ANSWER_WORDS)] for i in range(n_tokens)]
+                eval_start = time.perf_counter()
+                if request.get("stream", True):
+                    handler.send_response(200)
+                    handler.send_header("Content-Type", "application/x-ndjson")
+                    handler.send_header("Connection", "close")
+                    handler.end_headers()
+                    handler.close_connection = True
+                    for word in words:
+                        time.sleep(1 / self.tokens_per_s)
+                        chunk = {"model": request["model"], "response": word + " ", "done": False}
+                        handler.wfile.write((json.dumps(chunk) + "\n").encode("utf-8"))
+                        handler.wfile.flush()
+                else:
+                    time.sleep(n_tokens / self.tokens_per_s)
+                eval_s = time.perf_counter() - eval_start
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+        final = {
+            "model": request["model"],
+            "done": True,
+            "total_duration": int((time.perf_counter() - start) * 1e9),
+            "load_duration": int(load_s * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_s * 1e9),
+            "eval_count": n_tokens,
+            "eval_duration": int(eval_s * 1e9),
+        }
+        if request.get("stream", True):
+            final["response"] = ""
+            handler.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+        else:
+            handler._reply(200, {**final, "response": " ".join(words)})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "in_flight": self.in_flight, "max_in_flight": self.max_in_flight}
+
+
+# --- Firebase Realtime Database ---
+
+_NULL_ETAG = "null_etag"
+
+
+def _etag(value) -> str:
+    if value is None:
+        return _NULL_ETAG
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class FirebaseStub:
+    def __init__(self, latency: float = 0.03):
+        self.latency = latency
+        self.tree: dict = {}
+        self._lock = threading.Lock()
+        self._push_counter = 0
+        self.requests = {"GET": 0, "PUT": 0, "POST": 0, "PATCH": 0, "DELETE": 0}
+
+    def _get(self, parts: list[str]):
+        node = self.tree
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _set(self, parts: list[str], value) -> None:
+        if not parts:
+            self.tree = value if isinstance(value, dict) else {}
+            return
+        node = self.tree
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+    def _push_id(self) -> str:
+        """Time-ordered key like Firebase push IDs (sorts in insertion order)."""
+        self._push_counter += 1
+        return f"-{time.time_ns():020d}{self._push_counter:06d}"
+
+    @staticmethod
+    def _query(value, params: dict):
+        """Apply the REST query parameters the app uses (orderBy, limitTo*, startAt/endAt/equalTo)."""
+        if "orderBy" not in params or not isinstance(value, dict):
+            return value
+        order_by = json.loads(params["orderBy"])
+        if order_by == "$key":
+            key = lambda item: item[0]
+        elif order_by == "$value":
+            key = lambda item: item[1]
+        else:
+            key = lambda item: item[1].get(order_by) if isinstance(item[1], dict) else None
+        items = [item for item in value.items() if key(item) is not None]
+        items.sort(key=lambda item: (key(item), item[0]))
+        if "equalTo" in params:
+            items = [item for item in items if key(item) == json.loads(params["equalTo"])]
+        if "startAt" in params:
+            items = [item for item in items if key(item) >= json.loads(params["startAt"])]
+        if "endAt" in params:
+            items = [item for item in items if key(item) <= json.loads(params["endAt"])]
+        if "limitToFirst" in params:
+            items = items[: int(params["limitToFirst"])]
+        if "limitToLast" in params:
+            items = items[-int(params["limitToLast"]):]
+        return dict(items)
+
+    def handler(self):
+        stub = self
+
+        class Handler(_JsonHandler):
+            def _route(self, method: str):
+                url = urlparse(self.path)
+                if not url.path.endswith(".json"):
+                    self._reply(404, {"error": "Paths must end with .json"})
+                    return
+                parts = [p for p in url.path[: -len(".json")].split("/") if p]
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                body = self._body() if method in ("PUT", "POST", "PATCH") else None
+                time.sleep(stub.latency)
+                with stub._lock:
+                    stub.requests[method] += 1
+                    current = copy.deepcopy(stub._get(parts))
+                    headers = {}
+                    if self.headers.get("X-Firebase-ETag", "").lower() == "true":
+                        headers["ETag"] = _etag(current)
+                    if method == "GET":
+                        self._reply(200, stub._query(current, params), headers)
+                        return
+                    if_match = self.headers.get("if-match")
+                    if if_match is not None and if_match != _etag(current):
+                        self._reply(412, current, {"ETag": _etag(current)})
+                        return
+                    if method == "PUT":
+                        stub._set(parts, body)
+                        result = body
+                    elif method == "POST":
+                        name = stub._push_id()
+                        stub._set(parts + [name], body)
+                        result = {"name": name}
+                    elif method == "PATCH":
+                        merged = current if isinstance(current, dict) else {}
+                        merged.update(body or {})
+                        stub._set(parts, merged)
+                        result = body
+                    else:
+                        stub._set(parts, None)
+                        result = None
+                    if "ETag" in headers:
+                        headers["ETag"] = _etag(stub._get(parts))
+                self._reply(200, result, headers)
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_PUT(self):
+                self._route("PUT")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_PATCH(self):
+                self._route("PATCH")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+        return Handler
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.requests)
+
+
+def start(stub, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve a stub from a daemon thread; port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), stub.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=type(stub).__name__, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local Ollama and Firebase stand-ins.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--firebase-port", type=int, default=9000)
+    parser.add_argument("--models", nargs="+", default=["llama3", "llava"])
+    parser.add_argument("--latency", type=float, default=0.2, help="Fixed seconds per LLM request")
+    parser.add_argument("--tokens-per-s", type=float, default=15.0, help="Answer tokens per second")
+    parser.add_argument("--prompt-tokens-per-s", type=float, default=200.0, help="Prompt evaluation speed")
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--parallel", type=int, default=4, help="Requests generating at once")
+    parser.add_argument("--firebase-latency", type=float, default=0.03)
+    args = parser.parse_args()
+
+    ollama = start(OllamaStub(args.models, args.latency, args.tokens_per_s, args.prompt_tokens_per_s,
+                              args.answer_tokens, args.parallel), args.host, args.ollama_port)
+    firebase = start(FirebaseStub(args.firebase_latency), args.host, args.firebase_port)
+    print(f"OLLAMA_BASE_URLS=http://{args.host}:{ollama.server_port}")
+    print(f"FIREBASE_DATABASE_URL=http://{args.host}:{firebase.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
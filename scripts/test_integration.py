@@ -5,6 +5,14 @@ from pathlib import Path
 # Add parent directory to path to import modules
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+# --stub: run against the local stand-ins from stub_servers.py instead of live Ollama/Firebase
+if "--stub" in sys.argv:
+    from stub_servers import FirebaseStub, OllamaStub, start
+
+    ollama = start(OllamaStub([os.getenv("OLLAMA_MODEL", "llama3")]))
+    os.environ["OLLAMA_BASE_URLS"] = f"http://127.0.0.1:{ollama.server_port}"
+    os.environ["FIREBASE_DATABASE_URL"] = f"http://127.0.0.1:{start(FirebaseStub()).server_port}"
+
 from retrieval import get_online_answer
 from firebase_helper import save_to_firebase
 from config import OLLAMA_MODEL
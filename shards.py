@@ -0,0 +1,244 @@
+"""
+Sharded retrieval for corpora too large for one index per app process.
+scripts/build_shards.py splits kcc_faiss.index + meta.pkl into shards (contiguous row ranges, each
+with its own index, metadata and exact-match table) and scripts/serve_shards.py serves each shard
+from its own worker process over HTTP. ShardPool sends a query to every shard in parallel and
+returns whatever arrives within SHARD_TIMEOUT; retrieval.py merges the hits by score.
+"""
+import base64
+import json
+import logging
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import requests
+
+from answer_table import row_answer, row_answer_id
+from config import SHARD_TIMEOUT, SHARD_URLS
+from query_match import exact_matches
+
+log = logging.getLogger(__name__)
+
+# A shard that refused the connection is skipped for this many seconds before it is tried again
+_DOWN_RETRY_S = 5.0
+# Weight of the newest sample in the latency moving average
+_EWMA_ALPHA = 0.3
+
+
+def encode_vector(vector) -> str:
+    """Query embedding as base64 little-endian float32 (exact, and ~4x smaller than a JSON list)."""
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype="<f4").reshape(1, -1)
+
+
+# --- worker side ---
+
+
+class Shard:
+    """One shard's index and metadata. Result ids are global KCC row ids (shard offset + local row)."""
+
+    def __init__(self, path):
+        import faiss
+
+        self.path = Path(path)
+        self.name = self.path.name
+        self.index = faiss.read_index(str(self.path / "index.faiss"))
+        with open(self.path / "meta.pkl", "rb") as f:
+            self.meta = pickle.load(f)
+        self.offset = self.meta["offset"]
+
+    def search(self, query: str, vector: Optional[np.ndarray], k: int) -> list[dict]:
+        """
+        Exact matches for query when vector is None, else the best of the k nearest rows (raw scores,
+        no threshold), one per answer so rows sharing an answer are not all sent back.
+        """
+        if vector is None:
+            hits = exact_matches(self.meta, query)
+        else:
+            scores, indices = self.index.search(vector, min(k, self.index.ntotal))
+            hits, seen = [], set()
+            for s, i in zip(scores[0], indices[0]):
+                if i < 0:
+                    continue
+                answer_id = row_answer_id(self.meta, i)
+                if answer_id is not None and answer_id in seen:
+                    continue
+                seen.add(answer_id)
+                hits.append({"id": int(i), "query": self.meta["queries"][i], "answer": row_answer(self.meta, i),
+                             "answer_id": answer_id, "score": float(s)})
+        for hit in hits:
+            hit["id"] += self.offset
+        return hits
+
+
+class _ShardHandler(BaseHTTPRequestHandler):
+    """GET /health and POST /search {query, vector (optional, see encode_vector), k} -> {shard, hits, search_ms}."""
+
+    shard: Shard
+
+    def _reply(self, code: int, body: dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._reply(404, {"error": "not found"})
+            return
+        self._reply(200, {"shard": self.shard.name, "rows": self.shard.index.ntotal, "offset": self.shard.offset})
+
+    def do_POST(self):
+        if self.path != "/search":
+            self._reply(404, {"error": "not found"})
+            return
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            vector = decode_vector(request["vector"]) if request.get("vector") else None
+            hits = self.shard.search(request.get("query", ""), vector, int(request.get("k", 5)))
+        except Exception as e:
+            self._reply(400, {"error": str(e)})
+            return
+        self._reply(200, {
+            "shard": self.shard.name,
+            "hits": hits,
+            "search_ms": (time.perf_counter() - start) * 1000,
+        })
+
+    def log_message(self, format, *args):
+        pass  # a line per query is too noisy
+
+
+def serve(path, host: str = "127.0.0.1", port: int = 8601, threads: int = 1) -> None:
+    """Serve one shard until interrupted. threads: FAISS OpenMP threads (keep low when several shards share a machine)."""
+    import faiss
+
+    faiss.omp_set_num_threads(threads)
+    shard = Shard(path)
+    handler = type("Handler", (_ShardHandler,), {"shard": shard})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"{shard.name}: {shard.index.ntotal} rows from {shard.offset} on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# --- app side ---
+
+
+class ShardNode:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.down_since = 0.0
+        self.latency_s: Optional[float] = None  # EWMA of search round trips
+        self.timeouts = 0
+        self.failures = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "latency_s": self.latency_s,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+
+class ShardPool:
+    """Scatter-gather client for the shard workers."""
+
+    def __init__(self, urls: list[str], timeout: float = SHARD_TIMEOUT):
+        self.nodes = [ShardNode(u) for u in urls if u]
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        workers = max(4, 4 * len(self.nodes))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max(1, len(self.nodes)), pool_maxsize=workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def _ask(self, node: ShardNode, payload: dict) -> list[dict]:
+        start = time.perf_counter()
+        try:
+            resp = self._session.post(f"{node.url}/search", json=payload, timeout=(1.0, self.timeout))
+        except requests.exceptions.ConnectionError:
+            with self._lock:
+                node.healthy = False
+                node.down_since = time.monotonic()
+                node.failures += 1
+            raise
+        resp.raise_for_status()
+        hits = resp.json()["hits"]
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            node.healthy = True
+            node.latency_s = elapsed if node.latency_s is None else (
+                _EWMA_ALPHA * elapsed + (1 - _EWMA_ALPHA) * node.latency_s
+            )
+        return hits
+
+    def search(self, query: str, vector: Optional[np.ndarray] = None, k: int = 5) -> tuple[list[dict], int]:
+        """
+        Ask every shard for exact matches of query (vector None) or its k nearest rows to vector.
+        Returns (hits from the shards that answered within the timeout, number of shards that answered);
+        shards that are down, fail or are too slow are left out of this answer.
+        """
+        payload = {"query": query, "k": k}
+        if vector is not None:
+            payload["vector"] = encode_vector(vector)
+        now = time.monotonic()
+        with self._lock:
+            live = [n for n in self.nodes if n.healthy or now - n.down_since > _DOWN_RETRY_S]
+        futures = {self._executor.submit(self._ask, n, payload): n for n in live}
+        done, pending = wait(futures, timeout=self.timeout)
+        hits, answered = [], 0
+        for future in done:
+            try:
+                hits.extend(future.result())
+                answered += 1
+            except requests.exceptions.Timeout:
+                pending.add(future)
+            except Exception as e:
+                with self._lock:
+                    futures[future].failures += 1
+                log.warning("Shard %s failed: %s", futures[future].url, e)
+        with self._lock:
+            for future in pending:
+                futures[future].timeouts += 1
+        if answered < len(self.nodes):
+            log.warning("Only %d of %d shards answered", answered, len(self.nodes))
+        return hits, answered
+
+    def status(self) -> list[dict]:
+        with self._lock:
+            return [n.to_dict() for n in self.nodes]
+
+
+_pool: Optional[ShardPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_shard_pool() -> ShardPool:
+    """Process-wide pool built from SHARD_URLS."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ShardPool(SHARD_URLS)
+        return _pool
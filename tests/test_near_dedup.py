@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from near_dedup import NearDuplicateIndex
+
+STOCK_ANSWER = (
+    "For aphids spray Imidacloprid 17.8 SL @ 0.3 ml per litre of water, repeat after 15 days, "
+    "remove weeds around the field and monitor yellow sticky traps regularly. "
+) * 3
+
+
+def _clusters(queries):
+    index = NearDuplicateIndex()
+    index.add_batch([q + " || " + STOCK_ANSWER for q in queries], queries)
+    return index.clusters().tolist()
+
+
+def test_shared_answer_does_not_merge_different_crops():
+    clusters = _clusters(["How to control aphids in wheat", "How to control aphids in mustard"])
+    assert clusters[0] != clusters[1]
+
+
+def test_spacing_and_punctuation_variants_still_merge():
+    clusters = _clusters(["How to control aphids in wheat", "How to control  aphids in wheat?"])
+    assert clusters[0] == clusters[1]
+
+
+def test_without_queries_the_combined_text_decides():
+    index = NearDuplicateIndex()
+    index.add_batch([q + " || " + STOCK_ANSWER for q in ("How to control aphids in wheat", "How to control aphids in wheat.")])
+    assert index.clusters().tolist() == [0, 0]
@@ -0,0 +1,252 @@
+"""
+Text-to-speech for farmer answers.
+Splits the full answer into sentence chunks, synthesizes chunks in parallel, joins the audio,
+and keeps a content-addressed cache on disk (hash of engine + language + text) so repeated answers play instantly.
+The cache is kept under TTS_CACHE_MAX_MB by deleting the least recently played files.
+"""
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from config import TTS_CACHE_DIR, TTS_CACHE_MAX_MB, TTS_CHUNK_CHARS, TTS_ENGINE, TTS_WORKERS
+
+# Languages the app offers; anything else is spoken in English
+SUPPORTED_LANGS = ("en", "hi", "ta", "te", "kn")
+
+# Sentence ends: Latin punctuation, Devanagari danda, newlines and bullet markers
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?।|])\s+|\n+|•")
+
+
+class TTSEngine:
+    """Base class for speech engines. Subclasses implement synthesize(); concat() joins chunk audio."""
+
+    name = "base"
+    fmt = "mp3"
+    mime = "audio/mp3"
+    # Whether synthesize() may be called from several threads at once
+    parallel = True
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        raise NotImplementedError
+
+    def concat(self, chunks: list[bytes]) -> bytes:
+        # MP3 is a stream of self-contained frames, so chunks can be joined byte-wise
+        return b"".join(chunks)
+
+
+class GTTSEngine(TTSEngine):
+    """Google Translate TTS (needs network)."""
+
+    name = "gtts"
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        from gtts import gTTS
+
+        buf = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=False).write_to_fp(buf)
+        return buf.getvalue()
+
+
+class Pyttsx3Engine(TTSEngine):
+    """Local offline engine (espeak / SAPI / NSSpeech via pyttsx3). Produces WAV."""
+
+    name = "pyttsx3"
+    fmt = "wav"
+    mime = "audio/wav"
+    parallel = False  # pyttsx3 drives a single native event loop
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        import pyttsx3
+
+        engine = pyttsx3.init()
+        for voice in engine.getProperty("voices"):
+            langs = [l.decode() if isinstance(l, bytes) else str(l) for l in (voice.languages or [])]
+            if any(lang in l for l in langs) or voice.id.endswith(lang):
+                engine.setProperty("voice", voice.id)
+                break
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+            path = Path(tmp.name)
+        try:
+            engine.save_to_file(text, str(path))
+            engine.runAndWait()
+            return path.read_bytes()
+        finally:
+            path.unlink(missing_ok=True)
+
+    def concat(self, chunks: list[bytes]) -> bytes:
+        # WAV has a header per file; copy frames into one file using the first chunk's format
+        out = io.BytesIO()
+        writer = None
+        for chunk in chunks:
+            with wave.open(io.BytesIO(chunk), "rb") as r:
+                if writer is None:
+                    writer = wave.open(out, "wb")
+                    writer.setparams(r.getparams())
+                writer.writeframes(r.readframes(r.getnframes()))
+        if writer is not None:
+            writer.close()
+        return out.getvalue()
+
+
+ENGINES = {
+    GTTSEngine.name: GTTSEngine,
+    Pyttsx3Engine.name: Pyttsx3Engine,
+}
+
+
+def get_engine(name: Optional[str] = None) -> TTSEngine:
+    """Return engine by name (default: TTS_ENGINE from config)."""
+    name = (name or TTS_ENGINE).lower()
+    if name not in ENGINES:
+        raise ValueError(f"Unknown TTS engine '{name}'. Available: {', '.join(ENGINES)}")
+    return ENGINES[name]()
+
+
+def clean_for_speech(text: str) -> str:
+    """Strip HTML tags and markdown symbols so they are not read aloud."""
+    text = re.sub(r"<[^>]+>", "", text or "")
+    return text.replace("*", "").replace("#", "").strip()
+
+
+def split_into_chunks(text: str, max_chars: int = TTS_CHUNK_CHARS) -> list[str]:
+    """Split text at sentence boundaries and pack sentences into chunks of at most max_chars."""
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        # Very long sentences are split on word boundaries
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _cache_key(engine: TTSEngine, lang: str, text: str) -> str:
+    return hashlib.sha256(f"{engine.name}\0{lang}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _cache_path(engine: TTSEngine, lang: str, text: str) -> Path:
+    key = _cache_key(engine, lang, text)
+    return Path(TTS_CACHE_DIR) / key[:2] / f"{key}.{engine.fmt}"
+
+
+def _cache_get(path: Path) -> Optional[bytes]:
+    try:
+        audio = path.read_bytes()
+    except OSError:
+        return None
+    try:
+        os.utime(path)  # mtime = last played, for eviction
+    except OSError:
+        pass
+    return audio
+
+
+_cache_lock = threading.Lock()
+_cache_bytes: Optional[int] = None  # size of TTS_CACHE_DIR as of the last scan plus writes since
+
+
+def _prune_cache(max_bytes: int) -> int:
+    """Delete the least recently played files until the cache is under 90% of max_bytes; returns its size."""
+    files = []
+    for p in Path(TTS_CACHE_DIR).glob("*/*"):
+        try:
+            stat = p.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, p))
+    total = sum(size for _, size, _ in files)
+    if total > max_bytes:
+        files.sort()
+        for _, size, p in files:
+            if total <= max_bytes * 0.9:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+    return total
+
+
+def _cache_put(path: Path, audio: bytes) -> None:
+    global _cache_bytes
+    tmp = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique name per writer; the rename is atomic, so readers never see a partial file
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as f:
+            tmp = Path(f.name)
+            f.write(audio)
+        tmp.replace(path)
+    except OSError:
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+        return
+    if TTS_CACHE_MAX_MB <= 0:
+        return
+    max_bytes = TTS_CACHE_MAX_MB * 2**20
+    with _cache_lock:
+        if _cache_bytes is None or _cache_bytes + len(audio) > max_bytes:
+            _cache_bytes = _prune_cache(max_bytes)
+        else:
+            _cache_bytes += len(audio)
+
+
+def _synthesize_chunk(engine: TTSEngine, text: str, lang: str) -> bytes:
+    path = _cache_path(engine, lang, text)
+    audio = _cache_get(path)
+    if audio is None:
+        audio = engine.synthesize(text, lang)
+        _cache_put(path, audio)
+    return audio
+
+
+def synthesize_speech(text: str, lang: str = "en", engine: Optional[TTSEngine] = None) -> tuple[bytes, str]:
+    """
+    Speak the full text. Returns (audio_bytes, mime_type); audio is empty if there is nothing to say.
+    Whole answers and individual chunks are both cached, so a repeated answer is a single file read.
+    """
+    engine = engine or get_engine()
+    lang = lang if lang in SUPPORTED_LANGS else "en"
+    text = clean_for_speech(text)
+    if not text:
+        return b"", engine.mime
+
+    full_path = _cache_path(engine, lang, text)
+    audio = _cache_get(full_path)
+    if audio is not None:
+        return audio, engine.mime
+
+    chunks = split_into_chunks(text)
+    if len(chunks) == 1 or not engine.parallel:
+        parts = [_synthesize_chunk(engine, c, lang) for c in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(TTS_WORKERS, len(chunks)))) as pool:
+            # map() keeps chunk order even though chunks finish out of order
+            parts = list(pool.map(lambda c: _synthesize_chunk(engine, c, lang), chunks))
+    audio = engine.concat(parts)
+    _cache_put(full_path, audio)
+    return audio, engine.mime